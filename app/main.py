@@ -1,13 +1,54 @@
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from app.routes.main import router
 from app.routes.users import router as users_router
-import os
+from app.services import trending, files, db, analyzer, routing, metrics, similarity, admission, deadline, cache, warmup
+from app.services.scheduler import scheduler
+import asyncio
+import time
 
 
-app = FastAPI(title="FactFlow Backend - Fact Checking with Community & AI")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Per-worker startup: clients are created here, after any fork,
+    instead of at import time. The worker reports ready once the article
+    cache warm-up has finished or run out of time.
+    """
+    app.state.ready = False
+    started = time.perf_counter()
+
+    files.initialize_upload_directories()
+    # The Firestore AsyncClient binds its gRPC channel to this event loop
+    db.get_db()
+    # Warm the article cache while the models load
+    warmup_task = asyncio.create_task(warmup.warm_up())
+    # Reading credentials and loading models is blocking
+    await run_in_threadpool(analyzer.get_client)
+    await run_in_threadpool(routing.load_classifier)
+    await run_in_threadpool(similarity.load_index)
+    app.state.trending_task = asyncio.create_task(trending.run_refresh_loop())
+    await warmup_task
+
+    app.state.ready = True
+    print(f"✅ Worker ready in {time.perf_counter() - started:.2f}s")
+
+    yield
+
+    app.state.ready = False
+    app.state.trending_task.cancel()
+    await scheduler.stop()
+    files.shutdown_process_pool()
+
+
+app = FastAPI(
+    title="FactFlow Backend - Fact Checking with Community & AI",
+    lifespan=lifespan
+)
 
 # Configuration CORS
 app.add_middleware(
@@ -18,12 +59,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static files for uploaded content
-uploads_dir = "uploads"
-if not os.path.exists(uploads_dir):
-    os.makedirs(uploads_dir)
+# Mount static files for uploaded content (directory created in lifespan)
+# Content-addressed photos are served with immutable caching headers
+app.mount(
+    "/uploads",
+    files.ImmutableStaticFiles(directory=files.UPLOAD_DIR, check_dir=False),
+    name="uploads"
+)
+
+
+@app.exception_handler(deadline.DeadlineExceededError)
+async def deadline_exceeded_handler(request, exc):
+    """A Firestore call ran past its timeout"""
+    return JSONResponse(status_code=504, content={"detail": "Upstream timeout, please retry"})
 
-app.mount("/uploads", StaticFiles(directory=uploads_dir), name="uploads")
 
 # Include routers
 app.include_router(router)  # Main routes (analyze, vote, etc.)
@@ -39,6 +88,7 @@ def root():
         "endpoints": {
             "analyze": "POST /analyze - Analyze text for fact-checking",
             "vote": "POST /vote - Vote on article credibility",
+            "trending": "GET /articles/trending - Most disputed articles right now",
             "users": "User management under /users/*",
             "docs": "API documentation at /docs"
         }
@@ -48,3 +98,19 @@ def root():
 @app.get("/ping")
 def ping():
     return {"message": "pong"}
+
+
+@app.get("/ready")
+def ready():
+    """Readiness probe: 503 until the worker finished its startup"""
+    if not getattr(app.state, "ready", False):
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ready"}
+
+
+@app.get("/metrics")
+def get_metrics():
+    """In-process metrics of this worker"""
+    admission.publish_gauges()
+    cache.publish_gauges()
+    return metrics.snapshot()
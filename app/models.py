@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 
 
@@ -7,6 +7,11 @@ class AnalyzeRequest(BaseModel):
     text: str
 
 
+class SimilarArticle(BaseModel):
+    article_id: str
+    similarity: float
+
+
 class AnalyzeResponse(BaseModel):
     article_id: str
     score: float
@@ -16,6 +21,8 @@ class AnalyzeResponse(BaseModel):
     positive_votes: int = 0
     negative_votes: int = 0
     total_votes: int = 0
+    similar_articles: List[SimilarArticle] = []
+    reused_from: Optional[str] = None
 
 
 class ArticleResponse(BaseModel):
@@ -28,6 +35,36 @@ class ArticleResponse(BaseModel):
     explanation: str
 
 
+class UserVote(BaseModel):
+    article_id: str
+    vote: int
+    timestamp: Optional[datetime] = None
+
+
+class ArticleVoter(BaseModel):
+    user_id: str
+    vote: int
+    timestamp: Optional[datetime] = None
+
+
+class UserVotesPage(BaseModel):
+    votes: List[UserVote]
+    next_cursor: Optional[str] = None
+
+
+class ArticleVotersPage(BaseModel):
+    voters: List[ArticleVoter]
+    next_cursor: Optional[str] = None
+
+
+class TrendingArticle(BaseModel):
+    article_id: str
+    trending_score: float
+    velocity: float
+    positive_velocity: float
+    negative_velocity: float
+
+
 class VoteRequest(BaseModel):
     user_id: str
     article_id: str
@@ -73,6 +110,8 @@ class UserResponse(BaseModel):
     username: str
     email: EmailStr
     profile_photo: Optional[str] = None
+    # Every generated size of the photo: {format: {size: url}}
+    profile_photo_variants: Dict[str, Dict[str, str]] = {}
     level: int
     points: int
     badges: List[str]
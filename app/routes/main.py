@@ -1,36 +1,150 @@
-from fastapi import APIRouter
-from app.models import AnalyzeRequest, AnalyzeResponse, VoteRequest, ArticleResponse
-from app.services import db, analyzer
-import hashlib
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, List, Optional
+from app.models import AnalyzeRequest, AnalyzeResponse, VoteRequest, ArticleResponse, TrendingArticle, ArticleVotersPage
+from app.services import db, analyzer, trending, similarity, ratelimit, deadline, cache
+import asyncio
 import uuid
 
 router = APIRouter()
 
+MAX_BULK_IDS = 100
+MAX_PAGE_SIZE = 100
 
-@router.post("/analyze", response_model=AnalyzeResponse)
-async def analyze_article(request: AnalyzeRequest):
+
+async def article_etag(article_id: str) -> Optional[str]:
+    """ETag derived from the article version (None if the article is unknown)"""
+    version = await db.get_article_version(article_id)
+    if version is None:
+        return None
+    return f'"v{version}"'
+
+
+def etag_matches(request: Request, etag: Optional[str]) -> bool:
+    """Check If-None-Match against the current ETag"""
+    if_none_match = request.headers.get("if-none-match")
+    if not etag or not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+def build_article_response(ai_analysis: dict, votes_data: dict) -> ArticleResponse:
+    """AI, community and combined scores of an article"""
+    ai_score = ai_analysis['score']
+    weighted = analyzer.WEIGHTED_COMMUNITY_SCORE
+    community_score = analyzer.calculate_community_score(votes_data, weighted)
+    combined_data = analyzer.calculate_combined_score(
+        ai_score,
+        community_score,
+        votes_data['total'],
+        votes_data.get('weighted_total') if weighted else None
+    )
+
+    return ArticleResponse(
+        ai_score=ai_score,
+        ai_label=ai_analysis['label'],
+        community_score=community_score,
+        combined_score=combined_data['combined_score'],
+        combined_label=combined_data['combined_label'],
+        vote_count=votes_data['total'],
+        explanation=ai_analysis['explanation']
+    )
+
+
+@router.post("/analyze", response_model=AnalyzeResponse,
+             dependencies=[Depends(ratelimit.limit("analyze"))])
+async def analyze_article(request: AnalyzeRequest, http_request: Request):
     """
     Analyze an article for fact-checking
     Returns existing analysis with community data if available, 
     otherwise performs new analysis
+    Bounded by ANALYZE_DEADLINE_SECONDS (504) and cancelled if the client leaves
     """
-    # Générer un ID unique pour l'article basé sur le contenu
-    article_id = hashlib.md5(request.text.encode()).hexdigest()
+    with deadline.scope(deadline.ANALYZE_DEADLINE_SECONDS):
+        try:
+            return await deadline.cancel_on_disconnect(http_request, run_analysis(request))
+        except deadline.DeadlineExceededError as e:
+            print(f"⏱️ /analyze: {e}")
+            raise HTTPException(status_code=504, detail="Analysis timed out, please retry")
+        except deadline.ClientDisconnectedError:
+            # Nobody is listening; 499 only shows up in access logs
+            return Response(status_code=499)
+
+
+async def persist_analysis(article_id: str, text: str, result: Dict, vector):
+    await db.save_article_analysis(article_id, text, result)
+    similarity.add_article(article_id, vector)
+
 
-    # Vérifier si l'analyse existe déjà
-    existing_analysis = analyzer.get_article_with_community_data(article_id)
+async def run_analysis(request: AnalyzeRequest) -> AnalyzeResponse:
+    # ID dérivé de la forme canonique du contenu (espaces, Unicode, boilerplate)
+    article_id = analyzer.compute_article_id(request.text)
+
+    # Vérifier si l'analyse existe déjà, et en parallèle si l'article a été
+    # analysé avant la migration sous son ancien id (md5 du texte brut)
+    legacy_id = analyzer.legacy_article_id(request.text)
+    if article_id in cache.known_ids:
+        # Id canonique connu de ce processus : inutile de chercher l'ancien id
+        existing_analysis = await analyzer.get_article_with_community_data(article_id)
+        resolved_legacy_id = None
+    else:
+        existing_analysis, resolved_legacy_id = await asyncio.gather(
+            analyzer.get_article_with_community_data(article_id),
+            db.resolve_article_id(legacy_id)
+        )
+
+    if not existing_analysis and resolved_legacy_id == legacy_id:
+        existing_analysis = await analyzer.get_article_with_community_data(
+            legacy_id)
 
     if existing_analysis:
         # Si l'analyse existe déjà, on la renvoie avec toutes les données communautaires
         print(f"✅ Article existant trouvé: {article_id}")
         return AnalyzeResponse(**existing_analysis)
 
-    # Sinon, on effectue une nouvelle analyse
-    print(f"🆕 Nouvelle analyse pour: {article_id}")
-    result = await analyzer.analyze_text(request.text)
+    # Articles déjà vérifiés au contenu proche (index local, sans appel réseau).
+    # Calcul NumPy hors de la boucle d'événements, seulement pour un nouvel article
+    vector = await run_in_threadpool(similarity.embed, request.text)
+    similar_articles = await run_in_threadpool(
+        similarity.find_similar, vector, exclude=article_id)
+
+    # Même histoire republiée ailleurs : réutiliser son verdict si assez proche
+    result = None
+    if (similarity.REUSE_THRESHOLD and similar_articles
+            and similar_articles[0]['similarity'] >= similarity.REUSE_THRESHOLD):
+        source = await db.get_article_analysis(similar_articles[0]['article_id'])
+        if source:
+            print(
+                f"♻️ Verdict réutilisé de {source['article_id']} pour: {article_id}")
+            result = {
+                "score": source['score'],
+                "label": source['label'],
+                "explanation": source['explanation'],
+                "reused_from": source['article_id']
+            }
 
-    # Sauvegarder l'analyse en base
-    db.save_article_analysis(article_id, request.text, result)
+    if result is None:
+        # Sinon, on effectue une nouvelle analyse
+        print(f"🆕 Nouvelle analyse pour: {article_id}")
+        try:
+            result = await analyzer.analyze_text(request.text)
+        except analyzer.AnalysisUnavailableError as e:
+            # Nothing is saved: the client can retry once Gemini is back
+            raise HTTPException(
+                status_code=503,
+                detail="AI analysis temporarily unavailable, please retry later",
+                headers={"Retry-After": str(max(1, round(e.retry_after)))}
+            )
+
+    # Sauvegarder l'analyse en base, même si le client part entre-temps
+    await asyncio.shield(deadline.detached(
+        persist_analysis(article_id, request.text, result, vector)))
 
     # Retourner les résultats avec les champs communautaires initialisés
     return AnalyzeResponse(
@@ -41,29 +155,46 @@ async def analyze_article(request: AnalyzeRequest):
         community_score=None,  # Pas encore de votes
         positive_votes=0,
         negative_votes=0,
-        total_votes=0
+        total_votes=0,
+        similar_articles=similar_articles,
+        reused_from=result.get('reused_from')
     )
 
 
-@router.post("/vote")
+@router.post("/vote", dependencies=[Depends(ratelimit.limit("vote"))])
 async def vote_article(request: VoteRequest):
     """
     Submit a vote for an article and reward the user with points
     """
     try:
-        # Save the vote
-        db.save_vote(request.article_id, request.user_id, request.vote)
-        
-        # Reward user with points for voting
+        # Les anciens ids sont redirigés vers l'id canonique
+        article_id = await db.resolve_article_id(request.article_id)
+
+        # Save the vote (un seul vote par utilisateur et par article)
+        previous_vote = await db.save_vote(article_id, request.user_id, request.vote)
+        if previous_vote == request.vote:
+            return {
+                "status": "vote unchanged",
+                "points_awarded": 0,
+                "message": "You already cast this vote"
+            }
+
+        # Update user reputation based on their voting history, off the
+        # request path: a failure there must not report the vote as failed
+        deadline.detached(db.update_user_reputation(request.user_id))
+
+        if previous_vote is not None:
+            return {
+                "status": "vote updated",
+                "points_awarded": 0,
+                "message": "Vote updated"
+            }
+
+        # Reward user with points for their first vote on this article only
         points_awarded = 10  # Base points for voting
-        db.add_points_to_user(
-            request.user_id, 
-            points_awarded, 
-            f"Vote on article {request.article_id}"
-        )
-        
-        # Update user reputation based on their voting history
-        db.update_user_reputation(request.user_id)
+        if not await db.add_points_to_user(
+                request.user_id, points_awarded, f"Vote on article {article_id}"):
+            points_awarded = 0
         
         return {
             "status": "vote saved",
@@ -76,40 +207,91 @@ async def vote_article(request: VoteRequest):
         return {"status": "error", "message": "Failed to process vote"}
 
 
+@router.get("/articles/trending", response_model=List[TrendingArticle])
+async def get_trending_articles(limit: int = Query(20, ge=1, le=trending.TOP_K)):
+    """Articles currently most voted on and most disputed by the community"""
+    return trending.get_trending_articles(limit)
+
+
+@router.get("/articles", response_model=Dict[str, Optional[ArticleResponse]])
+async def get_articles(ids: str = Query(..., description="Comma-separated article ids")):
+    """
+    Several articles in one request (feed pages), keyed by the requested id
+    Unknown articles map to null
+    """
+    article_ids = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))
+    if not article_ids:
+        raise HTTPException(status_code=400, detail="No article id provided")
+    if len(article_ids) > MAX_BULK_IDS:
+        raise HTTPException(
+            status_code=400, detail=f"At most {MAX_BULK_IDS} ids per request")
+
+    # Les anciens ids sont redirigés vers l'id canonique
+    resolved = await db.resolve_article_ids(article_ids)
+    articles = await db.get_articles_bulk(list(set(resolved.values())))
+
+    results = {}
+    for article_id in article_ids:
+        article = articles.get(resolved[article_id])
+        results[article_id] = (build_article_response(article['analysis'], article['votes'])
+                               if article else None)
+    return results
+
+
 @router.get("/article/{article_id}/votes")
-async def get_article_votes(article_id: str):
+async def get_article_votes(article_id: str, request: Request, response: Response):
     """Récupérer les votes d'un article"""
-    votes = db.get_article_votes(article_id)
+    article_id = await db.resolve_article_id(article_id)
+
+    # Vérification de version peu coûteuse avant de lire les votes
+    etag = await article_etag(article_id)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    # Lecture fraîche : la réponse est associée à la version courante (ETag)
+    votes = await db.get_article_votes(article_id, fresh=True)
+    if etag:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
     return votes
 
 
+@router.get("/article/{article_id}/voters", response_model=ArticleVotersPage)
+async def get_article_voters(
+    article_id: str,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    """Voters of an article, most recent first; pass next_cursor to continue"""
+    article_id = await db.resolve_article_id(article_id)
+    try:
+        page = await db.list_votes('article_id', article_id, ['user_id', 'vote'],
+                                   limit, cursor)
+    except db.InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return ArticleVotersPage(voters=page['votes'], next_cursor=page['next_cursor'])
+
+
 @router.get("/article/{article_id}", response_model=ArticleResponse)
-async def get_article_with_combined_score(article_id: str):
+async def get_article_with_combined_score(article_id: str, request: Request, response: Response):
     """Get article with AI, community and combined scores"""
+    article_id = await db.resolve_article_id(article_id)
 
-    # Get AI analysis
-    ai_analysis = db.get_article_analysis(article_id)
+    # Cheap version check: answer 304 before reading analysis and votes
+    etag = await article_etag(article_id)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    # Get AI analysis and community votes concurrently
+    ai_analysis, votes_data = await asyncio.gather(
+        db.get_article_analysis(article_id),
+        db.get_article_votes(article_id, fresh=True)
+    )
     if not ai_analysis:
         return {"error": "Article not found"}
 
-    # Get community votes
-    votes_data = db.get_article_votes(article_id)
+    if etag:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
 
-    # Calculate scores
-    ai_score = ai_analysis['score']
-    community_score = analyzer.calculate_community_score(votes_data)
-    combined_data = analyzer.calculate_combined_score(
-        ai_score,
-        community_score,
-        votes_data['total']
-    )
-
-    return ArticleResponse(
-        ai_score=ai_score,
-        ai_label=ai_analysis['label'],
-        community_score=community_score,
-        combined_score=combined_data['combined_score'],
-        combined_label=combined_data['combined_label'],
-        vote_count=votes_data['total'],
-        explanation=ai_analysis['explanation']
-    )
+    return build_article_response(ai_analysis, votes_data)
@@ -2,16 +2,18 @@
 User management routes
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Header, UploadFile, File
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, UploadFile, File, Request, Response
 from typing import Optional
 from app.models import (
     UserRegistration, UserLogin, UserProfile, UserUpdate,
-    UserResponse, AuthResponse
+    UserResponse, AuthResponse, UserVotesPage
 )
 from app.services import db, auth, files
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+MAX_PAGE_SIZE = 100
+
 
 def get_current_user(authorization: Optional[str] = Header(None)) -> dict:
     """Dependency to get current authenticated user"""
@@ -40,7 +42,7 @@ async def register_user(user_data: UserRegistration):
     """Register a new user"""
     try:
         # Create user in database
-        user_id = db.create_user(
+        user_id = await db.create_user(
             username=user_data.username,
             email=user_data.email,
             password=user_data.password,
@@ -52,7 +54,7 @@ async def register_user(user_data: UserRegistration):
                 status_code=400, detail="Email or username already exists")
 
         # Get full user data
-        full_user_data = db.get_user_by_id(user_id)
+        full_user_data = await db.get_user_by_id(user_id)
         if not full_user_data:
             raise HTTPException(
                 status_code=500, detail="Error retrieving user data")
@@ -66,6 +68,8 @@ async def register_user(user_data: UserRegistration):
             username=full_user_data["username"],
             email=full_user_data["email"],
             profile_photo=full_user_data.get("profile_photo"),
+            profile_photo_variants=files.get_photo_variant_urls(
+                full_user_data.get("profile_photo")),
             level=full_user_data["level"],
             points=full_user_data["points"],
             badges=full_user_data["badges"],
@@ -92,7 +96,7 @@ async def login_user(credentials: UserLogin):
     """Login a user"""
     try:
         # Authenticate user
-        user_data = db.authenticate_user(
+        user_data = await db.authenticate_user(
             credentials.email, credentials.password)
 
         if not user_data:
@@ -108,6 +112,8 @@ async def login_user(credentials: UserLogin):
             username=user_data["username"],
             email=user_data["email"],
             profile_photo=user_data.get("profile_photo"),
+            profile_photo_variants=files.get_photo_variant_urls(
+                user_data.get("profile_photo")),
             level=user_data["level"],
             points=user_data["points"],
             badges=user_data["badges"],
@@ -133,7 +139,7 @@ async def login_user(credentials: UserLogin):
 async def get_current_user_profile(current_user: dict = Depends(get_current_user)):
     """Get current user profile"""
     try:
-        user_data = db.get_user_by_id(current_user["user_id"])
+        user_data = await db.get_user_by_id(current_user["user_id"])
 
         if not user_data:
             raise HTTPException(status_code=404, detail="User not found")
@@ -143,6 +149,8 @@ async def get_current_user_profile(current_user: dict = Depends(get_current_user
             username=user_data["username"],
             email=user_data["email"],
             profile_photo=user_data.get("profile_photo"),
+            profile_photo_variants=files.get_photo_variant_urls(
+                user_data.get("profile_photo")),
             level=user_data["level"],
             points=user_data["points"],
             badges=user_data["badges"],
@@ -174,14 +182,14 @@ async def update_current_user(
                 status_code=400, detail="No valid updates provided")
 
         # Update user
-        success = db.update_user(current_user["user_id"], update_data)
+        success = await db.update_user(current_user["user_id"], update_data)
 
         if not success:
             raise HTTPException(
                 status_code=500, detail="Failed to update user")
 
         # Get updated user data
-        user_data = db.get_user_by_id(current_user["user_id"])
+        user_data = await db.get_user_by_id(current_user["user_id"])
 
         if not user_data:
             raise HTTPException(status_code=404, detail="User not found")
@@ -191,6 +199,8 @@ async def update_current_user(
             username=user_data["username"],
             email=user_data["email"],
             profile_photo=user_data.get("profile_photo"),
+            profile_photo_variants=files.get_photo_variant_urls(
+                user_data.get("profile_photo")),
             level=user_data["level"],
             points=user_data["points"],
             badges=user_data["badges"],
@@ -210,7 +220,7 @@ async def update_current_user(
 async def get_user_profile(user_id: str):
     """Get public user profile by ID"""
     try:
-        user_data = db.get_user_by_id(user_id)
+        user_data = await db.get_user_by_id(user_id)
 
         if not user_data:
             raise HTTPException(status_code=404, detail="User not found")
@@ -220,6 +230,8 @@ async def get_user_profile(user_id: str):
             username=user_data["username"],
             email=user_data["email"],
             profile_photo=user_data.get("profile_photo"),
+            profile_photo_variants=files.get_photo_variant_urls(
+                user_data.get("profile_photo")),
             level=user_data["level"],
             points=user_data["points"],
             badges=user_data["badges"],
@@ -235,11 +247,26 @@ async def get_user_profile(user_id: str):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@router.get("/{user_id}/votes", response_model=UserVotesPage)
+async def get_user_votes(
+    user_id: str,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    """Vote history of a user, most recent first; pass next_cursor to continue"""
+    try:
+        page = await db.list_votes('user_id', user_id, ['article_id', 'vote'],
+                                   limit, cursor)
+    except db.InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return UserVotesPage(votes=page['votes'], next_cursor=page['next_cursor'])
+
+
 @router.get("/{user_id}/stats")
 async def get_user_stats(user_id: str):
     """Get user statistics"""
     try:
-        stats = db.get_user_stats(user_id)
+        stats = await db.get_user_stats(user_id)
 
         if not stats:
             raise HTTPException(status_code=404, detail="User not found")
@@ -253,6 +280,33 @@ async def get_user_stats(user_id: str):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+async def set_profile_photo(user_id: str, file_path: Optional[str]) -> dict:
+    """Point the user's profile at a stored photo and build the response"""
+    if not file_path:
+        raise HTTPException(
+            status_code=500, detail="Failed to save profile photo")
+
+    # Generate the full URL for the default-size variant
+    photo_url = files.get_file_url(file_path, size=files.DEFAULT_PHOTO_SIZE)
+
+    # Update user profile with new photo URL
+    success = await db.update_user(user_id, {"profile_photo": photo_url})
+
+    if not success:
+        # Photos are content-addressed and may be shared with other
+        # users, so the stored file is kept even if the update fails
+        raise HTTPException(
+            status_code=500, detail="Failed to update user profile")
+
+    # Return success response with the new photo URL
+    return {
+        "status": "success",
+        "message": "Profile photo uploaded successfully",
+        "profile_photo": photo_url,
+        "profile_photo_variants": files.get_photo_variant_urls(photo_url)
+    }
+
+
 @router.post("/me/upload-photo")
 async def upload_profile_photo(
     file: UploadFile = File(...),
@@ -262,35 +316,100 @@ async def upload_profile_photo(
     try:
         # Save the uploaded file
         file_path = await files.save_profile_photo(current_user["user_id"], file)
+        return await set_profile_photo(current_user["user_id"], file_path)
 
-        if not file_path:
-            raise HTTPException(
-                status_code=500, detail="Failed to save profile photo")
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Error uploading profile photo: {e}")
+        raise HTTPException(
+            status_code=500, detail="Internal server error during photo upload")
 
-        # Generate the full URL for the photo
-        photo_url = files.get_file_url(file_path)
 
-        # Update user profile with new photo URL
-        success = db.update_user(current_user["user_id"], {
-            "profile_photo": photo_url
-        })
+@router.post("/me/upload-photo/stream")
+async def stream_profile_photo(
+    request: Request,
+    content_length: Optional[int] = Header(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Upload profile photo as a raw request body (Content-Type: image/*)
+    The body is validated and written while it arrives
+    """
+    try:
+        file_path = await files.save_profile_photo_stream(
+            current_user["user_id"], request.stream(), content_length)
+        return await set_profile_photo(current_user["user_id"], file_path)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Error streaming profile photo: {e}")
+        raise HTTPException(
+            status_code=500, detail="Internal server error during photo upload")
 
-        if not success:
-            # Clean up the uploaded file if database update fails
-            files.delete_profile_photo(file_path)
-            raise HTTPException(
-                status_code=500, detail="Failed to update user profile")
 
-        # Return success response with the new photo URL
-        return {
-            "status": "success",
-            "message": "Profile photo uploaded successfully",
-            "profile_photo": photo_url
-        }
+@router.post("/me/upload-photo/sessions", status_code=201)
+async def create_photo_upload_session(
+    upload_length: int = Header(...),
+    current_user: dict = Depends(get_current_user)
+):
+    """Start a resumable photo upload of `Upload-Length` bytes"""
+    session = await files.create_upload_session(current_user["user_id"], upload_length)
+    return {
+        "upload_id": session["upload_id"],
+        "offset": session["offset"],
+        "length": session["length"]
+    }
+
+
+@router.get("/me/upload-photo/sessions/{upload_id}")
+async def get_photo_upload_session(
+    upload_id: str,
+    response: Response,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get how many bytes of a resumable upload were received"""
+    session = await files.get_upload_session(current_user["user_id"], upload_id)
+    response.headers["Upload-Offset"] = str(session["offset"])
+    response.headers["Upload-Length"] = str(session["length"])
+    return {
+        "upload_id": upload_id,
+        "offset": session["offset"],
+        "length": session["length"]
+    }
+
+
+@router.patch("/me/upload-photo/sessions/{upload_id}")
+async def append_photo_upload_chunk(
+    upload_id: str,
+    request: Request,
+    response: Response,
+    upload_offset: int = Header(...),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Send the next chunk of a resumable upload, starting at `Upload-Offset`
+    After a dropped connection, GET the session to know where to resume
+    """
+    try:
+        session = await files.append_upload_chunk(
+            current_user["user_id"], upload_id, upload_offset, request.stream())
+        response.headers["Upload-Offset"] = str(session["offset"])
+
+        if "file_path" not in session:
+            return {
+                "status": "in_progress",
+                "upload_id": upload_id,
+                "offset": session["offset"],
+                "length": session["length"]
+            }
+
+        return await set_profile_photo(current_user["user_id"], session["file_path"])
 
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error uploading profile photo: {e}")
+        print(f"❌ Error uploading photo chunk: {e}")
         raise HTTPException(
             status_code=500, detail="Internal server error during photo upload")
@@ -0,0 +1,89 @@
+"""
+Canonical article ids: migration and hit-rate report
+
+    python -m app.scripts.article_ids migrate [--dry-run] [--delete-legacy]
+    python -m app.scripts.article_ids replay traffic.jsonl
+
+`migrate` moves every article stored under a legacy md5 id to the id of
+its canonical text, rewrites its votes and records an alias so that old
+ids keep working. `replay` reads recorded /analyze bodies ({"text": ...}
+per line) and compares the cache hit rate of both id schemes.
+"""
+
+import argparse
+import asyncio
+import json
+from collections import defaultdict
+
+from app.services import analyzer, db
+
+
+async def migrate(dry_run: bool, delete_legacy: bool):
+    legacy_ids = defaultdict(list)
+    async for article in db.iter_article_analyses():
+        if analyzer.is_legacy_article_id(article["article_id"]):
+            canonical_id = analyzer.compute_article_id(article["text"])
+            legacy_ids[canonical_id].append(article["article_id"])
+
+    total = sum(len(ids) for ids in legacy_ids.values())
+    print(f"📊 {total} legacy articles -> {len(legacy_ids)} canonical articles "
+          f"({total - len(legacy_ids)} duplicates collapsed)")
+    if dry_run:
+        return
+
+    votes_moved = 0
+    for canonical_id, ids in legacy_ids.items():
+        for legacy_id in ids:
+            votes_moved += await db.migrate_article_id(
+                legacy_id, canonical_id, delete_legacy)
+    print(f"✅ Migration done: {votes_moved} votes moved, {total} aliases written")
+
+
+def replay(path: str):
+    seen_legacy, seen_canonical = set(), set()
+    requests = legacy_hits = canonical_hits = 0
+
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            text = json.loads(line).get("text", "")
+            requests += 1
+
+            legacy_id = analyzer.legacy_article_id(text)
+            legacy_hits += legacy_id in seen_legacy
+            seen_legacy.add(legacy_id)
+
+            canonical_id = analyzer.compute_article_id(text)
+            canonical_hits += canonical_id in seen_canonical
+            seen_canonical.add(canonical_id)
+
+    if not requests:
+        print("⚠️ No requests to replay")
+        return
+    print(f"📊 {requests} requests replayed")
+    print(f"   Legacy ids:    {len(seen_legacy)} distinct, "
+          f"hit rate {legacy_hits / requests:.1%}")
+    print(f"   Canonical ids: {len(seen_canonical)} distinct, "
+          f"hit rate {canonical_hits / requests:.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subparsers.add_parser("migrate")
+    migrate_parser.add_argument("--dry-run", action="store_true")
+    migrate_parser.add_argument("--delete-legacy", action="store_true")
+    replay_parser = subparsers.add_parser("replay")
+    replay_parser.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        asyncio.run(migrate(args.dry_run, args.delete_legacy))
+    else:
+        replay(args.path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark the extractive compression of Gemini prompts
+
+    python -m app.scripts.benchmark_compression [--limit N] [--budget TOKENS] [--no-calls]
+
+Reports the token reduction over stored articles. Unless --no-calls is
+given, each article is also analyzed on full and compressed text (bulk
+priority) and the agreement between both verdicts is reported.
+"""
+
+import argparse
+import asyncio
+import time
+
+from app.services import analyzer, compression, db, routing
+from app.services.scheduler import BULK
+
+
+async def run(limit: int, budget: int, calls: bool):
+    compression.PROMPT_TOKEN_BUDGET = budget
+    original_tokens = compressed_tokens = compressed_articles = 0
+    same_label = compared = 0
+    score_gap = 0.0
+    started = time.perf_counter()
+
+    async for sample in db.iter_article_analyses(limit):
+        cleaned = analyzer.clean_content(sample["text"])
+        stats = compression.compress(cleaned, budget)
+        original_tokens += stats["original_tokens"]
+        compressed_tokens += stats["compressed_tokens"]
+        compressed_articles += stats["compressed"]
+
+        if not calls or not stats["compressed"]:
+            continue
+        try:
+            full, short = await asyncio.gather(
+                analyzer.analyze_with_gemini(
+                    sample["text"], BULK, routing.FULL_MODEL, compress=False),
+                analyzer.analyze_with_gemini(
+                    sample["text"], BULK, routing.FULL_MODEL, compress=True),
+            )
+        except analyzer.AnalysisUnavailableError as e:
+            print(f"⚠️ Skipped {sample['article_id']}: {e}")
+            continue
+        compared += 1
+        same_label += full["label"] == short["label"]
+        score_gap += abs(full["score"] - short["score"])
+
+    if not original_tokens:
+        print("⚠️ No stored articles to benchmark")
+        return
+
+    reduction = 1 - compressed_tokens / original_tokens
+    print(f"📊 Budget: {budget} tokens")
+    print(f"   Articles compressed: {compressed_articles}")
+    print(f"   Content tokens: {original_tokens} -> {compressed_tokens} "
+          f"({reduction:.1%} reduction)")
+    if compared:
+        print(f"   Verdict agreement (full vs compressed): "
+              f"{same_label / compared:.1%} over {compared} articles")
+        print(f"   Mean absolute score gap: {score_gap / compared:.3f}")
+    print(f"   Elapsed: {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--budget", type=int,
+                        default=compression.PROMPT_TOKEN_BUDGET)
+    parser.add_argument("--no-calls", action="store_true",
+                        help="Only measure token reduction, no Gemini calls")
+    args = parser.parse_args()
+    asyncio.run(run(args.limit, args.budget, not args.no_calls))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Build the on-disk similarity index from stored articles
+
+    python -m app.scripts.build_similarity_index [--limit N] [--sample 20000]
+
+Three streaming passes over the articles keep memory bounded: document
+frequencies, SVD fitted on a sample of sketches, then projection of every
+article. Workers pick the new index up on their next start.
+"""
+
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from app.services import db, similarity
+
+
+async def build(args):
+    started = time.perf_counter()
+
+    # Pass 1: document frequencies over the hashed vocabulary
+    document_frequency = np.zeros(similarity.VOCAB_SIZE, dtype=np.int64)
+    n_documents = 0
+    async for article in db.iter_article_analyses(args.limit):
+        term_ids, _ = similarity.term_counts(article["text"])
+        document_frequency[term_ids] += 1
+        n_documents += 1
+    if n_documents < 2:
+        print("⚠️ Not enough articles to build an index")
+        return
+    idf = similarity.compute_idf(document_frequency, n_documents)
+    print(f"📊 Pass 1: {n_documents} articles")
+
+    # Pass 2: fit the projection on a sample of sketches
+    sample = [similarity.sketch(*similarity.term_counts(a["text"]), idf)
+              async for a in db.iter_article_analyses(min(args.sample, n_documents))]
+    components = similarity.fit_components(np.stack(sample))
+    print(f"📊 Pass 2: SVD fitted on {len(sample)} articles")
+
+    # Pass 3: embed everything
+    ids, vectors = [], []
+    async for article in db.iter_article_analyses(args.limit):
+        term_ids, counts = similarity.term_counts(article["text"])
+        vectors.append(similarity.sketch(term_ids, counts, idf) @ components)
+        ids.append(article["article_id"])
+    vectors = similarity._normalize(np.stack(vectors)).astype(np.float32)
+
+    centroids, offsets, vectors, ids = similarity.build_ivf(vectors, ids)
+    similarity.SimilarityIndex(idf, components, centroids, offsets,
+                               vectors, ids).save(args.output)
+    print(f"✅ Index of {len(ids)} articles ({len(centroids)} lists) saved to "
+          f"{args.output} in {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--sample", type=int, default=20000,
+                        help="Articles used to fit the SVD")
+    parser.add_argument("--output", default=similarity.INDEX_DIR)
+    asyncio.run(build(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
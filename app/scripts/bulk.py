@@ -0,0 +1,368 @@
+"""
+Bulk export / import of Firestore collections (snapshots, staging seeds)
+
+    python -m app.scripts.bulk export OUTPUT_DIR [--collections articles,votes,users]
+                                                 [--format jsonl|parquet] [--page-size 1000]
+    python -m app.scripts.bulk import INPUT_DIR [--collections ...] [--workers 8]
+                                                [--batch-size 500] [--restart]
+
+Export pages through each collection with a cursor on the document id, so
+only one page (or one Parquet part) is held in memory. JSONL output is one
+gzip file per collection; Parquet output is a directory of parts per
+collection. A manifest.json describes the snapshot.
+
+Import streams the files back, groups documents into batched writes and
+runs them on parallel workers. Progress is checkpointed per file in
+INPUT_DIR/import_checkpoint.json: an interrupted import resumes after the
+last batch known to be written (batches are idempotent `set`s).
+"""
+
+import argparse
+import asyncio
+import base64
+import gzip
+import json
+import os
+import time
+from datetime import datetime
+
+from app.services import db
+
+DEFAULT_COLLECTIONS = ["articles", "article_texts", "article_vote_counts",
+                       "votes", "users", "article_aliases", "claims"]
+PARQUET_PART_ROWS = 50000
+MAX_BATCH_SIZE = 500  # Firestore limit per batched write
+CHECKPOINT_INTERVAL_SECONDS = 5
+REPORT_INTERVAL_SECONDS = 10
+
+
+class Throughput:
+    """Periodic documents/second report"""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.count = 0
+        self.started = self.last_report = time.perf_counter()
+
+    def add(self, n: int):
+        self.count += n
+        now = time.perf_counter()
+        if now - self.last_report >= REPORT_INTERVAL_SECONDS:
+            self.last_report = now
+            print(f"   {self.label}: {self.count} documents "
+                  f"({self.count / (now - self.started):.0f}/s)")
+
+    def done(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        print(f"✅ {self.label}: {self.count} documents in {elapsed:.1f}s "
+              f"({self.count / elapsed:.0f}/s)")
+
+
+# === JSON encoding of Firestore values ===
+
+def encode_value(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    if isinstance(value, bytes):
+        return {"$bytes": base64.b64encode(value).decode()}
+    if isinstance(value, dict):
+        return {k: encode_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [encode_value(v) for v in value]
+    return value
+
+
+def decode_value(value):
+    if isinstance(value, dict):
+        if value.keys() == {"$date"}:
+            return datetime.fromisoformat(value["$date"])
+        if value.keys() == {"$bytes"}:
+            return base64.b64decode(value["$bytes"])
+        return {k: decode_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decode_value(v) for v in value]
+    return value
+
+
+# === Export ===
+
+async def export_jsonl(collection: str, output_dir: str, page_size: int,
+                       throughput: Throughput) -> dict:
+    path = os.path.join(output_dir, f"{collection}.jsonl.gz")
+    count = 0
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        async for document_id, data in db.iter_collection(collection, page_size):
+            f.write(json.dumps({"_id": document_id, "data": encode_value(data)},
+                               ensure_ascii=False) + "\n")
+            count += 1
+            throughput.add(1)
+    return {"format": "jsonl", "files": [os.path.basename(path)], "documents": count}
+
+
+def null_paths(data: dict, prefix: str = "") -> list:
+    """Dotted paths of the fields explicitly set to null (inside maps too)"""
+    paths = []
+    for key, value in data.items():
+        path = f"{prefix}{key}"
+        if value is None:
+            paths.append(path)
+        elif isinstance(value, dict):
+            paths.extend(null_paths(value, f"{path}."))
+    return paths
+
+
+def drop_absent(data: dict, nulls: set, prefix: str = "") -> dict:
+    """
+    Parquet reads fields missing from a document (columns or struct fields
+    of other documents) as null: keep only the nulls listed in `_nulls`
+    """
+    kept = {}
+    for key, value in data.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            kept[key] = drop_absent(value, nulls, f"{path}.")
+        elif value is not None or path in nulls:
+            kept[key] = value
+    return kept
+
+
+def _parquet_table(rows: list):
+    """
+    One column per top-level field, plus `_nulls` telling explicit nulls
+    from absent fields; parts whose fields can't share a column type fall
+    back to a JSON-encoded `_json` column
+    """
+    import pyarrow as pa
+
+    # from_pylist takes its columns from the first row: list every field
+    names = list(dict.fromkeys(name for _, data in rows for name in data))
+    try:
+        return pa.Table.from_pylist(
+            [{"_id": document_id, "_nulls": null_paths(data),
+              **{name: data.get(name) for name in names}}
+             for document_id, data in rows])
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.Table.from_pylist([
+            {"_id": document_id,
+             "_json": json.dumps(encode_value(data), ensure_ascii=False)}
+            for document_id, data in rows])
+
+
+async def export_parquet(collection: str, output_dir: str, page_size: int,
+                         throughput: Throughput) -> dict:
+    import pyarrow.parquet as pq
+
+    directory = os.path.join(output_dir, collection)
+    os.makedirs(directory, exist_ok=True)
+    files, rows, count = [], [], 0
+
+    def write_part():
+        name = f"part-{len(files):05d}.parquet"
+        pq.write_table(_parquet_table(rows), os.path.join(directory, name),
+                       compression="zstd")
+        files.append(f"{collection}/{name}")
+        rows.clear()
+
+    async for document_id, data in db.iter_collection(collection, page_size):
+        rows.append((document_id, data))
+        count += 1
+        throughput.add(1)
+        if len(rows) >= PARQUET_PART_ROWS:
+            write_part()
+    if rows:
+        write_part()
+    return {"format": "parquet", "files": files, "documents": count}
+
+
+async def export(output_dir: str, collections: list, fmt: str, page_size: int):
+    if not db.get_db():
+        print("⚠️ Firebase not configured")
+        return
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {"created_at": datetime.now().isoformat(), "collections": {}}
+    exporter = export_parquet if fmt == "parquet" else export_jsonl
+
+    for collection in collections:
+        throughput = Throughput(f"export {collection}")
+        manifest["collections"][collection] = await exporter(
+            collection, output_dir, page_size, throughput)
+        throughput.done()
+
+    with open(os.path.join(output_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"✅ Snapshot written to {output_dir}")
+
+
+# === Import ===
+
+def read_file(path: str, fmt: str, skip: int):
+    """(id, data) of a snapshot file, skipping the first `skip` documents"""
+    if fmt == "jsonl":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for index, line in enumerate(f):
+                if index >= skip and line.strip():
+                    record = json.loads(line)
+                    yield record["_id"], decode_value(record["data"])
+        return
+
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path)
+    index = 0
+    for record_batch in parquet_file.iter_batches():
+        if index + record_batch.num_rows <= skip:
+            index += record_batch.num_rows
+            continue
+        for row in record_batch.to_pylist():
+            if index >= skip:
+                document_id = row.pop("_id")
+                if "_json" in row:
+                    data = decode_value(json.loads(row["_json"]))
+                else:
+                    # Snapshots without `_nulls` predate it: every null was absent
+                    nulls = set(row.pop("_nulls", None) or [])
+                    data = drop_absent(row, nulls)
+                yield document_id, data
+            index += 1
+
+
+class Checkpoint:
+    """Documents durably written per file, saved periodically"""
+
+    def __init__(self, path: str, restart: bool):
+        self.path = path
+        self.done = {}
+        if not restart and os.path.exists(path):
+            with open(path) as f:
+                self.done = json.load(f)
+        self.saved_at = time.perf_counter()
+
+    def save(self, force: bool = False):
+        if force or time.perf_counter() - self.saved_at >= CHECKPOINT_INTERVAL_SECONDS:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.done, f)
+            os.replace(tmp_path, self.path)
+            self.saved_at = time.perf_counter()
+
+
+async def write_with_retry(collection: str, documents: list, attempts: int = 3):
+    for attempt in range(attempts):
+        try:
+            return await db.write_documents(collection, documents)
+        except Exception as e:
+            if attempt == attempts - 1:
+                raise
+            print(f"⚠️ Batch write failed ({e}), retrying")
+            await asyncio.sleep(2 ** attempt)
+
+
+async def import_file(collection: str, path: str, key: str, fmt: str,
+                      checkpoint: Checkpoint, workers: int, batch_size: int,
+                      throughput: Throughput):
+    skip = checkpoint.done.get(key, 0)
+    if skip:
+        print(f"   {key}: resuming after {skip} documents")
+
+    # Bounded queue: the reader never gets more than a few batches ahead
+    queue = asyncio.Queue(maxsize=workers * 2)
+    # Batches finish out of order; the checkpoint only advances over the
+    # contiguous prefix of written batches
+    finished = {}
+    next_to_mark = 0
+    errors = []
+
+    async def worker():
+        nonlocal next_to_mark
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            if errors:
+                continue  # Keep draining so the reader never blocks
+            index, documents = item
+            try:
+                await write_with_retry(collection, documents)
+            except Exception as e:
+                errors.append(e)
+                continue
+            throughput.add(len(documents))
+            finished[index] = len(documents)
+            while next_to_mark in finished:
+                checkpoint.done[key] = checkpoint.done.get(key, 0) + finished.pop(next_to_mark)
+                next_to_mark += 1
+            checkpoint.save()
+
+    tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+    batch, index = [], 0
+    try:
+        for document in read_file(path, fmt, skip):
+            batch.append(document)
+            if len(batch) == batch_size:
+                await queue.put((index, batch))
+                batch, index = [], index + 1
+        if batch:
+            await queue.put((index, batch))
+        for _ in tasks:
+            await queue.put(None)
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        checkpoint.save(force=True)
+    if errors:
+        raise RuntimeError(f"Import of {key} stopped at document "
+                           f"{checkpoint.done.get(key, 0)}: {errors[0]}")
+
+
+async def import_snapshot(input_dir: str, collections: list, workers: int,
+                          batch_size: int, restart: bool):
+    if not db.get_db():
+        print("⚠️ Firebase not configured")
+        return
+    with open(os.path.join(input_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    checkpoint = Checkpoint(os.path.join(
+        input_dir, "import_checkpoint.json"), restart)
+
+    for collection, entry in manifest["collections"].items():
+        if collections and collection not in collections:
+            continue
+        throughput = Throughput(f"import {collection}")
+        for name in entry["files"]:
+            await import_file(collection, os.path.join(input_dir, name), name,
+                              entry["format"], checkpoint, workers, batch_size,
+                              throughput)
+        throughput.done()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("output")
+    export_parser.add_argument("--collections", default=",".join(DEFAULT_COLLECTIONS))
+    export_parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    export_parser.add_argument("--page-size", type=int, default=1000)
+
+    import_parser = subparsers.add_parser("import")
+    import_parser.add_argument("input")
+    import_parser.add_argument("--collections", default="",
+                               help="Subset of the snapshot to import (default: all)")
+    import_parser.add_argument("--workers", type=int, default=8)
+    import_parser.add_argument("--batch-size", type=int, default=MAX_BATCH_SIZE)
+    import_parser.add_argument("--restart", action="store_true",
+                               help="Ignore the checkpoint and import everything")
+    args = parser.parse_args()
+    collections = [c.strip() for c in args.collections.split(",") if c.strip()]
+
+    if args.command == "export":
+        asyncio.run(export(args.output, collections, args.format, args.page_size))
+    else:
+        asyncio.run(import_snapshot(args.input, collections, args.workers,
+                                    min(args.batch_size, MAX_BATCH_SIZE), args.restart))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Move votes to deterministic ids and build the per-article vote counters
+
+    python -m app.scripts.dedupe_votes [--dry-run]
+
+Votes used to be added with random ids, so a user could vote many times on
+the same article. This keeps the most recent vote of each (article, user)
+pair under `{article_id}_{user_id}`, deletes the duplicates and rewrites
+`article_vote_counts` (raw and reputation-weighted) from the remaining
+votes. Each kept vote records the weight it was counted with.
+"""
+
+import argparse
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from app.services import db
+
+BATCH_SIZE = 400
+_EPOCH = datetime.min.replace(tzinfo=timezone.utc)
+
+
+async def dedupe(dry_run: bool):
+    client = db.get_db()
+    if not client:
+        print("⚠️ Firebase not configured")
+        return
+
+    latest = {}
+    to_delete = []
+    scanned = 0
+    async for vote in client.collection('votes').stream():
+        scanned += 1
+        data = vote.to_dict()
+        key = (data['article_id'], data['user_id'])
+        kept = latest.get(key)
+        if kept is None:
+            latest[key] = vote
+            continue
+        # Keep the most recent vote of the pair
+        if (data.get('timestamp') or _EPOCH) > (kept.to_dict().get('timestamp') or _EPOCH):
+            latest[key], vote = vote, kept
+        to_delete.append(vote.reference)
+
+    # Voter weights from the reputations stored on user documents
+    user_ids = list(dict.fromkeys(user_id for _, user_id in latest))
+    user_weights = dict(zip(user_ids, (await db.get_voter_weights(user_ids)).tolist()))
+
+    counts = defaultdict(lambda: {'positive': 0, 'negative': 0,
+                                  'weighted_positive': 0.0, 'weighted_negative': 0.0})
+    rekeyed = 0
+    for (article_id, user_id), vote in latest.items():
+        value = vote.to_dict()['vote']
+        if value == 1:
+            counts[article_id]['positive'] += 1
+            counts[article_id]['weighted_positive'] += user_weights[user_id]
+        elif value == -1:
+            counts[article_id]['negative'] += 1
+            counts[article_id]['weighted_negative'] += user_weights[user_id]
+        rekeyed += vote.id != db.vote_id(article_id, user_id)
+
+    print(f"📊 {scanned} votes: {len(latest)} kept, {len(to_delete)} duplicates, "
+          f"{rekeyed} to re-key, {len(counts)} articles")
+    if dry_run:
+        return
+
+    batch, pending = client.batch(), 0
+
+    async def flush(force=False):
+        nonlocal batch, pending
+        if pending and (force or pending >= BATCH_SIZE):
+            await batch.commit()
+            batch, pending = client.batch(), 0
+
+    for ref in to_delete:
+        batch.delete(ref)
+        pending += 1
+        await flush()
+    for (article_id, user_id), vote in latest.items():
+        target = client.collection('votes').document(db.vote_id(article_id, user_id))
+        batch.set(target, {**vote.to_dict(), 'weight': user_weights[user_id]})
+        pending += 1
+        if vote.id != target.id:
+            batch.delete(vote.reference)
+            pending += 1
+        await flush()
+    for article_id, article_counts in counts.items():
+        batch.set(client.collection('article_vote_counts').document(article_id),
+                  article_counts, merge=True)  # Keeps the trending counters
+        pending += 1
+        await flush()
+    await flush(force=True)
+    print("✅ Votes deduplicated and counters rebuilt")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--dry-run", action="store_true")
+    asyncio.run(dedupe(parser.parse_args().dry_run))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Recompute every user's reputation from all votes in one pass
+
+    python -m app.scripts.recompute_reputation [--dry-run] [--workers 8]
+
+`update_user_reputation` only runs for the user who just voted, so the
+reputation of earlier voters drifts as consensus changes. This job streams
+the votes into flat NumPy arrays (a sparse user x article matrix in
+coordinate form), computes the consensus of every article and the accuracy
+of every user with bincounts, and writes the reputations that changed back
+with batched writes. Same rules as `update_user_reputation`.
+"""
+
+import argparse
+import asyncio
+import time
+from array import array
+
+import numpy as np
+
+from app.services import db
+
+WRITE_BATCH_SIZE = 500
+CHANGE_EPSILON = 1e-6
+
+
+async def load_votes():
+    """Votes as (user index, article index, vote) arrays plus the index -> id lists"""
+    user_rows, article_rows = {}, {}
+    users, articles, votes = array("i"), array("i"), array("b")
+    async for _, vote in db.iter_collection("votes", page_size=5000,
+                                            field_paths=["user_id", "article_id", "vote"]):
+        users.append(user_rows.setdefault(vote["user_id"], len(user_rows)))
+        articles.append(article_rows.setdefault(vote["article_id"], len(article_rows)))
+        votes.append(vote["vote"])
+    return (np.frombuffer(users, dtype=np.int32), np.frombuffer(articles, dtype=np.int32),
+            np.frombuffer(votes, dtype=np.int8), list(user_rows), len(article_rows))
+
+
+def compute_reputation(users: np.ndarray, articles: np.ndarray, votes: np.ndarray,
+                       n_users: int, n_articles: int) -> np.ndarray:
+    """Share of each user's votes that agree with an established consensus"""
+    positive = np.bincount(articles, weights=votes == 1, minlength=n_articles)
+    negative = np.bincount(articles, weights=votes == -1, minlength=n_articles)
+    consensus = np.where(positive > negative, 1, -1)
+    established = positive + negative >= db.MIN_CONSENSUS_VOTES
+
+    accurate = established[articles] & (votes == consensus[articles])
+    accurate_votes = np.bincount(users, weights=accurate, minlength=n_users)
+    total_votes = np.bincount(users, minlength=n_users)
+    return accurate_votes / np.maximum(total_votes, 1)
+
+
+async def load_current_reputation(user_ids: list) -> np.ndarray:
+    rows = {user_id: row for row, user_id in enumerate(user_ids)}
+    # NaN = no user document: nothing to update
+    current = np.full(len(user_ids), np.nan)
+    async for user_id, user in db.iter_collection("users", page_size=5000,
+                                                  field_paths=["reputation"]):
+        row = rows.get(user_id)
+        if row is not None:
+            current[row] = user.get("reputation", 0.0)
+    return current
+
+
+async def write_reputations(updates: list, workers: int):
+    semaphore = asyncio.Semaphore(workers)
+
+    async def write(chunk):
+        async with semaphore:
+            await db.write_documents("users", chunk, merge=True)
+
+    await asyncio.gather(*(write(updates[i:i + WRITE_BATCH_SIZE])
+                           for i in range(0, len(updates), WRITE_BATCH_SIZE)))
+
+
+async def recompute(dry_run: bool, workers: int):
+    if not db.get_db():
+        print("⚠️ Firebase not configured")
+        return
+    started = time.perf_counter()
+
+    users, articles, votes, user_ids, n_articles = await load_votes()
+    if not len(votes):
+        print("⚠️ No votes")
+        return
+    print(f"📊 {len(votes)} votes, {len(user_ids)} voters, {n_articles} articles "
+          f"loaded in {time.perf_counter() - started:.1f}s")
+
+    reputation = compute_reputation(users, articles, votes, len(user_ids), n_articles)
+    current = await load_current_reputation(user_ids)
+    changed = np.flatnonzero(~np.isnan(current)
+                             & (np.abs(reputation - np.nan_to_num(current)) > CHANGE_EPSILON))
+    print(f"📊 Reputation: mean {reputation.mean():.3f}, "
+          f"{len(changed)} users to update")
+    if dry_run:
+        return
+
+    updates = [(user_ids[row], {"reputation": float(reputation[row])}) for row in changed]
+    await write_reputations(updates, workers)
+    print(f"✅ {len(updates)} reputations written in "
+          f"{time.perf_counter() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(recompute(args.dry_run, args.workers))
+
+
+if __name__ == "__main__":
+    main()
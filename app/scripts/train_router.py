@@ -0,0 +1,64 @@
+"""
+Train the local routing classifier from stored analyses
+
+    python -m app.scripts.train_router [--limit N] [--output models/router.npz]
+
+A held-out 10% split reports how often each confidence band agrees with
+the stored Gemini verdict, to help pick the routing thresholds.
+"""
+
+import argparse
+import asyncio
+import random
+
+import numpy as np
+
+from app.services import db, routing
+
+
+async def load_samples(limit):
+    return [s async for s in db.iter_article_analyses(limit)
+            if s["label"] in routing.LABELS]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--output", default=routing.MODEL_PATH)
+    parser.add_argument("--epochs", type=int, default=5)
+    args = parser.parse_args()
+
+    samples = asyncio.run(load_samples(args.limit))
+    if len(samples) < 50:
+        print(f"⚠️ Only {len(samples)} labelled analyses - not enough to train")
+        return
+
+    random.seed(0)
+    random.shuffle(samples)
+    split = int(len(samples) * 0.9)
+    train, held_out = samples[:split], samples[split:]
+
+    model = routing.HashedNgramClassifier()
+    model.train([s["text"] for s in train], [s["label"] for s in train],
+                [s["score"] for s in train], epochs=args.epochs)
+    model.save(args.output)
+    print(f"✅ Model trained on {len(train)} analyses -> {args.output}")
+
+    # Agreement per confidence band on the held-out split
+    bands = [(0.0, 0.5), (0.5, 0.75), (0.75, 0.9), (0.9, 0.97), (0.97, 1.01)]
+    for low, high in bands:
+        hits = total = 0
+        for sample in held_out:
+            probabilities = model.predict_proba(sample["text"])
+            confidence = float(probabilities.max())
+            if low <= confidence < high:
+                total += 1
+                hits += routing.LABELS[int(np.argmax(probabilities))
+                                       ] == sample["label"]
+        if total:
+            print(f"   confidence [{low:.2f}, {high:.2f}): "
+                  f"{total} samples, agreement {hits / total:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Admission control for fresh analyses (cache misses that need Gemini)
+
+Analyses waiting on the Gemini scheduler are bounded: a new one is shed
+with a fast 503 + Retry-After when too many are already pending, or when
+the expected queue time (queued jobs x service time / concurrency, and the
+token bucket refill) exceeds the maximum wait. Admitted jobs still give
+up if they spend longer than that in the queue. Cache hits never get here.
+"""
+
+import math
+import os
+from contextlib import asynccontextmanager
+
+from . import metrics
+from .scheduler import scheduler, INTERACTIVE, BULK
+
+# Configuration
+MAX_PENDING_ANALYSES = int(os.getenv("ANALYSIS_MAX_PENDING", 64))
+MAX_QUEUE_WAIT_SECONDS = float(os.getenv("ANALYSIS_MAX_QUEUE_WAIT_SECONDS", 15))
+
+_pending = 0
+
+
+class AdmissionRejectedError(Exception):
+    """The analysis queue is full; the client should come back later"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def estimate_queue_time() -> float:
+    """Expected wait of a new interactive analysis, in seconds"""
+    return scheduler.estimated_wait(INTERACTIVE)
+
+
+def publish_gauges():
+    metrics.set_gauge("analysis_admission_pending", _pending)
+    metrics.set_gauge("analysis_queue_wait_estimate_seconds",
+                      round(estimate_queue_time(), 3))
+    metrics.set_gauge("gemini_queue_depth", scheduler.queue_size(INTERACTIVE),
+                      lane="interactive")
+    metrics.set_gauge("gemini_queue_depth", scheduler.queue_size(BULK), lane="bulk")
+
+
+@asynccontextmanager
+async def admit():
+    """
+    Hold an analysis slot for the block
+    Raises AdmissionRejectedError when the queue is full or too slow
+    """
+    global _pending
+    estimate = estimate_queue_time()
+    if _pending >= MAX_PENDING_ANALYSES or estimate > MAX_QUEUE_WAIT_SECONDS:
+        reason = "full" if _pending >= MAX_PENDING_ANALYSES else "slow"
+        metrics.increment("admission_rejected_total", reason=reason)
+        publish_gauges()
+        # Come back once the backlog ahead has drained
+        retry_after = max(1, math.ceil(estimate))
+        raise AdmissionRejectedError(
+            f"Analysis queue {reason} ({_pending} pending, ~{estimate:.0f}s wait)",
+            retry_after=retry_after)
+
+    _pending += 1
+    metrics.increment("admission_admitted_total")
+    publish_gauges()
+    try:
+        yield
+    finally:
+        _pending -= 1
+        publish_gauges()
@@ -1,15 +1,81 @@
 # --- Fact-Flow Backend: AI-Powered Fact Checker with Gemini ---
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from dotenv import load_dotenv
-from google import genai
+import asyncio
+import hashlib
 import os
 import re
+import time
+import unicodedata
 from datetime import datetime
-from . import db
+from starlette.concurrency import run_in_threadpool
+from . import db, routing, compression, metrics, context_cache, admission, deadline, claims as claim_cache
+from .scheduler import scheduler, INTERACTIVE, BULK, CircuitOpenError, QueueTimeoutError
 
 load_dotenv()
 
-client = genai.Client()
+# Gemini client, created lazily once per worker process
+_client = None
+_client_pid = None
+
+
+def get_client():
+    """Return the Gemini client of the current process"""
+    global _client, _client_pid
+    if _client_pid != os.getpid():
+        # Imported here: the SDK is heavy and not needed to import the app
+        from google import genai
+        _client = genai.Client()
+        _client_pid = os.getpid()
+    return _client
+
+# Background tasks (agreement checks) kept referenced until done
+_background_tasks = set()
+
+# Static fact-checking instructions, shared by every request (context-cached)
+SYSTEM_INSTRUCTION = """Tu es un expert en vérification des faits (fact-checker) professionnel. Tu dois analyser le contenu fourni et déterminer sa fiabilité.
+
+CONTEXTE IMPORTANT:
+- La date du jour est indiquée avec chaque contenu (ce n'est pas la date de l'article)
+- Tu reçois le contenu textuel d'une page web qui peut contenir des éléments inutiles (menus, publicités, etc.)
+- Pour les pages longues, seules les phrases principales de l'article sont conservées (titre, chapeau, affirmations, citations et sources)
+- Concentre-toi sur l'article ou l'information principale
+- Ignore les éléments de navigation, publicités, commentaires, etc.
+
+INSTRUCTIONS:
+1. Identifie l'article ou information principale dans ce contenu
+2. Évalue la fiabilité de cette information en analysant:
+   - Sources citées et leur crédibilité
+   - Cohérence des faits présentés
+   - Présence de biais ou manipulation
+   - Véracité des affirmations factuelles
+   - Qualité du journalisme/rédaction
+   - Contexte temporel et pertinence
+
+3. Attribue un score de fiabilité de 0 à 1:
+   - 0.0-0.39: Information probablement fausse/trompeuse (Rouge)
+   - 0.4-0.74: Information incertaine, nécessite vérification (Jaune)
+   - 0.75-1.0: Information probablement fiable (Vert)
+
+4. Fournis une explication claire et concise en anglais (2-3 phrases) justifiant ton évaluation
+
+5. Si une liste "AFFIRMATIONS À ÉVALUER" est fournie, évalue aussi chaque affirmation individuellement (mêmes barèmes de score et de label, explication d'une phrase en anglais)
+
+RÉPONSE REQUISE (format JSON):
+{
+    "score": [score numérique entre 0 et 1],
+    "label": "[Green/Yellow/Red]",
+    "explanation": "[explication de 2-3 phrases en anglais]",
+    "main_topic": "[sujet principal identifié en anglais]",
+    "claims": [{"id": [numéro de l'affirmation], "score": [0-1], "label": "[Green/Yellow/Red]", "explanation": "[une phrase en anglais]"}]
+}
+Omets "claims" si aucune affirmation n'est fournie.
+
+Réponds uniquement avec le JSON, sans autres commentaires."""
+
+# Community score weighted by voter reputation (see services/weights.py)
+WEIGHTED_COMMUNITY_SCORE = os.getenv(
+    "WEIGHTED_COMMUNITY_SCORE", "true").lower() == "true"
 
 # Thresholds for Green/Yellow/Red labels based on analysis confidence
 CONFIDENCE_THRESHOLDS = {
@@ -18,6 +84,14 @@ CONFIDENCE_THRESHOLDS = {
 }
 
 
+class AnalysisUnavailableError(Exception):
+    """The model could not be reached; nothing should be stored"""
+
+    def __init__(self, message: str, retry_after: float = 30):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
 def clean_content(raw_content: str) -> str:
     """
     Clean and extract main content from raw text (inner text from web pages)
@@ -112,61 +186,123 @@ def clean_content(raw_content: str) -> str:
         return raw_content
 
 
-async def analyze_with_gemini(content: str) -> Dict[str, Any]:
+# Invisible characters and tracking parameters that vary between copies
+_INVISIBLE_CHARS = re.compile(r'[\u200b\u200c\u200d\u2060\ufeff\u00ad]')
+_TRACKING_PARAMS = re.compile(
+    r'[?&](?:utm_[a-z]+|fbclid|gclid|mc_cid|mc_eid|ref)=[^\s&#]*', re.IGNORECASE)
+
+
+def canonicalize_text(text: str) -> str:
+    """
+    Canonical form of an article: Unicode NFC, invisible characters and
+    tracking parameters removed, boilerplate stripped, whitespace folded
+    """
+    text = unicodedata.normalize('NFC', text)
+    text = _INVISIBLE_CHARS.sub('', text)
+    text = _TRACKING_PARAMS.sub('', text)
+    text = clean_content(text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def compute_article_id(text: str) -> str:
+    """
+    Article id derived from the canonical text
+    40 hex chars (blake2b-160), distinct from the 32-char legacy md5 ids
+    """
+    canonical = canonicalize_text(text)
+    return hashlib.blake2b(canonical.encode(), digest_size=20).hexdigest()
+
+
+def legacy_article_id(text: str) -> str:
+    """Former id: md5 of the raw request text"""
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+def is_legacy_article_id(article_id: str) -> bool:
+    return len(article_id) == 32
+
+
+def _prompt_content(content: str, compress: bool):
+    """Cleaned (and compressed) article text, with the compression stats"""
+    cleaned_content = clean_content(content)
+    if not compress:
+        return cleaned_content, None
+    compressed = compression.compress(cleaned_content)
+    return compressed["text"], compressed
+
+
+def _prescreen(content: str):
+    """Routing decision, extracted claims and their coverage of the article"""
+    decision = routing.route(content)
+    cleaned = clean_content(content)
+    claims = claim_cache.extract_claims(cleaned)
+    return decision, claims, claim_cache.claim_coverage(cleaned, claims)
+
+
+async def analyze_with_gemini(
+    content: str,
+    priority: int = INTERACTIVE,
+    model: str = routing.FULL_MODEL,
+    compress: bool = True,
+    claims: Optional[List[Dict[str, str]]] = None,
+    max_wait: Optional[float] = None
+) -> Dict[str, Any]:
     """
     Analyze content using Gemini AI model for fact-checking
     Handles raw text content from web pages
+    With `claims`, per-claim verdicts are returned under "claim_verdicts"
+    With `max_wait`, gives up if the call is still queued after that many seconds
+    Raises AnalysisUnavailableError when the model can't be reached
     """
     try:
-        # Clean the raw content to focus on main information
-        cleaned_content = clean_content(content)
+        # Clean the raw content to focus on main information, then keep only
+        # the claim-bearing sentences within the prompt token budget
+        # (CPU-bound: run in the threadpool, off the event loop)
+        cleaned_content, compressed = await run_in_threadpool(
+            _prompt_content, content, compress)
+        if compressed:
+            metrics.increment("prompt_content_tokens_total",
+                              compressed["original_tokens"], stage="cleaned")
+            metrics.increment("prompt_content_tokens_total",
+                              compressed["compressed_tokens"], stage="compressed")
 
         # Get current date for context
         current_date = datetime.now().strftime("%Y-%m-%d")
 
-        # Build comprehensive prompt for fact-checking analysis
-        prompt = f"""Tu es un expert en vérification des faits (fact-checker) professionnel. Tu dois analyser le contenu suivant et déterminer sa fiabilité.
-
-CONTEXTE IMPORTANT:
-- Date d'aujourd'hui: {current_date} (Ce n'est pas la date de l'article)
-- Tu reçois le contenu textuel complet d'une page web qui peut contenir des éléments inutiles (menus, publicités, etc.)
-- Concentre-toi sur l'article ou l'information principale
-- Ignore les éléments de navigation, publicités, commentaires, etc.
+        # Only the date and the article are sent: the static instructions
+        # live in a cached-content resource (or the system instruction)
+        prompt = f"""Date d'aujourd'hui: {current_date} (Ce n'est pas la date de l'article)
 
 CONTENU À ANALYSER:
-{cleaned_content}
+{cleaned_content}"""
+        if claims:
+            numbered = "\n".join(
+                f"{i}. {claim['text']}" for i, claim in enumerate(claims, 1))
+            prompt += f"\n\nAFFIRMATIONS À ÉVALUER:\n{numbered}"
 
-INSTRUCTIONS:
-1. Identifie l'article ou information principale dans ce contenu
-2. Évalue la fiabilité de cette information en analysant:
-   - Sources citées et leur crédibilité
-   - Cohérence des faits présentés
-   - Présence de biais ou manipulation
-   - Véracité des affirmations factuelles
-   - Qualité du journalisme/rédaction
-   - Contexte temporel et pertinence
-
-3. Attribue un score de fiabilité de 0 à 1:
-   - 0.0-0.39: Information probablement fausse/trompeuse (Rouge)
-   - 0.4-0.74: Information incertaine, nécessite vérification (Jaune)  
-   - 0.75-1.0: Information probablement fiable (Vert)
-
-4. Fournis une explication claire et concise en anglais (2-3 phrases) justifiant ton évaluation
-
-RÉPONSE REQUISE (format JSON):
-{{
-    "score": [score numérique entre 0 et 1],
-    "label": "[Green/Yellow/Red]",
-    "explanation": "[explication de 2-3 phrases en anglais]",
-    "main_topic": "[sujet principal identifié en anglais]"
-}}
-
-Réponds uniquement avec le JSON, sans autres commentaires."""
+        client = get_client()
+        config = await context_cache.build_config(client, model, SYSTEM_INSTRUCTION)
 
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
-        )
+        async def generate():
+            nonlocal config
+            try:
+                return await client.aio.models.generate_content(
+                    model=model, contents=prompt, config=config)
+            except Exception as e:
+                # Cache deleted or expired server-side: fall back once
+                if not config.cached_content or getattr(e, "code", None) not in (400, 403, 404):
+                    raise
+                context_cache.invalidate(model, SYSTEM_INSTRUCTION)
+                config = await context_cache.build_config(client, model, SYSTEM_INSTRUCTION)
+                return await client.aio.models.generate_content(
+                    model=model, contents=prompt, config=config)
+
+        # Paced, retried and circuit-broken by the scheduler; a deadline
+        # timeout cancels the job whether it is queued or in flight
+        response = await deadline.bounded(
+            scheduler.submit(generate, priority=priority, max_wait=max_wait), "gemini")
+        context_cache.record_usage(
+            response, model, cache_used=bool(config.cached_content))
 
         print(f"🤖 Gemini analysis: {response.text}")
 
@@ -225,7 +361,8 @@ Réponds uniquement avec le JSON, sans autres commentaires."""
                 "explanation": explanation,
                 "confidence": confidence,
                 "main_topic": main_topic,
-                "api_available": True
+                "api_available": True,
+                "claim_verdicts": parse_claim_verdicts(result.get('claims'), claims or [])
             }
 
         except json.JSONDecodeError as e:
@@ -325,22 +462,53 @@ Réponds uniquement avec le JSON, sans autres commentaires."""
                     "api_available": True
                 }
 
+    except deadline.DeadlineExceededError:
+        raise
+    except CircuitOpenError as e:
+        print(f"⚠️ Gemini indisponible (circuit ouvert): {e}")
+        raise AnalysisUnavailableError(str(e), retry_after=e.retry_after)
+    except QueueTimeoutError as e:
+        print(f"⚠️ Gemini saturé: {e}")
+        metrics.increment("admission_queue_timeouts_total")
+        raise AnalysisUnavailableError(
+            str(e), retry_after=max(1, round(admission.estimate_queue_time())))
     except Exception as e:
+        # No placeholder verdict: it would be cached as a real analysis
         print(f"⚠️ Erreur lors de l'analyse Gemini: {e}")
-        return {
-            "score": 0.5,
-            "label": "Yellow",
-            "explanation": "Erreur lors de l'analyse IA - vérification manuelle recommandée",
-            "confidence": "low",
-            "api_available": False
-        }
+        raise AnalysisUnavailableError(str(e))
+
+
+def parse_claim_verdicts(raw_claims: Any, claims: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    """Match the per-claim verdicts of a Gemini answer to the claims sent"""
+    verdicts = []
+    if not isinstance(raw_claims, list):
+        return verdicts
+    for raw in raw_claims:
+        try:
+            index = int(raw.get('id')) - 1
+            if not 0 <= index < len(claims):
+                continue
+            score = max(0.0, min(1.0, float(raw.get('score'))))
+            label = raw.get('label')
+            if label not in ['Green', 'Yellow', 'Red']:
+                label = claim_cache.label_for_score(score)
+            verdicts.append({
+                **claims[index],
+                "score": round(score, 2),
+                "label": label,
+                "explanation": raw.get('explanation', '')
+            })
+        except (AttributeError, TypeError, ValueError):
+            continue
+    return verdicts
 
 
-async def analyze_text(content: str) -> Dict[str, Any]:
+async def analyze_text(content: str, priority: int = INTERACTIVE) -> Dict[str, Any]:
     """
     Main text analysis function
     Uses Gemini AI to analyze content for fact-checking
     Handles both HTML pages and plain text
+    Runs within the caller's deadline (see services/deadline.py)
     """
     # Basic verification
     if not content or len(content.strip()) < 10:
@@ -352,29 +520,101 @@ async def analyze_text(content: str) -> Dict[str, Any]:
             "api_available": False
         }
 
-    # Analysis with Gemini AI
-    result = await analyze_with_gemini(content)
+    started = time.perf_counter()
+
+    # Local pre-screen decides which model tier handles the text; claims
+    # already checked in other articles are answered from the claim cache,
+    # by verdicts of the same or a stronger model tier only.
+    # Hashing, claim extraction and coverage are CPU-bound: threadpool
+    decision, claims, coverage = await run_in_threadpool(_prescreen, content)
+    known = claim_cache.usable_verdicts(
+        await db.get_claim_verdicts([c["claim_id"] for c in claims]), decision.tier)
+    novel = [c for c in claims if c["claim_id"] not in known]
+    metrics.increment("claim_cache_lookups_total",
+                      len(claims) - len(novel), result="hit")
+    metrics.increment("claim_cache_lookups_total", len(novel), result="miss")
+
+    # Cache-only answer when the cached claims cover the article: otherwise
+    # the rest of the text could hold a claim nobody has checked
+    if claims and not novel and coverage >= claim_cache.MIN_CLAIM_COVERAGE:
+        result = claim_cache.aggregate_verdicts(list(known.values()))
+        result["model_tier"] = "claim_cache"
+        metrics.increment("claim_cache_requests_total", outcome="full_hit")
+        metrics.observe("analysis_latency_seconds",
+                        time.perf_counter() - started, tier="claim_cache")
+        print(f"♻️ All {len(claims)} claims already checked - no Gemini call")
+        return result
+
+    # Partial hit: the model still reads the whole (compressed) article, and
+    # only the claims without a cached verdict are listed for per-claim verdicts
+    model_content = content
+    metrics.increment("claim_cache_requests_total",
+                      outcome="partial_hit" if known else "miss")
+
+    if decision.tier == "local":
+        result = routing.local_result(decision)
+    elif priority == INTERACTIVE:
+        # Fresh analysis: shed it now rather than queue it past the client timeout
+        try:
+            async with admission.admit():
+                result = await analyze_with_gemini(
+                    model_content, priority, model=routing.MODEL_TIERS[decision.tier],
+                    claims=novel, max_wait=admission.MAX_QUEUE_WAIT_SECONDS)
+        except admission.AdmissionRejectedError as e:
+            print(f"⚠️ Analyse refusée: {e}")
+            raise AnalysisUnavailableError(str(e), retry_after=e.retry_after)
+    else:
+        # Analysis with Gemini AI
+        result = await analyze_with_gemini(
+            model_content, priority, model=routing.MODEL_TIERS[decision.tier],
+            claims=novel)
+
+    new_verdicts = result.pop("claim_verdicts", [])
+    if new_verdicts:
+        # Paid for already: kept even if the request is cancelled now
+        await asyncio.shield(deadline.detached(
+            db.save_claim_verdicts(new_verdicts, decision.tier)))
+    if known:
+        # Article verdict covers the cached claims as well as the new ones
+        combined = claim_cache.aggregate_verdicts(
+            list(known.values()) + new_verdicts + [result])
+        result.update(score=combined["score"], label=combined["label"])
+    print(f"🧩 Claims: {len(claims)} extracted, {len(known)} cached, "
+          f"{len(new_verdicts)} newly checked")
+
+    result["model_tier"] = decision.tier
+    # Bookkeeping write, off the request path (a failure only loses the record)
+    deadline.detached(routing.record_decision(
+        decision, result, time.perf_counter() - started, len(content)))
+
+    if routing.should_check_agreement(decision):
+        task = asyncio.create_task(routing.check_agreement(
+            decision, result,
+            lambda: analyze_with_gemini(content, BULK, model=routing.FULL_MODEL)))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
 
     return result
 
 
-def get_article_with_community_data(article_id: str) -> Dict[str, Any]:
+async def get_article_with_community_data(article_id: str) -> Dict[str, Any]:
     """
     Get article analysis with community data (votes and scores)
     Returns None if article doesn't exist
     """
-    # Get AI analysis
-    ai_analysis = db.get_article_analysis(article_id)
+    # Get AI analysis and community votes concurrently
+    ai_analysis, votes_data = await asyncio.gather(
+        db.get_article_analysis(article_id),
+        db.get_article_votes(article_id)
+    )
     if not ai_analysis:
         return None
 
-    # Get community votes
-    votes_data = db.get_article_votes(article_id)
-
     # Calculate community score (None if no votes)
     community_score = None
     if votes_data['total'] > 0:
-        community_score = calculate_community_score(votes_data)
+        community_score = calculate_community_score(
+            votes_data, weighted=WEIGHTED_COMMUNITY_SCORE)
 
     return {
         "article_id": article_id,
@@ -388,8 +628,14 @@ def get_article_with_community_data(article_id: str) -> Dict[str, Any]:
     }
 
 
-def calculate_community_score(votes_data: Dict[str, int]) -> float:
-    """Calculate community score from votes (0-1 scale)"""
+def calculate_community_score(votes_data: Dict[str, Any], weighted: bool = False) -> float:
+    """
+    Calculate community score from votes (0-1 scale)
+    weighted=True: each vote counts with its voter's reputation weight
+    """
+    if weighted and votes_data.get('weighted_total'):
+        return votes_data['weighted_positive'] / votes_data['weighted_total']
+
     total = votes_data.get('total', 0)
     positive = votes_data.get('positive', 0)
 
@@ -399,29 +645,25 @@ def calculate_community_score(votes_data: Dict[str, int]) -> float:
     return positive / total
 
 
-def get_user_reputation_weight(user_id: str) -> float:
-    """Simple reputation based on number of votes made (0.5-1.0 scale)"""
-    user_votes = db.get_user_vote_count(user_id)
-
-    # Simple formula: more votes = higher weight (max 1.0, min 0.5)
-    weight = 0.5 + min(user_votes * 0.05, 0.5)
-    return weight
-
-
-def calculate_combined_score(ai_score: float, community_score: float, vote_count: int) -> Dict[str, Any]:
-    """Combine AI and community scores with simple weighting"""
-
+def calculate_combined_score(ai_score: float, community_score: float, vote_count: int,
+                             weighted_vote_count: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Combine AI and community scores with simple weighting
+    With weighted_vote_count (sum of voter weights), trust in the community
+    grows with the reputation of its voters rather than their number
+    """
     # Weight based on number of community votes
+    effective_votes = vote_count if weighted_vote_count is None else weighted_vote_count
     if vote_count == 0:
         # Only AI score
         final_score = ai_score
         weight_ai = 1.0
         weight_community = 0.0
-    elif vote_count < 5:
+    elif effective_votes < 5:
         # Mostly AI, some community
         weight_ai = 0.7
         weight_community = 0.3
-    elif vote_count < 20:
+    elif effective_votes < 20:
         # Balanced
         weight_ai = 0.5
         weight_community = 0.5
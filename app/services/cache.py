@@ -0,0 +1,93 @@
+"""
+Per-process cache of article reads
+
+- analyses: set once per article, kept for an hour (the saving worker
+  refreshes its own copy right away)
+- votes: aggregates change on every vote, so they are kept briefly; the
+  worker that records a vote drops its entry, other workers catch up
+  within VOTES_CACHE_TTL_SECONDS
+- known_ids: article ids known to exist, lets /analyze skip the legacy
+  alias lookup for articles it has already seen
+
+Filled on reads and by the startup warm-up (see warmup.py).
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from . import metrics
+
+# Configuration
+ARTICLE_CACHE_SIZE = int(os.getenv("ARTICLE_CACHE_SIZE", 10000))
+ANALYSIS_CACHE_TTL_SECONDS = float(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", 3600))
+VOTES_CACHE_TTL_SECONDS = float(os.getenv("VOTES_CACHE_TTL_SECONDS", 15))
+KNOWN_IDS_SIZE = int(os.getenv("KNOWN_IDS_SIZE", 200000))
+
+
+class TTLCache:
+    """LRU of at most `max_size` entries, each valid for `ttl` seconds (None: forever)"""
+
+    def __init__(self, name: str, max_size: int, ttl: Optional[float]):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, count=False) is not None
+
+    def get(self, key: str, count: bool = True) -> Any:
+        """Cached value, None when absent or expired"""
+        entry = self._entries.get(key)
+        if entry is not None and (self.ttl is None or time.monotonic() < entry[1]):
+            self._entries.move_to_end(key)
+            if count:
+                metrics.increment("article_cache_lookups_total", cache=self.name, result="hit")
+            return entry[0]
+        if entry is not None:
+            del self._entries[key]
+        if count:
+            metrics.increment("article_cache_lookups_total", cache=self.name, result="miss")
+        return None
+
+    def set(self, key: str, value: Any):
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: str):
+        self._entries.pop(key, None)
+
+
+analyses = TTLCache("analyses", ARTICLE_CACHE_SIZE, ANALYSIS_CACHE_TTL_SECONDS)
+votes = TTLCache("votes", ARTICLE_CACHE_SIZE, VOTES_CACHE_TTL_SECONDS)
+known_ids = TTLCache("known_ids", KNOWN_IDS_SIZE, None)
+
+
+def remember(article_id: str, analysis: Optional[dict] = None, votes_data: Optional[dict] = None):
+    """Record what was just read (or written) for an article"""
+    known_ids.set(article_id, True)
+    if analysis is not None:
+        analyses.set(article_id, analysis)
+    if votes_data is not None:
+        votes.set(article_id, votes_data)
+
+
+def forget(article_id: str):
+    """The article no longer exists under this id"""
+    known_ids.pop(article_id)
+    analyses.pop(article_id)
+    votes.pop(article_id)
+
+
+def publish_gauges():
+    metrics.set_gauge("article_cache_entries", len(analyses), cache="analyses")
+    metrics.set_gauge("article_cache_entries", len(votes), cache="votes")
+    metrics.set_gauge("article_cache_entries", len(known_ids), cache="known_ids")
@@ -0,0 +1,127 @@
+"""
+Claim-level verdict cache
+
+Articles are reduced to a handful of normalized claims (the sentences
+carrying figures, quotes or attributions). Verdicts are stored per claim in
+the `claims` collection, so a viral claim repeated by many articles is only
+sent to Gemini once.
+
+An article is answered from the cache alone only when its extracted claims
+cover most of its claim-like sentences; otherwise the model sees the whole
+article and only the uncached claims are listed for per-claim verdicts.
+Each verdict records the model tier that produced it, and a request never
+reuses a verdict from a cheaper tier than its own.
+"""
+
+import hashlib
+import os
+import re
+import unicodedata
+from typing import Dict, Any, List
+
+from . import compression
+
+# Configuration
+MAX_CLAIMS = int(os.getenv("MAX_CLAIMS_PER_ARTICLE", 6))
+MIN_CLAIM_CHARS = 40
+MAX_CLAIM_CHARS = 400
+MIN_CLAIM_TERMS = 5
+# Share of the claim-like text the extracted claims must cover for a cache-only answer
+MIN_CLAIM_COVERAGE = float(os.getenv("MIN_CLAIM_COVERAGE", 0.8))
+
+# Verdicts without a recorded tier are assumed to come from the cheapest model
+TIER_RANKS = {"local": 0, "fast": 1, "full": 2}
+DEFAULT_VERDICT_TIER = "fast"
+
+_PUNCTUATION = re.compile(r"[^\w\s%]", re.UNICODE)
+
+
+def normalize_claim(sentence: str) -> str:
+    """Lowercase, strip accents and punctuation, drop function words"""
+    text = unicodedata.normalize("NFKD", sentence)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = _PUNCTUATION.sub(" ", text)
+    words = [w for w in text.split() if w not in compression._STOPWORDS]
+    return " ".join(words)
+
+
+def claim_id(normalized: str) -> str:
+    return hashlib.blake2b(normalized.encode(), digest_size=16).hexdigest()
+
+
+def _claim_sentences(text: str) -> List[str]:
+    return [s for s in compression.split_sentences(text)
+            if MIN_CLAIM_CHARS <= len(s) <= MAX_CLAIM_CHARS]
+
+
+def claim_coverage(text: str, claims: List[Dict[str, str]]) -> float:
+    """Share of the claim-like sentences of `text` (in characters) held by `claims`"""
+    candidates = [s for s in _claim_sentences(text)
+                  if len(normalize_claim(s).split()) >= MIN_CLAIM_TERMS]
+    total = sum(len(s) for s in dict.fromkeys(candidates))
+    if not total:
+        return 0.0
+    return min(1.0, sum(len(c["text"]) for c in claims) / total)
+
+
+def usable_verdicts(verdicts: Dict[str, Dict[str, Any]], tier: str) -> Dict[str, Dict[str, Any]]:
+    """Cached verdicts produced by `tier` or a stronger model tier"""
+    required = TIER_RANKS.get(tier, TIER_RANKS["full"])
+    return {claim_id: verdict for claim_id, verdict in verdicts.items()
+            if TIER_RANKS.get(verdict.get("tier", DEFAULT_VERDICT_TIER), 0) >= required}
+
+
+def extract_claims(text: str, max_claims: int = MAX_CLAIMS) -> List[Dict[str, str]]:
+    """Pick the most claim-like sentences of an (already cleaned) text"""
+    sentences = _claim_sentences(text)
+    if not sentences:
+        return []
+
+    scores = compression.score_sentences(sentences)
+    ranked = sorted(range(len(sentences)),
+                    key=lambda i: scores[i], reverse=True)
+
+    claims = []
+    seen = set()
+    for i in ranked:
+        normalized = normalize_claim(sentences[i])
+        if len(normalized.split()) < MIN_CLAIM_TERMS or normalized in seen:
+            continue
+        seen.add(normalized)
+        claims.append({
+            "claim_id": claim_id(normalized),
+            "text": sentences[i],
+            "normalized": normalized
+        })
+        if len(claims) == max_claims:
+            break
+    return claims
+
+
+def label_for_score(score: float) -> str:
+    """Same bands as the Gemini instructions"""
+    if score >= 0.75:
+        return "Green"
+    if score >= 0.4:
+        return "Yellow"
+    return "Red"
+
+
+def aggregate_verdicts(verdicts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Article verdict from its claim verdicts
+    The weakest claims weigh more: one false claim is enough to mislead
+    """
+    scores = sorted(v["score"] for v in verdicts)
+    weights = [1 / (rank + 1) for rank in range(len(scores))]
+    score = sum(s * w for s, w in zip(scores, weights)) / sum(weights)
+
+    # Explanation of the least reliable claim is the most informative
+    weakest = min(verdicts, key=lambda v: v["score"])
+    return {
+        "score": round(score, 2),
+        "label": label_for_score(score),
+        "explanation": weakest.get("explanation") or "Verdict based on previously checked claims.",
+        "confidence": "medium",
+        "api_available": False
+    }
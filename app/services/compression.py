@@ -0,0 +1,125 @@
+"""
+Local extractive compression of article text before prompting Gemini
+
+Sentences are scored with TF-IDF (the sentences of the article being the
+documents), boosted when they carry quotes, source attributions or figures,
+and the best ones are kept in their original order within a token budget.
+"""
+
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+# Configuration
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 1500))
+CHARS_PER_TOKEN = 4  # Rough estimate, good enough for budgeting
+LEAD_SENTENCES = 2  # Headline and lead are always kept
+
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?…»"”])\s+(?=[«"“A-ZÀ-Ý0-9])')
+_WORD = re.compile(r"\w+", re.UNICODE)
+_QUOTE = re.compile(r'[«»"“”]')
+_FIGURE = re.compile(r"\d")
+_ATTRIBUTION = re.compile(
+    r"\b(selon|d'après|a déclaré|a affirmé|a annoncé|a indiqué|a précisé|"
+    r"rapport|étude|enquête|communiqué|source|ministère|porte-parole|"
+    r"according to|said|says|stated|reported|study|survey|spokesperson)\b",
+    re.IGNORECASE
+)
+
+# Frequent function words carry no signal for sentence selection
+_STOPWORDS = {
+    "le", "la", "les", "un", "une", "des", "de", "du", "et", "en", "à", "au",
+    "aux", "que", "qui", "dans", "pour", "par", "sur", "pas", "plus", "est",
+    "sont", "a", "ont", "il", "elle", "ils", "elles", "ce", "cette", "se",
+    "the", "a", "an", "of", "and", "to", "in", "is", "are", "for", "on",
+    "that", "with", "as", "was", "were", "it", "by", "be", "this",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_SPLIT.split(text) if s.strip()]
+
+
+def _terms(sentence: str) -> List[str]:
+    return [w for w in _WORD.findall(sentence.lower())
+            if w not in _STOPWORDS and len(w) > 2]
+
+
+def score_sentences(sentences: List[str]) -> List[float]:
+    """TF-IDF relevance of each sentence, boosted for claim-bearing features"""
+    sentence_terms = [_terms(s) for s in sentences]
+    document_frequency = Counter(
+        term for terms in sentence_terms for term in set(terms))
+    n = len(sentences)
+
+    scores = []
+    for sentence, terms in zip(sentences, sentence_terms):
+        if not terms:
+            scores.append(0.0)
+            continue
+        counts = Counter(terms)
+        tfidf = sum((1 + math.log(count)) * math.log(1 + n / document_frequency[term])
+                    for term, count in counts.items())
+        # Normalize so long sentences don't win by length alone
+        score = tfidf / math.sqrt(len(terms))
+
+        if _QUOTE.search(sentence):
+            score *= 1.5
+        if _ATTRIBUTION.search(sentence):
+            score *= 1.5
+        if _FIGURE.search(sentence):
+            score *= 1.2
+        scores.append(score)
+    return scores
+
+
+def compress(text: str, token_budget: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Keep the most informative sentences of `text` within `token_budget`
+    (PROMPT_TOKEN_BUDGET by default)
+    Returns the compressed text with token counts before/after
+    """
+    token_budget = token_budget or PROMPT_TOKEN_BUDGET
+    original_tokens = estimate_tokens(text)
+    result = {
+        "text": text,
+        "original_tokens": original_tokens,
+        "compressed_tokens": original_tokens,
+        "compressed": False
+    }
+    if original_tokens <= token_budget:
+        return result
+
+    sentences = split_sentences(text)
+    if len(sentences) <= LEAD_SENTENCES:
+        # Can't select sentences: hard truncation on a word boundary
+        truncated = text[:token_budget * CHARS_PER_TOKEN].rsplit(" ", 1)[0]
+        result.update(text=truncated, compressed=True,
+                      compressed_tokens=estimate_tokens(truncated))
+        return result
+
+    scores = score_sentences(sentences)
+    ranked = sorted(range(LEAD_SENTENCES, len(sentences)),
+                    key=lambda i: scores[i], reverse=True)
+
+    kept = set()
+    seen = set()  # Pages often repeat the same sentence (teasers, captions)
+    used = 0
+    for i in list(range(LEAD_SENTENCES)) + ranked:
+        cost = estimate_tokens(sentences[i]) + 1
+        if used + cost > token_budget or sentences[i] in seen:
+            continue
+        kept.add(i)
+        seen.add(sentences[i])
+        used += cost
+
+    compressed_text = " ".join(sentences[i] for i in sorted(kept))
+    result.update(text=compressed_text, compressed=True,
+                  compressed_tokens=estimate_tokens(compressed_text))
+    return result
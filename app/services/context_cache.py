@@ -0,0 +1,158 @@
+"""
+Gemini context caching for the static fact-checking instructions
+
+The instruction block is uploaded once per process and model as a
+cached-content resource; each request then only sends the article. The
+cache TTL is extended shortly before expiry.
+
+Explicit caching has a minimum size per model (1024 tokens for
+gemini-2.5-flash and flash-lite). Smaller instructions are never uploaded:
+they go as a plain system instruction, placed first in every request, and
+the model's implicit prefix caching reuses them (cached tokens are still
+reported in usage_metadata). Same fallback when the API refuses the cache.
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from typing import Dict, Any, Optional
+
+from . import metrics
+
+# Configuration
+CACHE_TTL_SECONDS = int(os.getenv("GEMINI_CACHE_TTL_SECONDS", 3600))
+REFRESH_MARGIN_SECONDS = 300  # Extend the TTL when less than this is left
+RETRY_AFTER_FAILURE_SECONDS = 600
+CHARS_PER_TOKEN = 4  # Rough estimate, errs towards fewer tokens
+
+# Smallest cacheable content per model, in tokens
+MIN_CACHE_TOKENS = {
+    "gemini-2.5-flash": 1024,
+    "gemini-2.5-flash-lite": 1024,
+    "gemini-2.5-pro": 4096,
+}
+DEFAULT_MIN_CACHE_TOKENS = 4096
+
+# (model, instructions hash) -> {'name', 'expires_at'}
+_caches: Dict[tuple, Dict[str, Any]] = {}
+_unavailable_until: Dict[tuple, float] = {}
+_lock: Optional[asyncio.Lock] = None
+
+
+def _cache_key(model: str, system_instruction: str) -> tuple:
+    digest = hashlib.sha256(system_instruction.encode()).hexdigest()[:16]
+    return model, digest
+
+
+def cacheable(model: str, system_instruction: str) -> bool:
+    """Whether `system_instruction` is large enough for an explicit cache"""
+    min_tokens = MIN_CACHE_TOKENS.get(model, DEFAULT_MIN_CACHE_TOKENS)
+    return len(system_instruction) / CHARS_PER_TOKEN >= min_tokens
+
+
+async def get_cached_content(client, model: str, system_instruction: str) -> Optional[str]:
+    """
+    Name of the cached-content resource holding `system_instruction`,
+    created or refreshed if needed. None when caching is unavailable.
+    """
+    global _lock
+    key = _cache_key(model, system_instruction)
+    now = time.time()
+
+    entry = _caches.get(key)
+    if entry and entry["expires_at"] - now > REFRESH_MARGIN_SECONDS:
+        return entry["name"]
+    if _unavailable_until.get(key, 0) > now:
+        return None
+    if not cacheable(model, system_instruction):
+        # Known in advance: no create call, no retry, implicit caching only
+        print(f"ℹ️ Instructions below the context cache minimum for {model}, "
+              f"relying on implicit caching")
+        _unavailable_until[key] = float("inf")
+        return None
+
+    if _lock is None:
+        _lock = asyncio.Lock()
+    async with _lock:
+        # Another request may have refreshed it while we waited
+        entry = _caches.get(key)
+        if entry and entry["expires_at"] - time.time() > REFRESH_MARGIN_SECONDS:
+            return entry["name"]
+        try:
+            return await _create_or_refresh(client, key, model, system_instruction, entry)
+        except Exception as e:
+            print(f"⚠️ Context caching unavailable for {model}: {e}")
+            _caches.pop(key, None)
+            # A rejected request (400) will be rejected again: don't retry
+            retry_after = float("inf") if getattr(e, "code", None) == 400 else RETRY_AFTER_FAILURE_SECONDS
+            _unavailable_until[key] = time.time() + retry_after
+            metrics.increment("gemini_context_cache_errors_total", model=model)
+            return None
+
+
+async def _create_or_refresh(client, key: tuple, model: str, system_instruction: str,
+                             entry: Optional[Dict[str, Any]]) -> str:
+    from google.genai import types
+
+    ttl = f"{CACHE_TTL_SECONDS}s"
+    if entry and entry["expires_at"] > time.time():
+        try:
+            await client.aio.caches.update(
+                name=entry["name"],
+                config=types.UpdateCachedContentConfig(ttl=ttl)
+            )
+            entry["expires_at"] = time.time() + CACHE_TTL_SECONDS
+            metrics.increment("gemini_context_cache_refreshed_total", model=model)
+            return entry["name"]
+        except Exception as e:
+            print(f"⚠️ Could not extend context cache, recreating: {e}")
+
+    cached = await client.aio.caches.create(
+        model=model,
+        config=types.CreateCachedContentConfig(
+            system_instruction=system_instruction,
+            display_name=f"factflow-instructions-{key[1]}",
+            ttl=ttl
+        )
+    )
+    _caches[key] = {
+        "name": cached.name,
+        "expires_at": time.time() + CACHE_TTL_SECONDS
+    }
+    metrics.increment("gemini_context_cache_created_total", model=model)
+    print(f"✅ Context cache created for {model}: {cached.name}")
+    return cached.name
+
+
+def invalidate(model: str, system_instruction: str):
+    """Forget a cache the API no longer knows about"""
+    _caches.pop(_cache_key(model, system_instruction), None)
+
+
+async def build_config(client, model: str, system_instruction: str):
+    """GenerateContentConfig using the cached instructions when possible"""
+    from google.genai import types
+
+    cache_name = await get_cached_content(client, model, system_instruction)
+    if cache_name:
+        return types.GenerateContentConfig(cached_content=cache_name)
+    return types.GenerateContentConfig(system_instruction=system_instruction)
+
+
+def record_usage(response, model: str, cache_used: bool):
+    """
+    Input token accounting, to compare per-request cost with and without
+    the explicit cache (cached tokens without it come from implicit caching)
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    prompt_tokens = usage.prompt_token_count or 0
+    cached_tokens = usage.cached_content_token_count or 0
+    cache = "explicit" if cache_used else "implicit"
+    metrics.increment("gemini_requests_total", model=model, cache=cache)
+    metrics.increment("gemini_input_tokens_total", prompt_tokens,
+                      model=model, cache=cache)
+    metrics.increment("gemini_cached_input_tokens_total", cached_tokens,
+                      model=model, cache=cache)
@@ -1,10 +1,51 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
+import asyncio
+import base64
+import functools
+import importlib
+import json
 import os
 import hashlib
+import itertools
+import numpy as np
+import zstandard
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional, Dict, Any, List
+from . import cache, trending, weights, deadline
+
+
+class _LazyModule:
+    """Module imported on first attribute access"""
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, attr: str):
+        return getattr(importlib.import_module(self._name), attr)
+
+
+# SDK Firebase (gRPC) importé au premier usage, pas à l'import de l'app :
+# le démarrage reste dans le budget de tests/test_startup.py
+firebase_admin = _LazyModule("firebase_admin")
+credentials = _LazyModule("firebase_admin.credentials")
+firestore = _LazyModule("firebase_admin.firestore")
+firestore_async = _LazyModule("firebase_admin.firestore_async")
+field_path = _LazyModule("google.cloud.firestore_v1.field_path")
+datetime_helpers = _LazyModule("google.api_core.datetime_helpers")
+api_exceptions = _LazyModule("google.api_core.exceptions")
+
+
+def _async_transactional(func):
+    """firestore.async_transactional, built at the first call"""
+    transactional = None
+
+    @functools.wraps(func)
+    async def wrapper(transaction, *args, **kwargs):
+        nonlocal transactional
+        if transactional is None:
+            transactional = firestore.async_transactional(func)
+        return await transactional(transaction, *args, **kwargs)
+    return wrapper
 
 # Initialize Firebase
 
@@ -19,11 +60,23 @@ def initialize_firebase():
             print("⚠️  Firebase non configuré - utilisation du mode mock")
             return None
 
-    return firestore.client()
+    return firestore_async.client()
+
 
+# Client asynchrone par processus, créé à la première utilisation (ou dans le
+# lifespan, depuis la boucle d'événements). Les canaux gRPC ne survivent pas
+# à un fork : un worker forké recrée le sien.
+_db = None
+_db_pid: Optional[int] = None
 
-# Instance globale
-db = initialize_firebase()
+
+def get_db():
+    """Return the Firestore AsyncClient of the current process (None in mock mode)"""
+    global _db, _db_pid
+    if _db_pid != os.getpid():
+        _db = initialize_firebase()
+        _db_pid = os.getpid()
+    return _db
 
 
 def hash_password(password: str) -> str:
@@ -36,40 +89,223 @@ def verify_password(password: str, hashed_password: str) -> bool:
     return hash_password(password) == hashed_password
 
 
-def save_vote(article_id: str, user_id: str, vote: int):
-    """Enregistrer un vote utilisateur"""
+def vote_id(article_id: str, user_id: str) -> str:
+    """Un seul document de vote par (article, utilisateur)"""
+    return f"{article_id}_{user_id}"
+
+
+def _vote_deltas(previous: Optional[int], vote: int,
+                 previous_weight: float = 1.0, weight: float = 1.0) -> Dict[str, float]:
+    """Variation des compteurs quand un vote passe de `previous` à `vote`"""
+    deltas = {'positive': 0, 'negative': 0,
+              'weighted_positive': 0.0, 'weighted_negative': 0.0}
+    for value, sign, value_weight in ((previous, -1, previous_weight), (vote, 1, weight)):
+        if value == 1:
+            deltas['positive'] += sign
+            deltas['weighted_positive'] += sign * value_weight
+        elif value == -1:
+            deltas['negative'] += sign
+            deltas['weighted_negative'] += sign * value_weight
+    return deltas
+
+
+_EPOCH = datetime.min.replace(tzinfo=timezone.utc)
+
+
+def _latest_vote(votes):
+    """Vote le plus récent parmi plusieurs documents d'un même votant"""
+    return max(votes, key=lambda vote: vote.to_dict().get('timestamp') or _EPOCH)
+
+
+@_async_transactional
+async def _upsert_vote(transaction, vote_ref, counts_ref, vote_data: Dict[str, Any]) -> Optional[int]:
+    """
+    Seul le document de vote est lu : les compteurs (complets, voir
+    ensure_vote_counts) reçoivent des incréments aveugles, sans sérialiser
+    les votes concurrents d'un même article
+    """
+    snapshot = await vote_ref.get(transaction=transaction)
+    previous_vote = snapshot.to_dict() if snapshot.exists else None
+    legacy_votes = []
+    if previous_vote is None:
+        # Vote enregistré avant les ids déterministes (id aléatoire) : c'est
+        # le vote précédent, repris sous l'id déterministe
+        legacy_votes = await vote_ref.parent.where(
+            'article_id', '==', vote_data['article_id']).where(
+            'user_id', '==', vote_data['user_id']).get(transaction=transaction)
+        if legacy_votes:
+            previous_vote = _latest_vote(legacy_votes).to_dict()
+            for legacy_vote in legacy_votes:
+                transaction.delete(legacy_vote.reference)
+
+    previous = previous_vote.get('vote') if previous_vote else None
+    if previous == vote_data['vote']:
+        if legacy_votes:
+            transaction.set(vote_ref, previous_vote)
+        return previous
+
+    transaction.set(vote_ref, vote_data)
+    # Un changement de vote retire le poids avec lequel l'ancien avait été compté
+    previous_weight = (previous_vote.get('weight', 1.0)
+                       if previous_vote else 1.0)
+    deltas = _vote_deltas(previous, vote_data['vote'],
+                          previous_weight, vote_data['weight'])
+    transaction.set(counts_ref, {
+        **{field: firestore.Increment(delta) for field, delta in deltas.items()},
+        # Version des votes, avec les compteurs : l'ETag change avec eux
+        'version': firestore.Increment(1),
+        **_trending_fields(vote_data['vote'])
+    }, merge=True)
+    return previous
+
+
+def _trending_fields(vote: int) -> Dict[str, Any]:
+    """Incréments aveugles des compteurs de tendance (voir trending.py)"""
+    epoch, increments = trending.scaled_vote(vote)
+    if not increments:
+        return {}
+    return {'trending': {
+        trending.epoch_key(epoch): {
+            field: firestore.Increment(amount) for field, amount in increments.items()},
+        # Époque qui n'est plus lue
+        trending.epoch_key(epoch - 2): firestore.DELETE_FIELD
+    }}
+
+
+@_async_transactional
+async def _init_vote_counts(transaction, counts_ref, article_id: str):
+    """
+    Compteurs d'un article, construits depuis ses votes s'ils n'existent pas
+    encore (ou sont antérieurs au vote pondéré). Dans une transaction sur le
+    document compteur : aucun incrément ne peut s'intercaler.
+    Retourne les compteurs et les poids à enregistrer sur les votes qui n'en ont pas
+    """
+    counts = await counts_ref.get(transaction=transaction)
+    counts_dict = counts.to_dict() if counts.exists else {}
+    if 'weighted_positive' in counts_dict:
+        return counts_dict, []
+    user_ids, votes, vote_weights, refs = await get_article_voters(
+        article_id, transaction=transaction)
+    filled = await _fill_vote_weights(user_ids, vote_weights)
+    counts_dict = await compute_vote_counts(article_id, (user_ids, votes, filled, refs))
+    transaction.set(counts_ref, counts_dict, merge=True)
+    return counts_dict, [(refs[row], float(filled[row]))
+                         for row in np.flatnonzero(np.isnan(vote_weights)).tolist()]
+
+
+# Articles dont le document compteur est complet (jamais partiel ensuite)
+_counted_articles = cache.TTLCache("counted_articles", cache.KNOWN_IDS_SIZE, None)
+
+
+async def ensure_vote_counts(article_id: str) -> Dict[str, Any]:
+    """
+    Garantir un document article_vote_counts complet avant tout incrément
+    Le premier appel pour un article sans compteur le reconstruit (une fois)
+    """
+    db = get_db()
+    counts_ref = db.collection('article_vote_counts').document(article_id)
+    counts, vote_weights = await _init_vote_counts(db.transaction(), counts_ref, article_id)
+    # Un vote modifié plus tard retirera le poids avec lequel il a été compté
+    for i in range(0, len(vote_weights), 400):
+        batch = db.batch()
+        for ref, weight in vote_weights[i:i + 400]:
+            batch.update(ref, {'weight': weight})
+        await batch.commit()
+    _counted_articles.set(article_id, True)
+    return counts
+
+
+async def save_vote(article_id: str, user_id: str, vote: int) -> Optional[int]:
+    """
+    Enregistrer (ou modifier) le vote d'un utilisateur
+    Retourne le vote précédent, None s'il s'agit de son premier vote
+    """
+    db = get_db()
+    previous = None
     try:
         if db:
+            voter_weights = await get_voter_weights([user_id])
             vote_data = {
                 'article_id': article_id,
                 'user_id': user_id,
                 'vote': vote,
+                'weight': float(voter_weights[0]),
                 'timestamp': firestore.SERVER_TIMESTAMP
             }
-            db.collection('votes').add(vote_data)
+            vote_ref = db.collection('votes').document(vote_id(article_id, user_id))
+            counts_ref = db.collection('article_vote_counts').document(article_id)
+            if article_id not in _counted_articles:
+                # Un compteur créé par ce seul vote ignorerait les votes existants
+                await deadline.db_call(ensure_vote_counts(article_id), "db.ensure_vote_counts")
+            previous = await deadline.db_call(
+                _upsert_vote(db.transaction(), vote_ref, counts_ref, vote_data), "db.save_vote")
+            if previous == vote:
+                print(f"ℹ️ Vote inchangé: article={article_id}, user={user_id}")
+                return previous
             print(
                 f"✅ Vote enregistré en Firebase: article={article_id}, user={user_id}, vote={vote}")
+            cache.votes.pop(article_id)
         else:
             # Mode mock si Firebase non disponible
             print(
                 f"🔄 Vote enregistré (mock): article={article_id}, user={user_id}, vote={vote}")
     except Exception as e:
         print(f"❌ Erreur lors de l'enregistrement du vote: {e}")
+    return previous
+
+
+# Champs renvoyés par les lectures d'analyse (le texte n'est jamais transféré)
+ANALYSIS_FIELDS = ['score', 'label', 'explanation']
+TEXT_COMPRESSION_LEVEL = 9
+
+
+def compress_text(text: str) -> Dict[str, Any]:
+    """Document article_texts: texte compressé en zstd"""
+    raw = text.encode('utf-8')
+    return {
+        'codec': 'zstd',
+        'size': len(raw),
+        'data': zstandard.compress(raw, TEXT_COMPRESSION_LEVEL)
+    }
 
 
-def save_article_analysis(article_id: str, text: str, analysis_result: Dict[Any, Any]):
+def decompress_text(text_doc: Dict[str, Any]) -> str:
+    if text_doc.get('codec') == 'zstd':
+        return zstandard.decompress(text_doc['data']).decode('utf-8')
+    return text_doc.get('text', '')
+
+
+@deadline.with_db_timeout
+async def save_article_analysis(article_id: str, text: str, analysis_result: Dict[Any, Any]):
     """Sauvegarder une analyse d'article"""
+    db = get_db()
     try:
         if db:
             article_data = {
                 'article_id': article_id,
-                'text': text,
+                # Le texte est stocké compressé hors du document (article_texts)
+                'text': firestore.DELETE_FIELD,
                 'score': analysis_result['score'],
                 'label': analysis_result['label'],
                 'explanation': analysis_result['explanation'],
-                'created_at': firestore.SERVER_TIMESTAMP
+                'created_at': firestore.SERVER_TIMESTAMP,
+                # Bumped on every re-analysis or vote, used as ETag
+                'version': firestore.Increment(1)
             }
-            db.collection('articles').document(article_id).set(article_data)
+            if analysis_result.get('reused_from'):
+                article_data['reused_from'] = analysis_result['reused_from']
+            batch = db.batch()
+            batch.set(db.collection('articles').document(article_id),
+                      article_data, merge=True)
+            batch.set(db.collection('article_texts').document(article_id),
+                      compress_text(text))
+            await batch.commit()
+            cache.remember(article_id, {
+                "article_id": article_id,
+                "score": analysis_result['score'],
+                "label": analysis_result['label'],
+                "explanation": analysis_result['explanation'],
+            })
             print(f"✅ Article analysé sauvegardé: {article_id}")
         else:
             print(f"🔄 Article analysé (mock): {article_id}")
@@ -77,20 +313,30 @@ def save_article_analysis(article_id: str, text: str, analysis_result: Dict[Any,
         print(f"❌ Erreur lors de la sauvegarde de l'analyse: {e}")
 
 
-def get_article_analysis(article_id: str) -> Optional[Dict[str, Any]]:
-    """Récupérer l'analyse d'un article"""
+@deadline.with_db_timeout
+async def get_article_analysis(article_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Récupérer l'analyse d'un article (lecture projetée, sans le texte)
+    Servie depuis le cache du processus quand elle y est
+    """
+    db = get_db()
     try:
         if db:
+            cached = cache.analyses.get(article_id)
+            if cached is not None:
+                return dict(cached)
             article_ref = db.collection('articles').document(article_id)
-            article = article_ref.get()
+            article = await article_ref.get(field_paths=ANALYSIS_FIELDS)
             if article.exists:
                 article_dict = article.to_dict()
-                return {
+                analysis = {
                     "article_id": article_id,
                     "score": article_dict.get("score"),
                     "label": article_dict.get("label"),
                     "explanation": article_dict.get("explanation"),
                 }
+                cache.remember(article_id, analysis)
+                return dict(analysis)
             else:
                 print(f"⚠️  Article non trouvé: {article_id}")
                 return None
@@ -99,44 +345,679 @@ def get_article_analysis(article_id: str) -> Optional[Dict[str, Any]]:
         return None
 
 
-def get_article_votes(article_id: str) -> Dict[str, int]:
-    """Récupérer les votes d'un article"""
+@deadline.with_db_timeout
+async def get_article_text(article_id: str) -> Optional[str]:
+    """Récupérer le texte d'un article (compressé hors ligne, ou inline pour les anciens)"""
+    db = get_db()
     try:
         if db:
-            votes_ref = db.collection('votes').where(
-                'article_id', '==', article_id)
-            votes = votes_ref.stream()
+            text_doc = await db.collection('article_texts').document(article_id).get()
+            if text_doc.exists:
+                return decompress_text(text_doc.to_dict())
+            article = await db.collection('articles').document(
+                article_id).get(field_paths=['text'])
+            if article.exists:
+                return (article.to_dict() or {}).get('text')
+        return None
+    except Exception as e:
+        print(f"❌ Erreur lors de la récupération du texte: {e}")
+        return None
 
-            positive_votes = 0
-            negative_votes = 0
 
-            for vote in votes:
-                vote_data = vote.to_dict()
-                if vote_data['vote'] == 1:
-                    positive_votes += 1
-                elif vote_data['vote'] == -1:
-                    negative_votes += 1
+# Alias ancien id -> id canonique, mis en cache par processus (ils ne changent pas)
+_alias_cache: Dict[str, str] = {}
 
-            return {
-                'positive': positive_votes,
-                'negative': negative_votes,
-                'total': positive_votes + negative_votes
-            }
+
+@deadline.with_db_timeout
+async def resolve_article_id(article_id: str) -> str:
+    """Map a legacy (md5, 32 chars) article id to its canonical id"""
+    if len(article_id) != 32:
+        return article_id
+    if article_id in _alias_cache:
+        return _alias_cache[article_id]
+
+    db = get_db()
+    try:
+        if db:
+            alias = await db.collection('article_aliases').document(article_id).get()
+            if alias.exists:
+                _alias_cache[article_id] = alias.to_dict()['article_id']
+                return _alias_cache[article_id]
+        return article_id
+    except Exception as e:
+        print(f"❌ Erreur lors de la résolution de l'alias: {e}")
+        return article_id
+
+
+@deadline.with_db_timeout
+async def resolve_article_ids(article_ids: List[str]) -> Dict[str, str]:
+    """Résoudre plusieurs ids d'un coup (une seule lecture groupée des alias)"""
+    resolved = {article_id: _alias_cache.get(article_id, article_id)
+                for article_id in article_ids}
+    pending = [article_id for article_id in article_ids
+               if len(article_id) == 32 and article_id not in _alias_cache]
+
+    db = get_db()
+    try:
+        if db and pending:
+            refs = [db.collection('article_aliases').document(article_id)
+                    for article_id in pending]
+            async for alias in db.get_all(refs):
+                if alias.exists:
+                    _alias_cache[alias.id] = alias.get('article_id')
+                    resolved[alias.id] = _alias_cache[alias.id]
+    except Exception as e:
+        print(f"❌ Erreur lors de la résolution des alias: {e}")
+    return resolved
+
+
+@deadline.with_db_timeout
+async def save_article_alias(legacy_id: str, article_id: str):
+    """Enregistrer l'alias d'un ancien id vers l'id canonique"""
+    db = get_db()
+    try:
+        if db:
+            await db.collection('article_aliases').document(legacy_id).set({
+                'article_id': article_id,
+                'created_at': firestore.SERVER_TIMESTAMP
+            })
+        _alias_cache[legacy_id] = article_id
+    except Exception as e:
+        print(f"❌ Erreur lors de l'enregistrement de l'alias: {e}")
+
+
+async def migrate_article_id(legacy_id: str, article_id: str, delete_legacy: bool = False) -> int:
+    """
+    Déplacer un article de son ancien id vers l'id canonique
+    Copie l'analyse (sauf si l'id canonique existe déjà), réécrit les votes
+    et enregistre l'alias. Retourne le nombre de votes déplacés.
+    """
+    db = get_db()
+    try:
+        if not db:
+            return 0
+
+        legacy_ref = db.collection('articles').document(legacy_id)
+        legacy = await legacy_ref.get()
+        if not legacy.exists:
+            return 0
+
+        target_ref = db.collection('articles').document(article_id)
+        if not (await target_ref.get(field_paths=['version'])).exists:
+            await target_ref.set({**legacy.to_dict(), 'article_id': article_id})
+            legacy_text = await db.collection('article_texts').document(legacy_id).get()
+            if legacy_text.exists:
+                await db.collection('article_texts').document(
+                    article_id).set(legacy_text.to_dict())
+
+        moved = 0
+        batch = db.batch()
+        async for vote in db.collection('votes').where('article_id', '==', legacy_id).stream():
+            # Les votes sont indexés par (article, utilisateur) : on les réécrit
+            vote_data = {**vote.to_dict(), 'article_id': article_id}
+            batch.set(db.collection('votes').document(
+                vote_id(article_id, vote_data['user_id'])), vote_data)
+            batch.delete(vote.reference)
+            moved += 1
+            if moved % 200 == 0:
+                await batch.commit()
+                batch = db.batch()
+        await batch.commit()
+        if moved:
+            await rebuild_vote_counts(article_id)
+            await db.collection('article_vote_counts').document(legacy_id).delete()
+
+        await save_article_alias(legacy_id, article_id)
+        if delete_legacy:
+            await legacy_ref.delete()
+            cache.forget(legacy_id)
+        return moved
+    except Exception as e:
+        print(f"❌ Erreur lors de la migration de {legacy_id}: {e}")
+        return 0
+
+
+def article_version(article: Optional[Dict[str, Any]], counts: Optional[Dict[str, Any]]) -> int:
+    """Version exposée (ETag) : analyse + votes"""
+    return (article or {}).get('version', 0) + (counts or {}).get('version', 0)
+
+
+@deadline.with_db_timeout
+async def get_article_version(article_id: str) -> Optional[int]:
+    """
+    Récupérer uniquement la version d'un article (lecture projetée) : celle
+    de l'analyse plus celle des votes (incrémentée dans la transaction du
+    vote), deux compteurs qui ne font que croître
+    Returns None if the article doesn't exist
+    """
+    db = get_db()
+    try:
+        if db:
+            refs = [db.collection('articles').document(article_id),
+                    db.collection('article_vote_counts').document(article_id)]
+            versions = {doc.reference.parent.id: doc async for doc
+                        in db.get_all(refs, field_paths=['version'])}
+            article = versions.get('articles')
+            if article is not None and article.exists:
+                counts = versions.get('article_vote_counts')
+                return article_version(
+                    article.to_dict(), counts.to_dict() if counts and counts.exists else None)
+        return None
+    except Exception as e:
+        print(f"❌ Erreur lors de la récupération de version: {e}")
+        return None
+
+
+VOTE_COUNT_FIELDS = ['positive', 'negative', 'weighted_positive', 'weighted_negative']
+
+
+def vote_summary(counts: Dict[str, Any]) -> Dict[str, Any]:
+    """Votes bruts et pondérés par la réputation des votants"""
+    positive_votes = counts.get('positive', 0)
+    negative_votes = counts.get('negative', 0)
+    weighted_positive = counts.get('weighted_positive', 0.0)
+    weighted_negative = counts.get('weighted_negative', 0.0)
+    return {
+        'positive': positive_votes,
+        'negative': negative_votes,
+        'total': positive_votes + negative_votes,
+        'weighted_positive': round(weighted_positive, 4),
+        'weighted_negative': round(weighted_negative, 4),
+        'weighted_total': round(weighted_positive + weighted_negative, 4)
+    }
+
+
+async def get_article_votes(article_id: str, fresh: bool = False) -> Dict[str, Any]:
+    """
+    Récupérer les votes d'un article (compteurs maintenus à chaque vote)
+    fresh=True contourne le cache (réponses avec ETag)
+    """
+    db = get_db()
+    try:
+        if db:
+            cached = None if fresh else cache.votes.get(article_id)
+            if cached is not None:
+                return dict(cached)
+            counts = await deadline.bounded(
+                db.collection('article_vote_counts').document(article_id).get(
+                    field_paths=VOTE_COUNT_FIELDS),
+                "db.get_article_votes", deadline.DB_TIMEOUT_SECONDS)
+            counts_dict = counts.to_dict() if counts.exists else {}
+            if 'weighted_positive' in counts_dict:
+                _counted_articles.set(article_id, True)
+            else:
+                # Compteurs absents ou antérieurs au vote pondéré : construits
+                # et enregistrés une fois
+                try:
+                    counts_dict = await deadline.bounded(
+                        ensure_vote_counts(article_id), "db.ensure_vote_counts",
+                        deadline.DB_TIMEOUT_SECONDS)
+                except Exception as e:
+                    # Votes bruts seulement (score non pondéré), non mis en cache
+                    print(f"⚠️ Compteurs de {article_id} non reconstruits: {e}")
+                    return vote_summary(counts_dict)
+            summary = vote_summary(counts_dict)
+            cache.votes.set(article_id, summary)
+            return dict(summary)
         else:
             # Mode mock
-            return {'positive': 0, 'negative': 0, 'total': 0}
+            return vote_summary({})
     except Exception as e:
         print(f"❌ Erreur lors de la récupération des votes: {e}")
-        return {'positive': 0, 'negative': 0, 'total': 0}
+        return vote_summary({})
+
+
+# Reconstructions de compteurs lancées en parallèle par une lecture groupée
+COUNTS_REBUILD_CONCURRENCY = 4
+
+
+async def get_articles_bulk(article_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Analyses et votes de plusieurs articles en deux lectures groupées
+    (articles et compteurs, en parallèle). Les ids inconnus sont absents.
+    Chaque lecture a son propre timeout : un compteur lent à reconstruire
+    ne fait perdre que la pondération de son article
+    """
+    db = get_db()
+    try:
+        if not db or not article_ids:
+            return {}
+
+        # Articles entièrement en cache : aucune lecture
+        result = {}
+        for article_id in article_ids:
+            analysis = cache.analyses.get(article_id)
+            votes_data = cache.votes.get(article_id) if analysis else None
+            if votes_data is not None:
+                result[article_id] = {'analysis': dict(analysis), 'votes': dict(votes_data)}
+        article_ids = [article_id for article_id in article_ids if article_id not in result]
+        if not article_ids:
+            return result
+
+        async def read_all(collection, field_paths):
+            refs = [db.collection(collection).document(article_id)
+                    for article_id in article_ids]
+            return {doc.id: doc.to_dict() async for doc
+                    in db.get_all(refs, field_paths=field_paths) if doc.exists}
+
+        analyses, counts = await asyncio.gather(
+            deadline.bounded(read_all('articles', ANALYSIS_FIELDS),
+                             "db.get_articles_bulk", deadline.DB_TIMEOUT_SECONDS),
+            deadline.bounded(read_all('article_vote_counts', VOTE_COUNT_FIELDS),
+                             "db.get_articles_bulk", deadline.DB_TIMEOUT_SECONDS)
+        )
+
+        # Compteurs absents ou antérieurs au vote pondéré : construits et
+        # enregistrés une fois, quelques-uns à la fois
+        semaphore = asyncio.Semaphore(COUNTS_REBUILD_CONCURRENCY)
+        complete = set()
+
+        async def build_counts(article_id):
+            async with semaphore:
+                try:
+                    counts[article_id] = await deadline.bounded(
+                        ensure_vote_counts(article_id), "db.ensure_vote_counts",
+                        deadline.DB_TIMEOUT_SECONDS)
+                    complete.add(article_id)
+                except Exception as e:
+                    # Votes bruts seulement (score non pondéré) jusqu'à la prochaine lecture
+                    print(f"⚠️ Compteurs de {article_id} non reconstruits: {e}")
+
+        for article_id in analyses:
+            if 'weighted_positive' in counts.get(article_id, {}):
+                complete.add(article_id)
+                _counted_articles.set(article_id, True)
+        await asyncio.gather(*(build_counts(article_id) for article_id in analyses
+                               if article_id not in complete))
+
+        for article_id, analysis in analyses.items():
+            analysis = {'article_id': article_id, **analysis}
+            votes_data = vote_summary(counts.get(article_id, {}))
+            cache.remember(article_id, analysis,
+                           votes_data if article_id in complete else None)
+            result[article_id] = {'analysis': dict(analysis), 'votes': dict(votes_data)}
+        return result
+    except Exception as e:
+        print(f"❌ Erreur lors de la lecture groupée des articles: {e}")
+        return {}
+
+
+# Lectures groupées des réputations : documents par lecture, lectures en parallèle
+USER_READ_BATCH_SIZE = 100
+USER_READ_CONCURRENCY = 4
+
+
+async def get_voter_weights(user_ids: List[str]) -> np.ndarray:
+    """
+    Poids de réputation des votants (store en mémoire, rechargé après TTL)
+    Les absents sont lus par lots sur les documents users (champ reputation)
+    """
+    voter_weights, missing = weights.store.lookup(user_ids)
+    db = get_db()
+    if missing and db:
+        missing = list(dict.fromkeys(missing))
+        semaphore = asyncio.Semaphore(USER_READ_CONCURRENCY)
+
+        async def read_reputations(chunk):
+            refs = [db.collection('users').document(user_id) for user_id in chunk]
+
+            async def read():
+                return {doc.id: (doc.to_dict() or {}).get('reputation', 0.0)
+                        async for doc in db.get_all(refs, field_paths=['reputation'])
+                        if doc.exists}
+            # Timeout started once the slot is taken: waiting for it is free
+            async with semaphore:
+                return await deadline.db_call(read(), "db.get_voter_weights")
+
+        reputations = {}
+        for chunk_reputations in await asyncio.gather(*(
+                read_reputations(missing[i:i + USER_READ_BATCH_SIZE])
+                for i in range(0, len(missing), USER_READ_BATCH_SIZE))):
+            reputations.update(chunk_reputations)
+        # Sans document utilisateur : réputation nulle, poids minimal
+        weights.store.update(missing, [reputations.get(u, 0.0) for u in missing])
+        voter_weights, _ = weights.store.lookup(user_ids)
+    return np.nan_to_num(voter_weights, nan=weights.MIN_WEIGHT)
+
+
+@deadline.with_db_timeout
+async def get_article_voters(article_id: str, transaction=None):
+    """
+    Votes d'un article, un seul par votant (le plus récent si d'anciens
+    doublons subsistent) : (user ids, votes en tableau NumPy, poids
+    enregistrés sur les votes (NaN si absent), références)
+    """
+    db = get_db()
+    if not db:
+        return [], np.array([], dtype=np.int8), np.array([], dtype=np.float64), []
+    query = db.collection('votes').where(
+        'article_id', '==', article_id).select(['user_id', 'vote', 'weight', 'timestamp'])
+    by_user = {}
+    for vote in await query.get(transaction=transaction):
+        by_user.setdefault(vote.get('user_id'), []).append(vote)
+    latest = [_latest_vote(user_votes) for user_votes in by_user.values()]
+    return ([vote.get('user_id') for vote in latest],
+            np.array([vote.get('vote') for vote in latest], dtype=np.int8),
+            np.array([(vote.to_dict() or {}).get('weight', np.nan) for vote in latest],
+                     dtype=np.float64),
+            [vote.reference for vote in latest])
+
+
+async def compute_vote_counts(article_id: str, voters=None) -> Dict[str, Any]:
+    """
+    Compteurs bruts et pondérés agrégés sur les votants d'un article
+    Chaque vote compte avec le poids enregistré, comme pour les incréments ;
+    les votes sans poids prennent celui de la réputation actuelle du votant
+    """
+    user_ids, votes, vote_weights, _ = voters or await get_article_voters(article_id)
+    vote_weights = await _fill_vote_weights(user_ids, vote_weights)
+    return {
+        'positive': int((votes == 1).sum()),
+        'negative': int((votes == -1).sum()),
+        **weights.aggregate(votes, vote_weights)
+    }
+
+
+async def _fill_vote_weights(user_ids: List[str], vote_weights: np.ndarray) -> np.ndarray:
+    """Poids des votes, complétés par le poids actuel des votants pour ceux qui n'en ont pas"""
+    unweighted = np.flatnonzero(np.isnan(vote_weights))
+    if len(unweighted):
+        vote_weights = vote_weights.copy()
+        vote_weights[unweighted] = await get_voter_weights(
+            [user_ids[i] for i in unweighted])
+    return vote_weights
+
+
+async def rebuild_vote_counts(article_id: str) -> Dict[str, Any]:
+    """
+    Recalculer les compteurs d'un article depuis la collection votes
+    Le poids utilisé est enregistré sur chaque vote (pour les changements futurs)
+    """
+    db = get_db()
+    voters = await get_article_voters(article_id)
+    user_ids, votes, vote_weights, refs = voters
+    filled = await _fill_vote_weights(user_ids, vote_weights)
+    counts = await compute_vote_counts(article_id, (user_ids, votes, filled, refs))
+
+    batch = db.batch()
+    unweighted = np.flatnonzero(np.isnan(vote_weights))
+    for index, row in enumerate(unweighted.tolist(), 1):
+        batch.update(refs[row], {'weight': float(filled[row])})
+        if index % 400 == 0:
+            await batch.commit()
+            batch = db.batch()
+    # merge : les compteurs de tendance du document sont conservés
+    batch.set(db.collection('article_vote_counts').document(article_id), counts, merge=True)
+    await batch.commit()
+    cache.votes.pop(article_id)
+    return counts
+
+
+class InvalidCursorError(ValueError):
+    """Curseur de pagination illisible ou falsifié"""
+
+
+def encode_vote_cursor(timestamp, document_id: str) -> str:
+    payload = json.dumps({'t': timestamp.rfc3339(), 'id': document_id})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_vote_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return {
+            'timestamp': datetime_helpers.DatetimeWithNanoseconds.from_rfc3339(payload['t']),
+            '__name__': payload['id']
+        }
+    except Exception:
+        raise InvalidCursorError(cursor)
+
+
+@deadline.with_db_timeout
+async def list_votes(field: str, value: str, fields: List[str], page_size: int,
+                     cursor: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Une page de votes (par user_id ou article_id), du plus récent au plus ancien
+    Pagination par clé (timestamp, id) : une page profonde coûte autant que la
+    première. Index composites dans firestore.indexes.json
+    """
+    db = get_db()
+    if not db:
+        return {'votes': [], 'next_cursor': None}
+    # Décodé avant la lecture : un curseur invalide est une erreur du client
+    start_after = decode_vote_cursor(cursor) if cursor else None
+
+    query = (db.collection('votes')
+             .where(field, '==', value)
+             .order_by('timestamp', direction=firestore.Query.DESCENDING)
+             .order_by(field_path.FieldPath.document_id(),
+                       direction=firestore.Query.DESCENDING)
+             .select(fields + ['timestamp'])
+             .limit(page_size + 1))
+    if start_after:
+        query = query.start_after(start_after)
+
+    try:
+        docs = await query.get()
+    except Exception as e:
+        print(f"❌ Erreur lors de la lecture des votes: {e}")
+        return {'votes': [], 'next_cursor': None}
+
+    page = docs[:page_size]
+    next_cursor = None
+    if len(docs) > page_size:
+        last = page[-1]
+        next_cursor = encode_vote_cursor(last.get('timestamp'), last.id)
+    return {'votes': [doc.to_dict() for doc in page], 'next_cursor': next_cursor}
+
+
+async def iter_article_analyses(limit: Optional[int] = None, page_size: int = 200):
+    """
+    Parcourir les analyses stockées (texte, label, score) pour l'entraînement
+    Les textes sont récupérés par lots depuis article_texts
+    """
+    db = get_db()
+    try:
+        if not db:
+            return
+        query = db.collection('articles').select(['text', 'label', 'score'])
+        if limit:
+            query = query.limit(limit)
+
+        page = []
+        async for article in query.stream():
+            page.append(article)
+            if len(page) == page_size:
+                for analysis in await _with_texts(db, page):
+                    yield analysis
+                page = []
+        if page:
+            for analysis in await _with_texts(db, page):
+                yield analysis
+    except Exception as e:
+        print(f"❌ Erreur lors du parcours des analyses: {e}")
+
+
+async def _with_texts(db, articles):
+    """Joindre les textes (multi-get sur article_texts) à une page d'analyses"""
+    refs = [db.collection('article_texts').document(a.id) for a in articles]
+    texts = {doc.id: decompress_text(doc.to_dict())
+             async for doc in db.get_all(refs) if doc.exists}
+
+    analyses = []
+    for article in articles:
+        article_dict = article.to_dict()
+        text = texts.get(article.id) or article_dict.get('text')
+        if text and article_dict.get('label'):
+            analyses.append({
+                "article_id": article.id,
+                "text": text,
+                "label": article_dict['label'],
+                "score": article_dict.get('score', 0.5),
+            })
+    return analyses
+
+
+async def iter_collection(collection: str, page_size: int = 1000,
+                          start_after: Optional[str] = None,
+                          field_paths: Optional[List[str]] = None):
+    """
+    Parcourir toute une collection par pages (curseur sur l'id du document)
+    Yields (document id, data); une seule page en mémoire à la fois
+    """
+    db = get_db()
+    if not db:
+        return
+    collection_ref = db.collection(collection)
+    query = collection_ref.order_by(
+        field_path.FieldPath.document_id()).limit(page_size)
+    if field_paths:
+        query = query.select(field_paths)
+    cursor = collection_ref.document(start_after) if start_after else None
+
+    while True:
+        page = await (query.start_after(cursor) if cursor else query).get()
+        for doc in page:
+            yield doc.id, doc.to_dict()
+        if len(page) < page_size:
+            return
+        cursor = page[-1].reference
+
+
+@deadline.with_db_timeout
+async def get_popular_article_ids(limit: int) -> List[str]:
+    """
+    Articles les plus demandés, pour le préchauffage du cache :
+    les plus votés (pour ou contre) et les plus récents, entrelacés
+    """
+    db = get_db()
+    try:
+        if not db or limit <= 0:
+            return []
+        counts = db.collection('article_vote_counts')
+        queries = [
+            counts.order_by('positive', direction=firestore.Query.DESCENDING),
+            counts.order_by('negative', direction=firestore.Query.DESCENDING),
+            db.collection('articles').order_by(
+                'created_at', direction=firestore.Query.DESCENDING),
+        ]
+        # Projection sur l'id seul (__name__) : une projection vide
+        # renverrait tous les champs
+        document_id = field_path.FieldPath.document_id()
+        results = await asyncio.gather(
+            *(query.select([document_id]).limit(limit).get() for query in queries))
+        ids = dict.fromkeys(doc.id for docs in itertools.zip_longest(*results)
+                            for doc in docs if doc is not None)
+        return list(ids)[:limit]
+    except Exception as e:
+        print(f"❌ Erreur lors de la lecture des articles populaires: {e}")
+        return []
+
+
+async def get_trending_counters(epochs: List[int], limit: int) -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    Compteurs de tendance (carte `trending`) des `limit` articles les plus
+    actifs de chaque époque, pour le classement des tendances
+    None en cas d'erreur (le classement précédent est gardé)
+    """
+    db = get_db()
+    try:
+        if not db:
+            return {}
+        counts = db.collection('article_vote_counts')
+        queries = [
+            counts.order_by(f"trending.{trending.epoch_key(epoch)}.velocity",
+                            direction=firestore.Query.DESCENDING)
+            .select(['trending']).limit(limit)
+            for epoch in epochs
+        ]
+        results = await asyncio.gather(
+            *(deadline.db_call(query.get(), "db.get_trending_counters") for query in queries))
+        return {doc.id: (doc.to_dict() or {}).get('trending', {})
+                for docs in results for doc in docs}
+    except Exception as e:
+        print(f"❌ Erreur lors de la lecture des tendances: {e}")
+        return None
+
+
+@deadline.with_db_timeout
+async def write_documents(collection: str, documents: List[tuple], merge: bool = False):
+    """Écrire (id, data) en une écriture groupée (500 documents max)"""
+    db = get_db()
+    if not db or not documents:
+        return
+    batch = db.batch()
+    for document_id, data in documents:
+        batch.set(db.collection(collection).document(document_id), data, merge=merge)
+    await batch.commit()
+
+
+@deadline.with_db_timeout
+async def get_claim_verdicts(claim_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Récupérer en une lecture groupée les verdicts connus de ces affirmations"""
+    db = get_db()
+    try:
+        if db and claim_ids:
+            refs = [db.collection('claims').document(claim_id)
+                    for claim_id in claim_ids]
+            verdicts = {}
+            async for claim in db.get_all(
+                    refs, field_paths=['score', 'label', 'explanation', 'tier']):
+                if claim.exists:
+                    verdicts[claim.id] = claim.to_dict()
+            return verdicts
+        return {}
+    except Exception as e:
+        print(f"❌ Erreur lors de la récupération des affirmations: {e}")
+        return {}
+
+
+@deadline.with_db_timeout
+async def save_claim_verdicts(verdicts: List[Dict[str, Any]], tier: str):
+    """Enregistrer les verdicts par affirmation et le niveau de modèle qui les a produits"""
+    db = get_db()
+    try:
+        if db and verdicts:
+            batch = db.batch()
+            for verdict in verdicts:
+                batch.set(db.collection('claims').document(verdict['claim_id']), {
+                    'text': verdict['text'],
+                    'normalized': verdict['normalized'],
+                    'score': verdict['score'],
+                    'label': verdict['label'],
+                    'explanation': verdict['explanation'],
+                    'tier': tier,
+                    'checked_at': firestore.SERVER_TIMESTAMP
+                })
+            await batch.commit()
+            print(f"✅ {len(verdicts)} affirmations enregistrées")
+    except Exception as e:
+        print(f"❌ Erreur lors de l'enregistrement des affirmations: {e}")
+
 
+@deadline.with_db_timeout
+async def save_routing_decision(decision: Dict[str, Any]):
+    """Enregistrer une décision de routage (réglage des seuils)"""
+    db = get_db()
+    try:
+        if db:
+            await db.collection('routing_decisions').add({
+                **decision,
+                'timestamp': firestore.SERVER_TIMESTAMP
+            })
+    except Exception as e:
+        print(f"❌ Erreur lors de l'enregistrement du routage: {e}")
 
-def get_user_vote_count(user_id: str) -> int:
+
+@deadline.with_db_timeout
+async def get_user_vote_count(user_id: str) -> int:
     """Get total number of votes made by a user"""
+    db = get_db()
     try:
         if db:
             votes_ref = db.collection('votes').where('user_id', '==', user_id)
-            votes = votes_ref.stream()
-            return len(list(votes))
+            result = await votes_ref.count().get()
+            return int(result[0][0].value)
         else:
             return 0
     except Exception as e:
@@ -146,21 +1027,23 @@ def get_user_vote_count(user_id: str) -> int:
 
 # === USER FUNCTIONS ===
 
-def create_user(username: str, email: str, password: str, profile_photo: Optional[str] = None) -> Optional[str]:
+async def create_user(username: str, email: str, password: str, profile_photo: Optional[str] = None) -> Optional[str]:
     """Create a new user and return user_id"""
+    db = get_db()
     try:
         if db:
-            # Check if email already exists
-            existing_user = db.collection('users').where(
-                'email', '==', email).limit(1).stream()
-            if len(list(existing_user)) > 0:
+            # Check if email or username already exists (lectures en parallèle)
+            existing_user, existing_username = await asyncio.gather(
+                deadline.db_call(db.collection('users').where(
+                    'email', '==', email).limit(1).get(), "db.create_user"),
+                deadline.db_call(db.collection('users').where(
+                    'username', '==', username).limit(1).get(), "db.create_user")
+            )
+            if len(existing_user) > 0:
                 print(f"❌ Email already exists: {email}")
                 return None
 
-            # Check if username already exists
-            existing_username = db.collection('users').where(
-                'username', '==', username).limit(1).stream()
-            if len(list(existing_username)) > 0:
+            if len(existing_username) > 0:
                 print(f"❌ Username already exists: {username}")
                 return None
 
@@ -181,7 +1064,8 @@ def create_user(username: str, email: str, password: str, profile_photo: Optiona
                 'last_login': firestore.SERVER_TIMESTAMP
             }
 
-            db.collection('users').document(user_id).set(user_data)
+            await deadline.db_call(
+                db.collection('users').document(user_id).set(user_data), "db.create_user")
             print(f"✅ User created: {username} ({user_id})")
             return user_id
         else:
@@ -192,13 +1076,14 @@ def create_user(username: str, email: str, password: str, profile_photo: Optiona
         return None
 
 
-def authenticate_user(email: str, password: str) -> Optional[Dict[str, Any]]:
+async def authenticate_user(email: str, password: str) -> Optional[Dict[str, Any]]:
     """Authenticate user and return user data"""
+    db = get_db()
     try:
         if db:
             users_ref = db.collection('users').where(
                 'email', '==', email).limit(1)
-            users = list(users_ref.stream())
+            users = await deadline.db_call(users_ref.get(), "db.authenticate_user")
 
             if len(users) == 0:
                 print(f"❌ User not found: {email}")
@@ -209,9 +1094,10 @@ def authenticate_user(email: str, password: str) -> Optional[Dict[str, Any]]:
 
             if verify_password(password, user_data['password_hash']):
                 # Update last login
-                db.collection('users').document(user_data['user_id']).update({
-                    'last_login': firestore.SERVER_TIMESTAMP
-                })
+                await deadline.db_call(
+                    db.collection('users').document(user_data['user_id']).update({
+                        'last_login': firestore.SERVER_TIMESTAMP
+                    }), "db.authenticate_user")
 
                 # Remove password hash from returned data
                 user_data.pop('password_hash', None)
@@ -238,12 +1124,14 @@ def authenticate_user(email: str, password: str) -> Optional[Dict[str, Any]]:
         return None
 
 
-def get_user_by_id(user_id: str) -> Optional[Dict[str, Any]]:
+@deadline.with_db_timeout
+async def get_user_by_id(user_id: str) -> Optional[Dict[str, Any]]:
     """Get user by ID"""
+    db = get_db()
     try:
         if db:
             user_ref = db.collection('users').document(user_id)
-            user_doc = user_ref.get()
+            user_doc = await user_ref.get()
 
             if user_doc.exists:
                 user_data = user_doc.to_dict()
@@ -271,8 +1159,10 @@ def get_user_by_id(user_id: str) -> Optional[Dict[str, Any]]:
         return None
 
 
-def update_user(user_id: str, updates: Dict[str, Any]) -> bool:
+@deadline.with_db_timeout
+async def update_user(user_id: str, updates: Dict[str, Any]) -> bool:
     """Update user data"""
+    db = get_db()
     try:
         if db:
             # Remove sensitive fields that shouldn't be updated directly
@@ -280,7 +1170,7 @@ def update_user(user_id: str, updates: Dict[str, Any]) -> bool:
                             if k not in ['user_id', 'email', 'password_hash', 'created_at']}
 
             if safe_updates:
-                db.collection('users').document(user_id).update(safe_updates)
+                await db.collection('users').document(user_id).update(safe_updates)
                 print(f"✅ User updated: {user_id}")
                 return True
             else:
@@ -294,12 +1184,13 @@ def update_user(user_id: str, updates: Dict[str, Any]) -> bool:
         return False
 
 
-def add_points_to_user(user_id: str, points: int, reason: str = "") -> bool:
+async def add_points_to_user(user_id: str, points: int, reason: str = "") -> bool:
     """Add points to user and update level if necessary"""
+    db = get_db()
     try:
         if db:
             user_ref = db.collection('users').document(user_id)
-            user_doc = user_ref.get()
+            user_doc = await deadline.db_call(user_ref.get(), "db.add_points_to_user")
 
             if user_doc.exists:
                 user_data = user_doc.to_dict()
@@ -322,7 +1213,7 @@ def add_points_to_user(user_id: str, points: int, reason: str = "") -> bool:
                         current_badges.append(level_badge)
                         updates['badges'] = current_badges
 
-                user_ref.update(updates)
+                await deadline.db_call(user_ref.update(updates), "db.add_points_to_user")
                 print(
                     f"✅ Points added to user {user_id}: +{points} ({reason})")
                 return True
@@ -343,13 +1234,19 @@ def calculate_level(points: int) -> int:
     return max(1, points // 100 + 1)
 
 
-def update_user_reputation(user_id: str) -> bool:
+# Votes needed before an article's majority counts as community consensus
+MIN_CONSENSUS_VOTES = 5
+
+
+async def update_user_reputation(user_id: str) -> bool:
     """Update user reputation based on vote accuracy"""
+    db = get_db()
     try:
         if db:
             # Get all votes by the user
-            votes_ref = db.collection('votes').where('user_id', '==', user_id)
-            votes = list(votes_ref.stream())
+            votes_ref = db.collection('votes').where(
+                'user_id', '==', user_id).select(['article_id', 'vote'])
+            votes = await deadline.db_call(votes_ref.get(), "db.update_user_reputation")
 
             if len(votes) == 0:
                 return True  # No votes yet, keep default reputation
@@ -357,16 +1254,35 @@ def update_user_reputation(user_id: str) -> bool:
             total_votes = len(votes)
             accurate_votes = 0
 
+            # Community consensus from the raw counters only, read in batches
+            # (a few batched reads at a time, never one query per article)
+            semaphore = asyncio.Semaphore(USER_READ_CONCURRENCY)
+            article_ids = list(dict.fromkeys(vote_doc.get('article_id') for vote_doc in votes))
+
+            async def read_counts(chunk):
+                refs = [db.collection('article_vote_counts').document(a) for a in chunk]
+
+                async def read():
+                    return {doc.id: doc.to_dict() async for doc
+                            in db.get_all(refs, field_paths=['positive', 'negative'])
+                            if doc.exists}
+                # Timeout started once the slot is taken: waiting for it is free
+                async with semaphore:
+                    return await deadline.db_call(read(), "db.update_user_reputation")
+
+            all_counts = {}
+            for chunk_counts in await asyncio.gather(*(
+                    read_counts(article_ids[i:i + USER_READ_BATCH_SIZE])
+                    for i in range(0, len(article_ids), USER_READ_BATCH_SIZE))):
+                all_counts.update(chunk_counts)
+
             # Calculate accuracy (simplified: assume community consensus is correct)
             for vote_doc in votes:
-                vote_data = vote_doc.to_dict()
-                article_id = vote_data['article_id']
-                user_vote = vote_data['vote']
+                user_vote = vote_doc.get('vote')
+                article_votes = vote_summary(all_counts.get(vote_doc.get('article_id'), {}))
 
-                # Get article votes to determine community consensus
-                article_votes = get_article_votes(article_id)
                 # Only consider articles with enough votes
-                if article_votes['total'] >= 5:
+                if article_votes['total'] >= MIN_CONSENSUS_VOTES:
                     community_consensus = 1 if article_votes['positive'] > article_votes['negative'] else -1
                     if user_vote == community_consensus:
                         accurate_votes += 1
@@ -376,9 +1292,11 @@ def update_user_reputation(user_id: str) -> bool:
                 reputation = accurate_votes / total_votes
 
                 # Update user reputation
-                db.collection('users').document(user_id).update({
+                await deadline.db_call(db.collection('users').document(user_id).update({
                     'reputation': reputation
-                })
+                }), "db.update_user_reputation")
+                # The new reputation is this voter's weight from now on
+                weights.store.update([user_id], [reputation])
 
                 print(
                     f"✅ User reputation updated: {user_id} -> {reputation:.2f}")
@@ -390,15 +1308,14 @@ def update_user_reputation(user_id: str) -> bool:
         return False
 
 
-def get_user_stats(user_id: str) -> Dict[str, Any]:
+async def get_user_stats(user_id: str) -> Dict[str, Any]:
     """Get detailed user statistics"""
     try:
-        user_data = get_user_by_id(user_id)
+        user_data, vote_count = await asyncio.gather(
+            get_user_by_id(user_id), get_user_vote_count(user_id))
         if not user_data:
             return {}
 
-        vote_count = get_user_vote_count(user_id)
-
         return {
             'total_votes': vote_count,
             'level': user_data.get('level', 1),
@@ -0,0 +1,137 @@
+"""
+Per-request deadlines and cancellation on client disconnect
+
+The deadline of the current request lives in a context variable, so it
+follows the request through `analyze_text`, `analyze_with_gemini` and the
+db layer (tasks created by the request inherit it). Each awaited Firestore
+or Gemini call is bounded by the time left, capped by its own timeout
+(per RPC: a helper making several calls never fails as a whole on a cap).
+Work that must outlive the request (persisting a finished analysis) runs
+detached: shielded from cancellation and free of the deadline.
+"""
+
+import asyncio
+import functools
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Optional
+
+from . import metrics
+
+# Configuration
+ANALYZE_DEADLINE_SECONDS = float(os.getenv("ANALYZE_DEADLINE_SECONDS", 30))
+DB_TIMEOUT_SECONDS = float(os.getenv("FIRESTORE_TIMEOUT_SECONDS", 10))
+DISCONNECT_POLL_SECONDS = 0.5
+
+# time.monotonic() at which the current request expires (None: no deadline)
+_expires_at: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+# Detached tasks kept referenced until done
+_detached_tasks = set()
+
+
+class DeadlineExceededError(Exception):
+    """The request ran out of time"""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Deadline exceeded during {stage}")
+        self.stage = stage
+
+
+class ClientDisconnectedError(Exception):
+    """The client went away before the response was ready"""
+
+
+@contextmanager
+def scope(seconds: Optional[float]):
+    """Run the block with a deadline `seconds` from now (None: no deadline)"""
+    token = _expires_at.set(None if seconds is None else time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _expires_at.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the deadline, None without a deadline"""
+    expires_at = _expires_at.get()
+    if expires_at is None:
+        return None
+    return max(0.0, expires_at - time.monotonic())
+
+
+def timeout_for(cap: Optional[float] = None) -> Optional[float]:
+    """Time allowed for the next call: what is left, at most `cap`"""
+    left = remaining()
+    if left is None:
+        return cap
+    return left if cap is None else min(left, cap)
+
+
+async def bounded(awaitable: Awaitable, stage: str, cap: Optional[float] = None) -> Any:
+    """
+    Await within the deadline (and `cap` seconds)
+    Raises DeadlineExceededError on timeout; the awaitable is cancelled
+    """
+    try:
+        return await asyncio.wait_for(awaitable, timeout_for(cap))
+    except asyncio.TimeoutError:
+        metrics.increment("deadline_exceeded_total", stage=stage)
+        raise DeadlineExceededError(stage)
+
+
+async def db_call(awaitable: Awaitable, stage: str) -> Any:
+    """One Firestore RPC, bounded by the deadline and FIRESTORE_TIMEOUT_SECONDS"""
+    return await bounded(awaitable, stage, DB_TIMEOUT_SECONDS)
+
+
+def with_db_timeout(func):
+    """
+    Bound a single-RPC Firestore coroutine function by the deadline and
+    FIRESTORE_TIMEOUT_SECONDS. Functions making several calls bound each
+    one with db_call() instead, inside their own error handling
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await bounded(func(*args, **kwargs), f"db.{func.__name__}", DB_TIMEOUT_SECONDS)
+    return wrapper
+
+
+def detached(coro: Awaitable) -> asyncio.Task:
+    """
+    Run `coro` in its own task without the request deadline
+    Await it through asyncio.shield() so a cancelled request doesn't stop it
+    """
+    async def run():
+        _expires_at.set(None)  # Only in this task's copy of the context
+        return await coro
+
+    task = asyncio.create_task(run())
+    _detached_tasks.add(task)
+    task.add_done_callback(_detached_tasks.discard)
+    return task
+
+
+async def cancel_on_disconnect(request, coro: Awaitable) -> Any:
+    """
+    Await `coro` while polling the client connection
+    Raises ClientDisconnectedError (after cancelling `coro`) if the client left
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                await asyncio.wait({task})
+                metrics.increment("requests_cancelled_total", route=request.url.path)
+                print(f"🚫 Client disconnected, {request.url.path} cancelled")
+                raise ClientDisconnectedError()
+    finally:
+        # The request itself was cancelled (server shutdown)
+        if not task.done():
+            task.cancel()
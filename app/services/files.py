@@ -2,23 +2,57 @@
 File management service for local file storage
 """
 
+import asyncio
+import fcntl
+import hashlib
+import json
 import os
+import re
+import time
 import uuid
-import shutil
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Optional, Tuple, List, Dict, Any, AsyncIterator
 from fastapi import UploadFile, HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
 
 # Configuration
 UPLOAD_DIR = "uploads"
 PROFILE_PHOTOS_DIR = os.path.join(UPLOAD_DIR, "profile_photos")
+INCOMING_DIR = "uploads_incoming"  # Partial uploads, outside the served directory
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
 
+# Derivatives generated for every profile photo (square thumbnails)
+PHOTO_SIZES = (64, 128, 256, 512)
+PHOTO_FORMATS = ("avif", "webp")
+DEFAULT_PHOTO_SIZE = 256
+DEFAULT_PHOTO_FORMAT = "webp"
+PHOTO_QUALITY = {"avif": 55, "webp": 80}
+MAX_IMAGE_PIXELS = 40_000_000  # Reject decompression bombs early
+UPLOAD_CHUNK_SIZE = 64 * 1024
+MAGIC_BYTES_LENGTH = 12  # Enough to recognise every allowed format
+UPLOAD_SESSION_TTL_SECONDS = 24 * 3600
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Content-addressed names: sha256 hex digest, optionally followed by a variant suffix
+_CONTENT_ADDRESSED_NAME = re.compile(r"^([0-9a-f]{64}(?:_\d+)?)\.[a-z0-9]+$")
+# URL of a photo variant: .../{sha256}_{size}.{format}
+_VARIANT_URL = re.compile(r"/([0-9a-f]{64})_\d+\.[a-z0-9]+$")
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", min(2, os.cpu_count() or 1)))
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
 
 def initialize_upload_directories():
     """Create upload directories if they don't exist"""
     os.makedirs(PROFILE_PHOTOS_DIR, exist_ok=True)
+    os.makedirs(INCOMING_DIR, exist_ok=True)
     print(f"✅ Upload directories initialized: {PROFILE_PHOTOS_DIR}")
 
 
@@ -43,15 +77,244 @@ def generate_unique_filename(original_filename: str) -> str:
     return unique_name
 
 
+def generate_content_filename(digest: str, file_extension: str) -> str:
+    """Content-addressed filename: sha256 of the bytes plus normalized extension"""
+    file_extension = file_extension.lower()
+    if file_extension == ".jpeg":
+        file_extension = ".jpg"
+    return f"{digest}{file_extension}"
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """
+    StaticFiles serving content-addressed uploads as immutable
+    The content hash in the filename doubles as a strong ETag, so browsers
+    and CDNs can cache forever and revalidation answers 304
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        match = _CONTENT_ADDRESSED_NAME.match(os.path.basename(full_path))
+        if not match:
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        request_headers = Headers(scope=scope)
+        response = FileResponse(
+            full_path,
+            status_code=status_code,
+            stat_result=stat_result,
+            headers={
+                "etag": f'"{match.group(1)}"',
+                "cache-control": IMMUTABLE_CACHE_CONTROL,
+            }
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Lazily create the process pool used for CPU-bound image work"""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _process_pool
+
+
+def shutdown_process_pool():
+    """Stop the image process pool (called on application shutdown)"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def get_variant_path(file_path: str, size: int, fmt: str) -> str:
+    """Path of the `size`px `fmt` derivative of an uploaded photo"""
+    stem = os.path.splitext(file_path)[0]
+    return f"{stem}_{size}.{fmt}"
+
+
+def render_photo_derivatives(source_path: str) -> List[str]:
+    """
+    Decode a photo and write its resized/re-encoded variants
+    Runs inside the process pool - keep it free of async or app state
+    """
+    from PIL import Image, ImageOps, features
+
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    formats = [fmt for fmt in PHOTO_FORMATS
+               if fmt != "avif" or features.check("avif")]
+
+    written = []
+    with Image.open(source_path) as image:
+        image.seek(0)  # First frame only for animated GIF/WebP
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ("RGBA", "LA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+        # Resize from the largest size down, each step reusing the previous one
+        current = image
+        for size in sorted(PHOTO_SIZES, reverse=True):
+            current = ImageOps.fit(
+                current, (size, size), Image.Resampling.LANCZOS)
+            for fmt in formats:
+                variant_path = get_variant_path(source_path, size, fmt)
+                current.save(variant_path, format=fmt.upper(),
+                             quality=PHOTO_QUALITY[fmt])
+                written.append(variant_path)
+
+    return written
+
+
+async def generate_photo_derivatives(source_path: str) -> List[str]:
+    """Render photo derivatives in the process pool, off the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_process_pool(), render_photo_derivatives, source_path)
+
+
+def sniff_image_extension(head: bytes) -> Optional[str]:
+    """Detect the image format from its magic bytes"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return ".gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+
+def _file_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)}MB"
+    )
+
+
+class StreamingPhotoWriter:
+    """
+    Write an incoming photo to disk as chunks arrive
+    The size limit and magic bytes are checked on every chunk, so bad
+    uploads are rejected without waiting for the rest of the body (magic
+    bytes as soon as MAGIC_BYTES_LENGTH bytes exist, `head` being those
+    already on disk when resuming).
+    Disk writes run in the threadpool to keep the event loop free.
+    """
+
+    def __init__(self, path: str, offset: int = 0, expected_size: Optional[int] = None,
+                 head: bytes = b""):
+        self.path = path
+        self.size = offset
+        self.max_size = min(expected_size or MAX_FILE_SIZE, MAX_FILE_SIZE)
+        self.extension: Optional[str] = None
+        # Hash incrementally only when writing from the start of the file
+        self.digest = hashlib.sha256() if offset == 0 else None
+        self._head = head
+        self._file = None
+        self._check_magic = offset < MAGIC_BYTES_LENGTH
+
+    async def write(self, chunk: bytes):
+        if not chunk:
+            return
+
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise _file_too_large()
+
+        if self._check_magic:
+            self._head = (self._head + chunk)[:MAGIC_BYTES_LENGTH]
+            if len(self._head) >= MAGIC_BYTES_LENGTH:
+                self._validate_magic()
+
+        if self.digest is not None:
+            self.digest.update(chunk)
+
+        if self._file is None:
+            self._file = await run_in_threadpool(open, self.path, "ab")
+        await run_in_threadpool(self._file.write, chunk)
+
+    def _validate_magic(self):
+        self._check_magic = False
+        self.extension = sniff_image_extension(self._head)
+        if self.extension is None:
+            raise HTTPException(
+                status_code=415,
+                detail=f"Invalid file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
+            )
+
+    def finish(self):
+        """The whole file was received: validate one shorter than the signature"""
+        if self._check_magic:
+            self._validate_magic()
+
+    async def close(self):
+        if self._file is not None:
+            await run_in_threadpool(self._file.close)
+            self._file = None
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_head(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read(MAGIC_BYTES_LENGTH)
+
+
+async def store_photo(temp_path: str, extension: str, digest: Optional[str] = None) -> str:
+    """
+    Move a fully received photo to its content-addressed location
+    and build its derivatives. Returns the relative path for URL generation.
+    """
+    if digest is None:
+        digest = await run_in_threadpool(_hash_file, temp_path)
+
+    content_filename = generate_content_filename(digest, extension)
+    file_path = os.path.join(PROFILE_PHOTOS_DIR, content_filename)
+    default_variant = get_variant_path(
+        file_path, DEFAULT_PHOTO_SIZE, DEFAULT_PHOTO_FORMAT)
+
+    if os.path.exists(file_path) and os.path.exists(default_variant):
+        # Same bytes already stored (by this or another user): deduplicate
+        os.remove(temp_path)
+        print(f"♻️ Profile photo already stored: {content_filename}")
+    else:
+        os.replace(temp_path, file_path)
+
+        # Build resized WebP/AVIF variants; undecodable images are rejected
+        try:
+            await generate_photo_derivatives(file_path)
+        except Exception as e:
+            print(f"❌ Could not process image {content_filename}: {e}")
+            delete_profile_photo(file_path)
+            raise HTTPException(
+                status_code=400, detail="Invalid or corrupted image file")
+
+    return f"uploads/profile_photos/{content_filename}"
+
+
+def _remove_quietly(path: str):
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except OSError:
+        pass
+
+
 async def save_profile_photo(user_id: str, file: UploadFile) -> Optional[str]:
     """
     Save profile photo and return the file path
     Returns None if save fails
     """
+    temp_path = None
     try:
-        # Initialize directories
-        initialize_upload_directories()
-
         # Validate file
         if not validate_image_file(file):
             raise HTTPException(
@@ -59,27 +322,22 @@ async def save_profile_photo(user_id: str, file: UploadFile) -> Optional[str]:
                 detail=f"Invalid file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
             )
 
-        # Check file size
-        file.file.seek(0, 2)  # Seek to end
-        file_size = file.file.tell()
-        file.file.seek(0)  # Reset to beginning
-
-        if file_size > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail=f"File too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)}MB"
-            )
-
-        # Generate unique filename
-        unique_filename = generate_unique_filename(file.filename)
-        file_path = os.path.join(PROFILE_PHOTOS_DIR, unique_filename)
+        if file.size is not None and file.size > MAX_FILE_SIZE:
+            raise _file_too_large()
 
-        # Save file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Copy chunk by chunk, validating and hashing on the way
+        temp_path = os.path.join(
+            INCOMING_DIR, f"{generate_unique_filename(file.filename)}.tmp")
+        writer = StreamingPhotoWriter(temp_path)
+        try:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await writer.write(chunk)
+        finally:
+            await writer.close()
+        writer.finish()
 
-        # Return relative path for URL generation
-        relative_path = f"uploads/profile_photos/{unique_filename}"
+        relative_path = await store_photo(
+            temp_path, writer.extension, writer.digest.hexdigest())
         print(f"✅ Profile photo saved: {relative_path} for user {user_id}")
 
         return relative_path
@@ -89,13 +347,209 @@ async def save_profile_photo(user_id: str, file: UploadFile) -> Optional[str]:
     except Exception as e:
         print(f"❌ Error saving profile photo: {e}")
         return None
+    finally:
+        if temp_path:
+            _remove_quietly(temp_path)
+
+
+async def save_profile_photo_stream(
+    user_id: str,
+    chunks: AsyncIterator[bytes],
+    content_length: Optional[int] = None
+) -> Optional[str]:
+    """
+    Save a profile photo sent as a raw request body, reading it as it arrives
+    Oversized or non-image uploads are rejected within the first chunk
+    """
+    if content_length is not None and content_length > MAX_FILE_SIZE:
+        raise _file_too_large()
+
+    temp_path = os.path.join(INCOMING_DIR, f"{uuid.uuid4()}.tmp")
+    try:
+        writer = StreamingPhotoWriter(temp_path, expected_size=content_length)
+        try:
+            async for chunk in chunks:
+                await writer.write(chunk)
+        finally:
+            await writer.close()
+
+        if content_length is not None and writer.size != content_length:
+            raise HTTPException(
+                status_code=400, detail="Incomplete upload body")
+        writer.finish()
+
+        relative_path = await store_photo(
+            temp_path, writer.extension, writer.digest.hexdigest())
+        print(f"✅ Profile photo streamed: {relative_path} for user {user_id}")
+        return relative_path
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Error streaming profile photo: {e}")
+        return None
+    finally:
+        _remove_quietly(temp_path)
+
+
+# === RESUMABLE UPLOADS ===
+
+def _session_paths(upload_id: str) -> Tuple[str, str]:
+    # upload_id comes from the URL: only accept ids we could have generated
+    if not re.fullmatch(r"[0-9a-f]{32}", upload_id):
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    base = os.path.join(INCOMING_DIR, upload_id)
+    return f"{base}.json", f"{base}.part"
+
+
+@contextmanager
+def _session_lock(meta_path: str):
+    """
+    Exclusive lock on an upload session, across workers: a concurrent
+    PATCH on the same session gets a 409 instead of appending twice
+    """
+    try:
+        fd = os.open(meta_path, os.O_RDONLY)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise HTTPException(
+                status_code=409, detail="Another chunk of this upload is being received")
+        yield
+    finally:
+        os.close(fd)  # Releases the lock
+
+
+def _write_session(meta_path: str, session: Dict[str, Any]):
+    with open(meta_path, "w") as f:
+        json.dump(session, f)
+
+
+def _load_session(meta_path: str, data_path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        session = json.load(f)
+    session["offset"] = os.path.getsize(
+        data_path) if os.path.exists(data_path) else 0
+    return session
+
+
+def _expire_stale_sessions():
+    """Drop sessions that were not touched for UPLOAD_SESSION_TTL_SECONDS"""
+    cutoff = time.time() - UPLOAD_SESSION_TTL_SECONDS
+    for name in os.listdir(INCOMING_DIR):
+        path = os.path.join(INCOMING_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+async def create_upload_session(user_id: str, upload_length: int) -> Dict[str, Any]:
+    """Start a resumable upload of `upload_length` bytes"""
+    if upload_length <= 0:
+        raise HTTPException(status_code=400, detail="Invalid Upload-Length")
+    if upload_length > MAX_FILE_SIZE:
+        raise _file_too_large()
+
+    await run_in_threadpool(_expire_stale_sessions)
+
+    upload_id = uuid.uuid4().hex
+    meta_path, _ = _session_paths(upload_id)
+    session = {
+        "upload_id": upload_id,
+        "user_id": user_id,
+        "length": upload_length,
+        "created_at": time.time()
+    }
+    await run_in_threadpool(_write_session, meta_path, session)
+    print(f"✅ Upload session created: {upload_id} for user {user_id}")
+    return {**session, "offset": 0}
+
+
+async def get_upload_session(user_id: str, upload_id: str) -> Dict[str, Any]:
+    """Return the session with the number of bytes already received"""
+    meta_path, data_path = _session_paths(upload_id)
+    session = await run_in_threadpool(_load_session, meta_path, data_path)
+    if not session or session["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return session
+
+
+async def append_upload_chunk(
+    user_id: str,
+    upload_id: str,
+    offset: int,
+    chunks: AsyncIterator[bytes]
+) -> Dict[str, Any]:
+    """
+    Append a chunk at `offset` to a resumable upload
+    When the last byte arrives, the photo is stored and the returned
+    session contains its `file_path`
+    """
+    meta_path, data_path = _session_paths(upload_id)
+    with _session_lock(meta_path):
+        session = await get_upload_session(user_id, upload_id)
+        if offset != session["offset"]:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Upload-Offset mismatch, expected {session['offset']}",
+                headers={"Upload-Offset": str(session["offset"])}
+            )
+
+        # Signature split across chunks: resume its check with the bytes on disk
+        head = (await run_in_threadpool(_read_head, data_path)
+                if 0 < offset < MAGIC_BYTES_LENGTH else b"")
+        writer = StreamingPhotoWriter(
+            data_path, offset=offset, expected_size=session["length"], head=head)
+        try:
+            try:
+                async for chunk in chunks:
+                    await writer.write(chunk)
+            finally:
+                await writer.close()
+        except HTTPException:
+            # A rejected upload cannot be resumed
+            _remove_quietly(data_path)
+            _remove_quietly(meta_path)
+            raise
+
+        session["offset"] = writer.size
+        if session["offset"] < session["length"]:
+            return session
+
+        # Upload complete: validate the signature once more and store it
+        extension = sniff_image_extension(
+            await run_in_threadpool(_read_head, data_path))
+        _remove_quietly(meta_path)
+        if extension is None:
+            _remove_quietly(data_path)
+            raise HTTPException(status_code=415, detail="Invalid file type")
+
+        try:
+            session["file_path"] = await store_photo(data_path, extension)
+        finally:
+            _remove_quietly(data_path)
+    print(
+        f"✅ Resumable upload completed: {session['file_path']} for user {user_id}")
+    return session
 
 
 def delete_profile_photo(file_path: str) -> bool:
-    """Delete a profile photo file"""
+    """Delete a profile photo file and its derivatives"""
     try:
         if file_path and os.path.exists(file_path):
             os.remove(file_path)
+            for size in PHOTO_SIZES:
+                for fmt in PHOTO_FORMATS:
+                    variant_path = get_variant_path(file_path, size, fmt)
+                    if os.path.exists(variant_path):
+                        os.remove(variant_path)
             print(f"✅ Profile photo deleted: {file_path}")
             return True
         return False
@@ -104,16 +558,55 @@ def delete_profile_photo(file_path: str) -> bool:
         return False
 
 
-def get_file_url(file_path: str, base_url: str = "http://localhost:8000") -> str:
-    """Generate full URL for a file path"""
+def get_file_url(
+    file_path: str,
+    base_url: str = "http://localhost:8000",
+    size: Optional[int] = None,
+    fmt: str = DEFAULT_PHOTO_FORMAT
+) -> str:
+    """
+    Generate full URL for a file path
+    With `size`, points to the smallest derivative at least that large
+    """
     if not file_path:
         return ""
 
+    if size is not None:
+        variant_size = next(
+            (s for s in sorted(PHOTO_SIZES) if s >= size), max(PHOTO_SIZES))
+        if fmt not in PHOTO_FORMATS:
+            fmt = DEFAULT_PHOTO_FORMAT
+        variant_path = get_variant_path(file_path, variant_size, fmt)
+        # AVIF is only produced when Pillow was built with libavif
+        if fmt != DEFAULT_PHOTO_FORMAT and not os.path.exists(variant_path):
+            variant_path = get_variant_path(
+                file_path, variant_size, DEFAULT_PHOTO_FORMAT)
+        file_path = variant_path
+
     # Ensure file_path uses forward slashes for URLs
     normalized_path = file_path.replace("\\", "/")
     return f"{base_url}/{normalized_path}"
 
 
+def get_photo_variant_urls(photo_url: Optional[str]) -> Dict[str, Dict[str, str]]:
+    """
+    URLs of every generated derivative of a profile photo, from the URL
+    stored on the profile: {format: {size: url}}. AVIF only when it was built
+    """
+    match = _VARIANT_URL.search(photo_url or "")
+    if not match:
+        return {}
+    prefix, digest = photo_url[:match.start(1)], match.group(1)
+    variants = {}
+    for fmt in PHOTO_FORMATS:
+        # All sizes of a format are written together: one check is enough
+        probe = os.path.join(PROFILE_PHOTOS_DIR, f"{digest}_{DEFAULT_PHOTO_SIZE}.{fmt}")
+        if fmt == DEFAULT_PHOTO_FORMAT or os.path.exists(probe):
+            variants[fmt] = {str(size): f"{prefix}{digest}_{size}.{fmt}"
+                             for size in PHOTO_SIZES}
+    return variants
+
+
 def cleanup_old_user_photos(user_id: str, current_photo_path: str):
     """Remove old profile photos for a user (optional cleanup)"""
     try:
@@ -124,7 +617,3 @@ def cleanup_old_user_photos(user_id: str, current_photo_path: str):
             pass
     except Exception as e:
         print(f"⚠️ Error during photo cleanup: {e}")
-
-
-# Initialize directories on module import
-initialize_upload_directories()
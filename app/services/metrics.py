@@ -0,0 +1,62 @@
+"""
+In-process metrics: counters, gauges and latency summaries
+Exposed as JSON on GET /metrics (one snapshot per worker process)
+"""
+
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Any
+
+_counters: Dict[str, float] = defaultdict(float)
+_gauges: Dict[str, float] = {}
+_timings: Dict[str, Dict[str, float]] = {}
+
+
+def _key(name: str, labels: Dict[str, Any]) -> str:
+    """Prometheus-like key: name{label="value",...}"""
+    if not labels:
+        return name
+    rendered = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+    return f"{name}{{{rendered}}}"
+
+
+def increment(name: str, value: float = 1, **labels):
+    """Increase a counter"""
+    _counters[_key(name, labels)] += value
+
+
+def set_gauge(name: str, value: float, **labels):
+    """Set the current value of a gauge"""
+    _gauges[_key(name, labels)] = value
+
+
+def observe(name: str, seconds: float, **labels):
+    """Record a duration in a count/sum/max summary"""
+    key = _key(name, labels)
+    timing = _timings.setdefault(key, {"count": 0, "sum": 0.0, "max": 0.0})
+    timing["count"] += 1
+    timing["sum"] += seconds
+    timing["max"] = max(timing["max"], seconds)
+
+
+@contextmanager
+def timer(name: str, **labels):
+    """Observe the duration of a block"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def snapshot() -> Dict[str, Any]:
+    """Current values of all metrics"""
+    return {
+        "counters": dict(_counters),
+        "gauges": dict(_gauges),
+        "timings": {
+            key: {**timing, "avg": timing["sum"] / timing["count"]}
+            for key, timing in _timings.items()
+        }
+    }
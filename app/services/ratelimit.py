@@ -0,0 +1,196 @@
+"""
+Rate limiting with GCRA (generic cell rate algorithm)
+
+Each key (user id from the access token, or client IP) has a theoretical
+arrival time (TAT): one float per key, no window bookkeeping. A budget of
+`limit` requests per `period` allows bursts of `limit` and then one request
+every period/limit seconds.
+
+Backends:
+- memory: per-process dict (each worker enforces the budget on its own)
+- shared: fixed-size table in a memory-mapped file (/dev/shm by default)
+  shared by every worker of the host, slots locked with fcntl byte ranges
+"""
+
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request, Response
+
+from . import auth, metrics
+
+# Configuration
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory | shared
+RATE_LIMIT_SHARED_PATH = os.getenv(
+    "RATE_LIMIT_SHARED_PATH",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+                 "factflow-ratelimit"))
+RATE_LIMIT_SLOTS = int(os.getenv("RATE_LIMIT_SLOTS", 65536))
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "false").lower() == "true"
+
+# Budget per route, e.g. "10/minute"
+ROUTE_LIMITS = {
+    "analyze": os.getenv("ANALYZE_RATE_LIMIT", "10/minute"),
+    "vote": os.getenv("VOTE_RATE_LIMIT", "30/minute"),
+}
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+@dataclass(frozen=True)
+class Budget:
+    limit: int
+    period: float
+
+    @property
+    def interval(self) -> float:
+        return self.period / self.limit
+
+    @classmethod
+    def parse(cls, spec: str) -> "Budget":
+        count, unit = spec.split("/")
+        return cls(int(count), _PERIODS[unit.strip().rstrip("s")])
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float  # Seconds until the full budget is available again
+    retry_after: float  # Seconds until the next request is allowed (0 if allowed)
+
+
+def gcra(tat: float, now: float, budget: Budget) -> Tuple[Decision, float]:
+    """One GCRA step: the decision and the TAT to store"""
+    tat = max(tat, now)
+    new_tat = tat + budget.interval
+    allow_at = new_tat - budget.period
+    if now < allow_at:
+        return Decision(False, budget.limit, 0, tat - now, allow_at - now), tat
+    remaining = int((budget.period - (new_tat - now)) / budget.interval + 1e-9)
+    return Decision(True, budget.limit, remaining, new_tat - now, 0.0), new_tat
+
+
+class MemoryBackend:
+    """Per-process TAT table, pruned of expired keys as it grows"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self._tats: Dict[str, float] = {}
+        self._max_keys = max_keys
+
+    def hit(self, key: str, budget: Budget) -> Decision:
+        now = time.time()
+        decision, tat = gcra(self._tats.get(key, 0.0), now, budget)
+        self._tats[key] = tat
+        if len(self._tats) > self._max_keys:
+            # An expired TAT is equivalent to an absent key
+            self._tats = {k: t for k, t in self._tats.items() if t > now}
+        return decision
+
+
+class SharedBackend:
+    """
+    Open-addressing table of (key hash, TAT) slots in a shared mmap file
+    Each lookup locks only the byte range of its probe window
+    """
+
+    SLOT = struct.Struct("<Qd")
+    PROBES = 8
+
+    def __init__(self, path: str = RATE_LIMIT_SHARED_PATH, slots: int = RATE_LIMIT_SLOTS):
+        self.slots = slots
+        size = (slots + self.PROBES) * self.SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+
+    def hit(self, key: str, budget: Budget) -> Decision:
+        key_hash = int.from_bytes(
+            hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+        start = key_hash % self.slots
+        offset = start * self.SLOT.size
+        length = self.PROBES * self.SLOT.size
+
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, length, offset)
+        try:
+            target, current_tat, oldest_tat = start, 0.0, math.inf
+            for slot in range(start, start + self.PROBES):
+                slot_hash, tat = self.SLOT.unpack_from(self._map, slot * self.SLOT.size)
+                if slot_hash == key_hash:
+                    target, current_tat = slot, tat
+                    break
+                # New key: take the free, expired or least recently used slot
+                if tat < oldest_tat:
+                    target, oldest_tat = slot, tat
+            decision, new_tat = gcra(current_tat, time.time(), budget)
+            self.SLOT.pack_into(self._map, target * self.SLOT.size, key_hash, new_tat)
+            return decision
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, length, offset)
+
+
+# Backend of the current process (the mmap is reopened after a fork)
+_backend = None
+_backend_pid: Optional[int] = None
+_budgets = {route: Budget.parse(spec) for route, spec in ROUTE_LIMITS.items()}
+
+
+def get_backend():
+    global _backend, _backend_pid
+    if _backend_pid != os.getpid():
+        _backend = SharedBackend() if RATE_LIMIT_BACKEND == "shared" else MemoryBackend()
+        _backend_pid = os.getpid()
+    return _backend
+
+
+def client_key(request: Request) -> str:
+    """User id from the access token when present, client IP otherwise"""
+    authorization = request.headers.get("authorization")
+    if authorization:
+        token = authorization.removeprefix("Bearer ").strip()
+        user_data = auth.verify_access_token(token)
+        if user_data and user_data.get("user_id"):
+            return f"user:{user_data['user_id']}"
+
+    forwarded_for = request.headers.get("x-forwarded-for")
+    if TRUST_PROXY_HEADERS and forwarded_for:
+        return f"ip:{forwarded_for.split(',')[0].strip()}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def rate_limit_headers(decision: Decision, budget: Budget) -> Dict[str, str]:
+    headers = {
+        "RateLimit-Limit": str(decision.limit),
+        "RateLimit-Remaining": str(decision.remaining),
+        "RateLimit-Reset": str(math.ceil(decision.reset_after)),
+        "RateLimit-Policy": f"{budget.limit};w={int(budget.period)}",
+    }
+    if not decision.allowed:
+        headers["Retry-After"] = str(max(1, math.ceil(decision.retry_after)))
+    return headers
+
+
+def limit(route: str):
+    """FastAPI dependency enforcing the budget of `route`"""
+    budget = _budgets[route]
+
+    async def dependency(request: Request, response: Response):
+        decision = get_backend().hit(f"{route}:{client_key(request)}", budget)
+        headers = rate_limit_headers(decision, budget)
+        if not decision.allowed:
+            metrics.increment("rate_limit_rejected_total", route=route)
+            raise HTTPException(status_code=429, detail="Too many requests",
+                                headers=headers)
+        response.headers.update(headers)
+
+    return dependency
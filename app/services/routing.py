@@ -0,0 +1,222 @@
+"""
+Tiered model routing
+
+A local linear classifier over hashed word n-grams, trained from our stored
+analyses, pre-screens every text:
+- very confident predictions can be answered locally (opt-in)
+- confident predictions and short texts go to a cheaper, faster model tier
+- uncertain ones go to the full model
+Every decision is recorded, and a sample of routed-away texts is re-checked
+by the full model in the background to measure per-tier agreement.
+"""
+
+import asyncio
+import os
+import random
+import re
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from . import db, metrics
+
+# Model tiers
+FULL_MODEL = os.getenv("GEMINI_FULL_MODEL", "gemini-2.5-flash")
+FAST_MODEL = os.getenv("GEMINI_FAST_MODEL", "gemini-2.5-flash-lite")
+MODEL_TIERS = {"fast": FAST_MODEL, "full": FULL_MODEL}
+
+# Thresholds (tune from the recorded decisions)
+FAST_TIER_CONFIDENCE = float(os.getenv("ROUTER_FAST_TIER_CONFIDENCE", 0.75))
+LOCAL_CONFIDENCE = float(os.getenv("ROUTER_LOCAL_CONFIDENCE", 0.97))
+LOCAL_SHORT_CIRCUIT = os.getenv(
+    "ROUTER_LOCAL_SHORT_CIRCUIT", "false").lower() == "true"
+SHORT_TEXT_CHARS = int(os.getenv("ROUTER_SHORT_TEXT_CHARS", 600))
+AGREEMENT_SAMPLE_RATE = float(os.getenv("ROUTER_AGREEMENT_SAMPLE_RATE", 0.05))
+MODEL_PATH = os.getenv("ROUTER_MODEL_PATH", "models/router.npz")
+
+LABELS = ["Red", "Yellow", "Green"]
+N_FEATURES = 2 ** 18
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def hash_features(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Hashed unigrams and bigrams with sublinear tf, L2-normalized
+    crc32 keeps the hashing stable across processes (unlike hash())
+    """
+    tokens = _TOKEN_PATTERN.findall(text.lower())
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    if not grams:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+    hashed = np.fromiter((zlib.crc32(g.encode()) % N_FEATURES for g in grams),
+                         dtype=np.int64, count=len(grams))
+    indices, counts = np.unique(hashed, return_counts=True)
+    values = 1 + np.log(counts.astype(np.float32))
+    values /= np.linalg.norm(values)
+    return indices, values
+
+
+class HashedNgramClassifier:
+    """Multinomial logistic regression over hashed n-gram features"""
+
+    def __init__(self):
+        self.weights = np.zeros((len(LABELS), N_FEATURES), dtype=np.float32)
+        self.bias = np.zeros(len(LABELS), dtype=np.float32)
+        # Average AI score per label, used to score local verdicts
+        self.label_scores = np.array([0.2, 0.55, 0.85], dtype=np.float32)
+
+    def predict_proba(self, text: str) -> np.ndarray:
+        indices, values = hash_features(text)
+        logits = self.weights[:, indices] @ values + self.bias
+        logits -= logits.max()
+        exp = np.exp(logits)
+        return exp / exp.sum()
+
+    def train(self, texts: List[str], labels: List[str], scores: List[float],
+              epochs: int = 5, learning_rate: float = 0.5, l2: float = 1e-6):
+        """Plain SGD; the feature vectors are sparse so each step is cheap"""
+        features = [hash_features(text) for text in texts]
+        targets = np.array([LABELS.index(label) for label in labels])
+
+        for label_index in range(len(LABELS)):
+            mask = targets == label_index
+            if mask.any():
+                self.label_scores[label_index] = np.mean(
+                    np.asarray(scores)[mask])
+
+        order = np.arange(len(features))
+        for epoch in range(epochs):
+            np.random.shuffle(order)
+            rate = learning_rate / (1 + epoch)
+            for i in order:
+                indices, values = features[i]
+                logits = self.weights[:, indices] @ values + self.bias
+                logits -= logits.max()
+                probabilities = np.exp(logits)
+                probabilities /= probabilities.sum()
+                probabilities[targets[i]] -= 1  # Gradient of the log-loss
+                self.weights[:, indices] -= rate * (
+                    np.outer(probabilities, values) + l2 * self.weights[:, indices])
+                self.bias -= rate * probabilities
+
+    def save(self, path: str = MODEL_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(path, weights=self.weights, bias=self.bias,
+                            label_scores=self.label_scores)
+
+    @classmethod
+    def load(cls, path: str = MODEL_PATH) -> "HashedNgramClassifier":
+        model = cls()
+        with np.load(path) as data:
+            model.weights = data["weights"]
+            model.bias = data["bias"]
+            model.label_scores = data["label_scores"]
+        return model
+
+
+@dataclass
+class RoutingDecision:
+    tier: str  # "local", "fast" or "full"
+    reason: str
+    local_label: Optional[str] = None
+    local_confidence: float = 0.0
+    probabilities: List[float] = field(default_factory=list)
+
+
+_classifier: Optional[HashedNgramClassifier] = None
+
+
+def load_classifier(path: str = MODEL_PATH) -> bool:
+    """Load the trained classifier if present; without it everything goes to the full model"""
+    global _classifier
+    if not os.path.exists(path):
+        print(f"⚠️ No routing model at {path} - all texts use {FULL_MODEL}")
+        return False
+    _classifier = HashedNgramClassifier.load(path)
+    print(f"✅ Routing model loaded: {path}")
+    return True
+
+
+def route(text: str) -> RoutingDecision:
+    """Pick the tier for a (cleaned) text"""
+    if _classifier is None:
+        return RoutingDecision(tier="full", reason="no_model")
+
+    probabilities = _classifier.predict_proba(text)
+    best = int(np.argmax(probabilities))
+    decision = RoutingDecision(
+        tier="full",
+        reason="uncertain",
+        local_label=LABELS[best],
+        local_confidence=float(probabilities[best]),
+        probabilities=[round(float(p), 4) for p in probabilities]
+    )
+
+    if LOCAL_SHORT_CIRCUIT and decision.local_confidence >= LOCAL_CONFIDENCE:
+        decision.tier, decision.reason = "local", "confident"
+    elif decision.local_confidence >= FAST_TIER_CONFIDENCE:
+        decision.tier, decision.reason = "fast", "confident"
+    elif len(text) <= SHORT_TEXT_CHARS:
+        decision.tier, decision.reason = "fast", "short_text"
+    return decision
+
+
+def local_result(decision: RoutingDecision) -> Dict[str, Any]:
+    """Verdict answered by the local classifier alone"""
+    score = float(np.dot(decision.probabilities, _classifier.label_scores))
+    return {
+        "score": round(score, 2),
+        "label": decision.local_label,
+        "explanation": "Pre-screened by a classifier trained on previously verified articles; no AI model was called. Community votes can refine this verdict.",
+        "confidence": "medium",
+        "api_available": False
+    }
+
+
+async def record_decision(decision: RoutingDecision, result: Dict[str, Any], latency: float,
+                          text_length: int):
+    """Record a routing decision for threshold tuning"""
+    metrics.increment("routing_decisions_total",
+                      tier=decision.tier, reason=decision.reason)
+    metrics.observe("analysis_latency_seconds", latency, tier=decision.tier)
+    if decision.local_label:
+        metrics.increment("routing_local_agreement_total", tier=decision.tier,
+                          agree=decision.local_label == result.get("label"))
+
+    await db.save_routing_decision({
+        "tier": decision.tier,
+        "reason": decision.reason,
+        "local_label": decision.local_label,
+        "local_confidence": decision.local_confidence,
+        "final_label": result.get("label"),
+        "final_score": result.get("score"),
+        "latency": round(latency, 3),
+        "text_length": text_length
+    })
+
+
+def should_check_agreement(decision: RoutingDecision) -> bool:
+    return decision.tier != "full" and random.random() < AGREEMENT_SAMPLE_RATE
+
+
+async def check_agreement(decision: RoutingDecision, result: Dict[str, Any], full_analysis):
+    """
+    Re-run a routed-away text on the full model (bulk priority) and record
+    whether the cheaper tier agreed with it
+    """
+    try:
+        started = time.perf_counter()
+        reference = await full_analysis()
+        agree = reference.get("label") == result.get("label")
+        metrics.increment("routing_tier_agreement_total",
+                          tier=decision.tier, agree=agree)
+        metrics.observe("routing_agreement_check_seconds",
+                        time.perf_counter() - started)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"⚠️ Agreement check failed: {e}")
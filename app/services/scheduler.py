@@ -0,0 +1,289 @@
+"""
+Gemini request scheduler
+
+Every call to the model goes through a single per-process scheduler:
+- a token bucket keeps us at (not above) the configured quota
+- transient errors (429, 5xx, network) are retried with jittered exponential backoff
+- a circuit breaker fails fast while the API is down
+- priority lanes serve interactive /analyze requests before bulk work
+- queue depth per lane and a moving average of service time give the
+  expected wait used by admission control; jobs can set a maximum wait
+- each call has a timeout, and a caller giving up (deadline, client
+  disconnect) cancels its job, queued or in flight
+"""
+
+import asyncio
+import itertools
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+import httpx
+
+# Priority lanes (lower value is served first)
+INTERACTIVE = 0
+BULK = 1
+
+# Configuration
+REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", 60))
+BURST = int(os.getenv("GEMINI_BURST", 10))
+CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", 8))
+MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", 4))
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 20.0
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("GEMINI_BREAKER_FAILURES", 5))
+BREAKER_RESET_SECONDS = float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", 30))
+CALL_TIMEOUT_SECONDS = float(os.getenv("GEMINI_CALL_TIMEOUT_SECONDS", 60))
+EXPECTED_LATENCY_SECONDS = float(os.getenv("GEMINI_EXPECTED_LATENCY_SECONDS", 5))
+SERVICE_TIME_SMOOTHING = 0.2  # EWMA weight of the latest call
+
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised when the circuit breaker rejects a call"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Gemini circuit open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class QueueTimeoutError(Exception):
+    """Raised when a job waited in the queue longer than its maximum wait"""
+
+    def __init__(self, waited: float):
+        super().__init__(f"Gemini queue wait exceeded ({waited:.1f}s)")
+        self.waited = waited
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Errors worth retrying: rate limiting, server errors and network failures"""
+    if isinstance(error, (asyncio.TimeoutError, httpx.TransportError, ConnectionError)):
+        return True
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return code in TRANSIENT_STATUS_CODES
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens per second"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def available(self, now: Optional[float] = None) -> float:
+        """Tokens available at `now` (default: now), without refilling the bucket"""
+        now = time.monotonic() if now is None else now
+        return min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = self.available(now)
+        self.updated_at = now
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive transient failures.
+    Once `reset_timeout` has elapsed a single trial call is let through
+    (half-open): success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def before_call(self) -> bool:
+        """Raise if the call is rejected; True when it is the half-open trial"""
+        state = self.state
+        if state == "open" or (state == "half-open" and self._trial_in_flight):
+            raise CircuitOpenError(self.retry_after() or self.reset_timeout)
+        if state == "half-open":
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def release_trial(self):
+        """The trial call was cancelled: let the next call try again"""
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_in_flight or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._trial_in_flight:
+                print(f"⚠️ Gemini circuit opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+
+class GeminiScheduler:
+    """Priority queue of model calls drained by a fixed pool of workers"""
+
+    def __init__(
+        self,
+        requests_per_minute: float = REQUESTS_PER_MINUTE,
+        burst: int = BURST,
+        concurrency: int = CONCURRENCY,
+        max_retries: int = MAX_RETRIES,
+        call_timeout: float = CALL_TIMEOUT_SECONDS
+    ):
+        self.bucket = TokenBucket(requests_per_minute / 60, burst)
+        self.breaker = CircuitBreaker(
+            BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.call_timeout = call_timeout
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers = []
+        self._sequence = itertools.count()
+        self._queued = {INTERACTIVE: 0, BULK: 0}
+        self.service_time = EXPECTED_LATENCY_SECONDS  # EWMA, seconds per call
+
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+            self._workers = [asyncio.create_task(self._worker())
+                             for _ in range(self.concurrency)]
+
+    async def stop(self):
+        """Cancel the workers (called on application shutdown)"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    def queue_size(self, priority: Optional[int] = None) -> int:
+        if priority is not None:
+            return self._queued.get(priority, 0)
+        return self._queue.qsize() if self._queue else 0
+
+    def estimated_wait(self, priority: int = INTERACTIVE) -> float:
+        """
+        Expected queue time of a new job: jobs of the same or a higher lane
+        ahead of it, drained by the workers and by the token bucket
+        """
+        ahead = sum(n for lane, n in self._queued.items() if lane <= priority)
+        by_workers = ahead * self.service_time / self.concurrency
+        by_rate = max(0.0, ahead + 1 - self.bucket.available()) / self.bucket.rate
+        return max(by_workers, by_rate)
+
+    async def submit(self, call: Callable[[], Awaitable[Any]], priority: int = INTERACTIVE,
+                     max_wait: Optional[float] = None) -> Any:
+        """
+        Schedule `call` and wait for its result
+        Raises CircuitOpenError immediately while the API is considered down,
+        QueueTimeoutError if the job is still queued after `max_wait` seconds
+        """
+        if self.breaker.state == "open":
+            raise CircuitOpenError(self.breaker.retry_after())
+
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        enqueued_at = time.monotonic()
+        self._queued[priority] += 1
+        await self._queue.put((priority, next(self._sequence), call, future,
+                               enqueued_at, max_wait))
+        return await future
+
+    async def _worker(self):
+        while True:
+            priority, _, call, future, enqueued_at, max_wait = await self._queue.get()
+            self._queued[priority] -= 1
+            running = None
+            try:
+                if future.cancelled():
+                    continue  # Caller gave up while queued
+                waited = time.monotonic() - enqueued_at
+                if max_wait is not None and waited > max_wait:
+                    future.set_exception(QueueTimeoutError(waited))
+                    continue
+                started = time.monotonic()
+                running = asyncio.ensure_future(self._run_with_retries(call))
+                # Caller gave up while the call is in flight: stop it too
+                future.add_done_callback(lambda _: running.cancel())
+                await asyncio.wait([running])
+                if running.cancelled():
+                    continue
+                result = running.result()
+                self.service_time += SERVICE_TIME_SMOOTHING * \
+                    (time.monotonic() - started - self.service_time)
+                if not future.done():
+                    future.set_result(result)
+            except asyncio.CancelledError:
+                if running is not None:
+                    running.cancel()
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    async def _run_with_retries(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        for attempt in range(self.max_retries + 1):
+            trial = self.breaker.before_call()
+            try:
+                await self.bucket.acquire()
+                result = await asyncio.wait_for(call(), self.call_timeout)
+            except asyncio.CancelledError:
+                if trial:
+                    self.breaker.release_trial()
+                raise
+            except Exception as e:
+                if not is_transient_error(e):
+                    self.breaker.record_success()  # The API answered
+                    raise
+                self.breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise
+                # Full jitter: spreads retries so they don't arrive in waves
+                delay = random.uniform(0, min(
+                    BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+                print(
+                    f"🔄 Gemini transient error ({e}), retry {attempt + 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            else:
+                self.breaker.record_success()
+                return result
+
+
+# Instance par processus
+scheduler = GeminiScheduler()
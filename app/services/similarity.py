@@ -0,0 +1,213 @@
+"""
+Semantic similarity between articles, CPU only
+
+Embedding: hashed TF-IDF over word unigrams/bigrams, folded into a signed
+sketch and reduced with a truncated SVD (LSA) fitted on stored articles.
+Index: IVF in NumPy - k-means centroids with contiguous inverted lists.
+The index is built offline (`python -m app.scripts.build_similarity_index`),
+saved to disk and memory-mapped at startup. Articles analyzed since the
+last build are kept in a small in-memory buffer searched exhaustively
+(the most recent SIMILARITY_BUFFER_SIZE, until the next rebuild).
+Embedding and search are CPU-bound: callers on the event loop run them in
+the threadpool.
+"""
+
+import json
+import os
+import re
+import zlib
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+# Configuration
+INDEX_DIR = os.getenv("SIMILARITY_INDEX_DIR", "data/similarity")
+REUSE_THRESHOLD = float(os.getenv("SIMILARITY_REUSE_THRESHOLD", 0))  # 0 = never reuse
+MIN_SIMILARITY = float(os.getenv("SIMILARITY_MIN_SCORE", 0.6))
+N_PROBE = int(os.getenv("SIMILARITY_N_PROBE", 8))
+BUFFER_SIZE = int(os.getenv("SIMILARITY_BUFFER_SIZE", 5000))
+
+VOCAB_SIZE = 2 ** 20  # Hashed term space (document frequencies)
+SKETCH_DIM = 2048
+EMBEDDING_DIM = 256
+SKETCH_HASHES = 2
+_PRIME = 2_147_483_647
+_HASH_PARAMS = np.random.default_rng(42).integers(
+    1, _PRIME, size=(SKETCH_HASHES, 4), dtype=np.int64)
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def term_counts(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashed term ids (unigrams + bigrams) and their counts"""
+    tokens = _TOKEN_PATTERN.findall(text.lower())
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    if not grams:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    hashed = np.fromiter((zlib.crc32(g.encode()) % VOCAB_SIZE for g in grams),
+                         dtype=np.int64, count=len(grams))
+    return np.unique(hashed, return_counts=True)
+
+
+def sketch(term_ids: np.ndarray, counts: np.ndarray, idf: np.ndarray) -> np.ndarray:
+    """TF-IDF vector folded into SKETCH_DIM signed buckets"""
+    vector = np.zeros(SKETCH_DIM, dtype=np.float32)
+    if term_ids.size == 0:
+        return vector
+    weights = (1 + np.log(counts)) * idf[term_ids]
+    for a, b, c, d in _HASH_PARAMS:
+        buckets = ((term_ids * a + b) % _PRIME) % SKETCH_DIM
+        signs = np.where(((term_ids * c + d) % _PRIME) & 1, 1.0, -1.0)
+        np.add.at(vector, buckets, weights * signs)
+    return vector
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class SimilarityIndex:
+    """IVF index over L2-normalized embeddings (inner product = cosine)"""
+
+    def __init__(self, idf: np.ndarray, components: np.ndarray, centroids: np.ndarray,
+                 offsets: np.ndarray, vectors: np.ndarray, ids: List[str]):
+        self.idf = idf
+        self.components = components
+        self.centroids = centroids
+        self.offsets = offsets
+        self.vectors = vectors
+        self.ids = ids
+        # Articles analyzed since the index was built, oldest dropped first
+        self._buffer: "deque[Tuple[str, np.ndarray]]" = deque(maxlen=BUFFER_SIZE)
+
+    def embed(self, text: str) -> np.ndarray:
+        term_ids, counts = term_counts(text)
+        return _normalize(sketch(term_ids, counts, self.idf) @ self.components)
+
+    def add(self, article_id: str, vector: np.ndarray):
+        self._buffer.append((article_id, vector.astype(np.float32)))
+
+    def search(self, vector: np.ndarray, k: int = 5, n_probe: int = N_PROBE) -> List[Tuple[str, float]]:
+        candidates_ids: List[str] = []
+        candidates_scores: List[np.ndarray] = []
+
+        if len(self.ids):
+            lists = np.argsort(self.centroids @ vector)[::-1][:n_probe]
+            for list_index in lists:
+                start, end = self.offsets[list_index], self.offsets[list_index + 1]
+                if end > start:
+                    candidates_scores.append(self.vectors[start:end] @ vector)
+                    candidates_ids.extend(self.ids[start:end])
+
+        # Snapshot: add() may run on the event loop while we search in a thread
+        buffered = list(self._buffer)
+        if buffered:
+            candidates_scores.append(np.stack([v for _, v in buffered]) @ vector)
+            candidates_ids.extend(article_id for article_id, _ in buffered)
+
+        if not candidates_ids:
+            return []
+        scores = np.concatenate(candidates_scores)
+        top = np.argsort(scores)[::-1][:k]
+        return [(candidates_ids[i], float(scores[i])) for i in top]
+
+    def save(self, directory: str = INDEX_DIR):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "idf.npy"), self.idf)
+        np.save(os.path.join(directory, "components.npy"), self.components)
+        np.save(os.path.join(directory, "centroids.npy"), self.centroids)
+        np.save(os.path.join(directory, "offsets.npy"), self.offsets)
+        np.save(os.path.join(directory, "vectors.npy"), self.vectors)
+        with open(os.path.join(directory, "ids.json"), "w") as f:
+            json.dump(self.ids, f)
+
+    @classmethod
+    def load(cls, directory: str = INDEX_DIR) -> "SimilarityIndex":
+        """Vectors are memory-mapped: only probed lists are paged in"""
+        with open(os.path.join(directory, "ids.json")) as f:
+            ids = json.load(f)
+        return cls(
+            idf=np.load(os.path.join(directory, "idf.npy")),
+            components=np.load(os.path.join(directory, "components.npy")),
+            centroids=np.load(os.path.join(directory, "centroids.npy")),
+            offsets=np.load(os.path.join(directory, "offsets.npy")),
+            vectors=np.load(os.path.join(
+                directory, "vectors.npy"), mmap_mode="r"),
+            ids=ids
+        )
+
+
+def compute_idf(document_frequency: np.ndarray, n_documents: int) -> np.ndarray:
+    return np.log((1 + n_documents) / (1 + document_frequency)).astype(np.float32) + 1
+
+
+def fit_components(sketches: np.ndarray, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Truncated SVD of the (sample) sketch matrix: SKETCH_DIM x dim projection"""
+    _, _, vt = np.linalg.svd(sketches, full_matrices=False)
+    return vt[:dim].T.astype(np.float32)
+
+
+def build_ivf(vectors: np.ndarray, ids: List[str], n_lists: Optional[int] = None,
+              iterations: int = 10) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[str]]:
+    """
+    Spherical k-means, then vectors reordered so each inverted list is a
+    contiguous slice. Returns (centroids, offsets, vectors, ids)
+    """
+    n = len(vectors)
+    n_lists = n_lists or max(1, int(np.sqrt(n)))
+    rng = np.random.default_rng(0)
+    centroids = vectors[rng.choice(n, size=min(n_lists, n), replace=False)]
+
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(len(centroids)):
+            members = vectors[assignments == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+        centroids = _normalize(centroids)
+
+    assignments = np.argmax(vectors @ centroids.T, axis=1)
+    order = np.argsort(assignments, kind="stable")
+    counts = np.bincount(assignments, minlength=len(centroids))
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    return centroids.astype(np.float32), offsets, vectors[order], [ids[i] for i in order]
+
+
+_index: Optional[SimilarityIndex] = None
+
+
+def load_index(directory: str = INDEX_DIR) -> bool:
+    """Load the on-disk index if present (called per worker at startup)"""
+    global _index
+    if not os.path.exists(os.path.join(directory, "ids.json")):
+        print(f"⚠️ No similarity index in {directory} - similar articles disabled")
+        return False
+    _index = SimilarityIndex.load(directory)
+    print(f"✅ Similarity index loaded: {len(_index.ids)} articles")
+    return True
+
+
+def embed(text: str) -> Optional[np.ndarray]:
+    """Embedding of `text`, None when no index is loaded"""
+    if _index is None:
+        return None
+    return _index.embed(text)
+
+
+def find_similar(vector: Optional[np.ndarray], k: int = 5,
+                 exclude: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Previously analyzed articles most similar to an embedded text"""
+    if _index is None or vector is None:
+        return []
+    return [
+        {"article_id": article_id, "similarity": round(score, 4)}
+        for article_id, score in _index.search(vector, k + 1)
+        if article_id != exclude and score >= MIN_SIMILARITY
+    ][:k]
+
+
+def add_article(article_id: str, vector: Optional[np.ndarray]):
+    """Make a newly analyzed article searchable until the next rebuild"""
+    if _index is not None and vector is not None:
+        _index.add(article_id, vector)
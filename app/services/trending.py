@@ -0,0 +1,144 @@
+"""
+Trending service: exponentially-decayed vote velocity per article
+
+The decayed positive/negative counters live on each article's
+article_vote_counts document, so every worker sees every vote and nothing
+is lost on restart. A vote adds blind increments in the vote transaction:
+its weight is scaled by exp(rate * (t - epoch start)), so the stored sums
+never need to be decayed in place; readers divide by the same factor at
+read time. Epochs last EPOCH_HALF_LIVES half-lives (the scale stays
+bounded); the previous epoch is still read, older ones are deleted by the
+next vote on the article.
+
+A background task in each worker periodically reads the most active
+articles of the current and previous epochs and refreshes a bounded top-K
+snapshot (rebuilt from Firestore at startup), so reads never touch
+Firestore and cost the same whatever the number of votes.
+"""
+
+import asyncio
+import heapq
+import math
+import os
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+# Configuration
+HALF_LIFE_SECONDS = float(os.getenv("TRENDING_HALF_LIFE_SECONDS", 6 * 3600))
+TOP_K = int(os.getenv("TRENDING_TOP_K", 50))
+REFRESH_INTERVAL_SECONDS = float(
+    os.getenv("TRENDING_REFRESH_INTERVAL_SECONDS", 30))
+MIN_VELOCITY = 0.01  # Counters below this are left out of the snapshot
+EPOCH_HALF_LIVES = 16  # Largest scale factor: 2 ** 16
+CANDIDATES_PER_EPOCH = 4 * TOP_K  # Most active articles read per epoch
+
+_DECAY_RATE = math.log(2) / HALF_LIFE_SECONDS
+_EPOCH_SECONDS = EPOCH_HALF_LIVES * HALF_LIFE_SECONDS
+
+_top_articles: List[Dict[str, Any]] = []
+
+
+def epoch_of(now: float) -> int:
+    return int(now // _EPOCH_SECONDS)
+
+
+def epoch_key(epoch: int) -> str:
+    """Key of an epoch in the `trending` map (a plain Firestore field name)"""
+    return f"e{epoch}"
+
+
+def scaled_vote(vote: int, weight: float = 1.0,
+                now: Optional[float] = None) -> Tuple[int, Dict[str, float]]:
+    """
+    Epoch and increments recording a vote: {'positive' or 'negative',
+    'velocity'} scaled to the start of the epoch. No increments for a removed vote
+    """
+    now = time.time() if now is None else now
+    epoch = epoch_of(now)
+    side = {1: 'positive', -1: 'negative'}.get(vote)
+    if side is None:
+        return epoch, {}
+    scaled = weight * math.exp(_DECAY_RATE * (now - epoch * _EPOCH_SECONDS))
+    return epoch, {side: scaled, 'velocity': scaled}
+
+
+def decayed_counts(counters: Dict[str, Dict[str, float]],
+                   now: Optional[float] = None) -> Tuple[float, float]:
+    """Positive and negative velocity at `now` from a stored `trending` map"""
+    now = time.time() if now is None else now
+    current = epoch_of(now)
+    positive = negative = 0.0
+    for key, counter in counters.items():
+        epoch = int(key[1:])
+        if epoch < current - 1 or not isinstance(counter, dict):
+            continue
+        factor = math.exp(-_DECAY_RATE * (now - epoch * _EPOCH_SECONDS))
+        positive += counter.get('positive', 0.0) * factor
+        negative += counter.get('negative', 0.0) * factor
+    return positive, negative
+
+
+def trending_score(positive: float, negative: float) -> float:
+    """
+    Velocity weighted by how disputed the article is
+    An article voted evenly both ways ranks above a one-sided one
+    """
+    velocity = positive + negative
+    if velocity == 0:
+        return 0.0
+    dispute = 1 - abs(positive - negative) / velocity
+    return velocity * (0.5 + 0.5 * dispute)
+
+
+def refresh_top_articles(counters: Dict[str, Dict[str, Dict[str, float]]],
+                         now: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Rebuild the top-K snapshot from article_id -> stored `trending` map"""
+    global _top_articles
+    now = time.time() if now is None else now
+
+    velocities = {}
+    for article_id, article_counters in counters.items():
+        positive, negative = decayed_counts(article_counters, now)
+        if positive + negative >= MIN_VELOCITY:
+            velocities[article_id] = (positive, negative)
+
+    top = heapq.nlargest(
+        TOP_K,
+        velocities.items(),
+        key=lambda item: trending_score(*item[1])
+    )
+
+    _top_articles = [
+        {
+            "article_id": article_id,
+            "trending_score": round(trending_score(positive, negative), 4),
+            "velocity": round(positive + negative, 4),
+            "positive_velocity": round(positive, 4),
+            "negative_velocity": round(negative, 4),
+        }
+        for article_id, (positive, negative) in top
+    ]
+    return _top_articles
+
+
+def get_trending_articles(limit: int = TOP_K) -> List[Dict[str, Any]]:
+    """Return the latest top-K snapshot (no computation on the read path)"""
+    return _top_articles[:limit]
+
+
+async def run_refresh_loop():
+    """Background task refreshing the top-K snapshot, first at startup"""
+    from . import db  # db imports this module
+
+    print(
+        f"✅ Trending refresh loop started (every {REFRESH_INTERVAL_SECONDS}s)")
+    while True:
+        try:
+            current = epoch_of(time.time())
+            counters = await db.get_trending_counters(
+                [current, current - 1], CANDIDATES_PER_EPOCH)
+            if counters is not None:
+                refresh_top_articles(counters)
+        except Exception as e:
+            print(f"❌ Error refreshing trending articles: {e}")
+        await asyncio.sleep(REFRESH_INTERVAL_SECONDS)
@@ -0,0 +1,57 @@
+"""
+Startup warm-up of the article cache
+
+After a deploy or a worker restart every cache is cold. Before the worker
+reports ready, the most-voted and most recent articles are read in bulk
+(analysis and vote aggregates) into the article cache and the known-id
+set. Bounded by a time budget and a number of concurrent reads: whatever
+is loaded when the budget runs out is kept, and startup goes on.
+"""
+
+import asyncio
+import os
+import time
+
+from . import cache, db, metrics
+
+# Configuration
+WARMUP_ARTICLES = int(os.getenv("WARMUP_ARTICLES", 500))
+WARMUP_BUDGET_SECONDS = float(os.getenv("WARMUP_BUDGET_SECONDS", 10))
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", 4))
+WARMUP_BATCH_SIZE = 100  # Ids per grouped read
+
+
+async def warm_up(limit: int = WARMUP_ARTICLES, budget: float = WARMUP_BUDGET_SECONDS,
+                  concurrency: int = WARMUP_CONCURRENCY) -> int:
+    """Preload the top `limit` articles; returns how many were cached"""
+    if not db.get_db() or limit <= 0:
+        return 0
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(concurrency)
+    loaded = 0
+
+    async def load(article_ids):
+        nonlocal loaded
+        async with semaphore:
+            loaded += len(await db.get_articles_bulk(article_ids))
+
+    async def run():
+        article_ids = await db.get_popular_article_ids(limit)
+        await asyncio.gather(*(load(article_ids[i:i + WARMUP_BATCH_SIZE])
+                               for i in range(0, len(article_ids), WARMUP_BATCH_SIZE)))
+
+    try:
+        await asyncio.wait_for(run(), budget)
+        outcome = "complete"
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+    except Exception as e:
+        print(f"⚠️ Cache warm-up failed: {e}")
+        outcome = "error"
+
+    elapsed = time.perf_counter() - started
+    metrics.observe("cache_warmup_seconds", elapsed, outcome=outcome)
+    metrics.set_gauge("cache_warmup_articles", loaded)
+    cache.publish_gauges()
+    print(f"🔥 Cache warm-up {outcome}: {loaded} articles in {elapsed:.2f}s")
+    return loaded
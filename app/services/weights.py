@@ -0,0 +1,90 @@
+"""
+Per-voter reputation weights for the weighted community score
+
+A voter's weight follows the reputation stored on their user document
+(0.0-1.0, kept up to date by `update_user_reputation` and the offline
+`recompute_reputation` job), so loading weights is one batched read of
+user documents. They live in a compact array-backed store (user id -> row
+of NumPy arrays) so that aggregating an article's voters is a vectorized
+lookup. Each vote document keeps the weight it was counted with, and the
+per-article weighted sums are maintained incrementally on every vote;
+the aggregation below is only needed to rebuild those sums.
+"""
+
+import os
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Configuration
+WEIGHT_TTL_SECONDS = int(os.getenv("VOTER_WEIGHT_TTL_SECONDS", 600))
+MIN_WEIGHT = 0.5
+MAX_WEIGHT = 1.0
+
+
+def weight_for_reputation(reputation: np.ndarray) -> np.ndarray:
+    """Higher reputation = higher weight (0.5-1.0 scale)"""
+    reputation = np.clip(np.asarray(reputation, dtype=np.float32), 0.0, 1.0)
+    return MIN_WEIGHT + reputation * (MAX_WEIGHT - MIN_WEIGHT)
+
+
+class VoterWeightStore:
+    """User id -> (reputation, weight, loaded at), stored column-wise"""
+
+    def __init__(self, capacity: int = 1024):
+        self._rows: Dict[str, int] = {}
+        self._reputations = np.zeros(capacity, dtype=np.float32)
+        self._weights = np.zeros(capacity, dtype=np.float32)
+        self._loaded_at = np.zeros(capacity, dtype=np.float64)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _row(self, user_id: str) -> int:
+        row = self._rows.get(user_id)
+        if row is None:
+            row = len(self._rows)
+            if row == len(self._weights):
+                # Amortized growth, like a list
+                self._reputations = np.resize(self._reputations, 2 * row)
+                self._weights = np.resize(self._weights, 2 * row)
+                self._loaded_at = np.resize(self._loaded_at, 2 * row)
+            self._rows[user_id] = row
+        return row
+
+    def lookup(self, user_ids: List[str]) -> Tuple[np.ndarray, List[str]]:
+        """Weights of `user_ids` (NaN when unknown or stale) and the ids to load"""
+        rows = np.fromiter((self._rows.get(u, -1) for u in user_ids),
+                           dtype=np.int64, count=len(user_ids))
+        known = rows >= 0
+        result = np.full(len(user_ids), np.nan, dtype=np.float32)
+        fresh = known.copy()
+        fresh[known] = time.time() - self._loaded_at[rows[known]] < WEIGHT_TTL_SECONDS
+        result[fresh] = self._weights[rows[fresh]]
+        missing = [user_ids[i] for i in np.flatnonzero(~fresh)]
+        return result, missing
+
+    def update(self, user_ids: List[str], reputations: List[float]):
+        """Store freshly read (or just recomputed) reputations"""
+        if not user_ids:
+            return
+        rows = np.array([self._row(u) for u in user_ids], dtype=np.int64)
+        self._reputations[rows] = reputations
+        self._weights[rows] = weight_for_reputation(self._reputations[rows])
+        self._loaded_at[rows] = time.time()
+
+
+store = VoterWeightStore()
+
+
+def aggregate(votes: np.ndarray, voter_weights: np.ndarray) -> Dict[str, float]:
+    """Weighted positive/negative sums over the voters of an article"""
+    votes = np.asarray(votes)
+    voter_weights = np.asarray(voter_weights, dtype=np.float64)
+    weighted_positive = float(voter_weights[votes == 1].sum())
+    weighted_negative = float(voter_weights[votes == -1].sum())
+    return {
+        'weighted_positive': weighted_positive,
+        'weighted_negative': weighted_negative
+    }
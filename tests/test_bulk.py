@@ -0,0 +1,32 @@
+import pyarrow.parquet as pq
+
+from app.scripts import bulk
+
+
+def _round_trip(tmp_path, rows):
+    path = str(tmp_path / "part.parquet")
+    pq.write_table(bulk._parquet_table(rows), path)
+    return dict(bulk.read_file(path, "parquet", 0))
+
+
+def test_parquet_keeps_explicit_nulls_and_drops_absent_fields(tmp_path):
+    rows = [
+        ("u1", {"username": "alice", "profile_photo": None, "stats": {"votes": 3, "last": None}}),
+        ("u2", {"username": "bob", "level": 2, "stats": {"votes": 1, "streak": 4}}),
+    ]
+
+    assert _round_trip(tmp_path, rows) == dict(rows)
+
+
+def test_parquet_skips_already_imported_documents(tmp_path):
+    rows = [(f"d{i}", {"n": i}) for i in range(5)]
+    path = str(tmp_path / "part.parquet")
+    pq.write_table(bulk._parquet_table(rows), path)
+
+    assert [document_id for document_id, _ in bulk.read_file(path, "parquet", 3)] == ["d3", "d4"]
+
+
+def test_jsonl_values_round_trip():
+    value = {"at": bulk.datetime(2024, 5, 1, 12, 30), "raw": b"\x00\x01", "tags": [None, "x"]}
+
+    assert bulk.decode_value(bulk.encode_value(value)) == value
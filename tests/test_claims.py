@@ -0,0 +1,30 @@
+from app.services import claims
+
+ARTICLE = (
+    "The minister said unemployment fell to 4.2 percent in March according to official statistics. "
+    "Critics argued that the new figures from the national office ignored part-time workers entirely. "
+    "Independent economists estimated the real rate at closer to six percent across the region this year."
+)
+
+
+def test_extracted_claims_cover_a_short_article():
+    extracted = claims.extract_claims(ARTICLE)
+
+    assert claims.claim_coverage(ARTICLE, extracted) == 1.0
+
+
+def test_claims_beyond_the_limit_lower_coverage():
+    extracted = claims.extract_claims(ARTICLE, max_claims=1)
+
+    assert claims.claim_coverage(ARTICLE, extracted) < claims.MIN_CLAIM_COVERAGE
+
+
+def test_full_tier_does_not_reuse_cheaper_verdicts():
+    cached = {
+        "untagged": {"score": 0.9},
+        "fast": {"score": 0.9, "tier": "fast"},
+        "full": {"score": 0.9, "tier": "full"},
+    }
+
+    assert list(claims.usable_verdicts(cached, "full")) == ["full"]
+    assert list(claims.usable_verdicts(cached, "fast")) == ["untagged", "fast", "full"]
@@ -0,0 +1,94 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from google import genai
+from google.genai import types
+
+from app.services import analyzer, context_cache
+
+MODEL = "gemini-2.5-flash"
+CACHE_NAME = "cachedContents/stub-instructions"
+
+
+class StubGemini(BaseHTTPRequestHandler):
+    """Minimal Gemini API: cachedContents and generateContent"""
+
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _handle(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        path = self.path.split("?")[0]
+        self.requests.append((self.command, path, body))
+        if path.endswith("/cachedContents") or "/cachedContents/" in path:
+            self._reply({"name": CACHE_NAME, "model": f"models/{MODEL}"})
+        else:
+            self._reply({
+                "candidates": [{"content": {"role": "model", "parts": [{"text": "{}"}]}}],
+                "usageMetadata": {"promptTokenCount": 1200, "cachedContentTokenCount": 1100},
+            })
+
+    do_POST = _handle
+    do_PATCH = _handle
+
+
+@pytest.fixture
+def stub_client():
+    StubGemini.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGemini)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    context_cache._caches.clear()
+    context_cache._unavailable_until.clear()
+    context_cache._lock = None
+    client = genai.Client(api_key="test", http_options=types.HttpOptions(
+        base_url=f"http://127.0.0.1:{server.server_port}"))
+    yield client
+    server.shutdown()
+
+
+def _generate_twice(client, system_instruction):
+    async def run():
+        for article in ("Premier article", "Second article"):
+            config = await context_cache.build_config(client, MODEL, system_instruction)
+            await client.aio.models.generate_content(model=MODEL, contents=article, config=config)
+
+    asyncio.run(run())
+    return [body for method, path, body in StubGemini.requests if path.endswith(":generateContent")]
+
+
+def test_large_instructions_are_cached_once_and_reused(stub_client):
+    instructions = "Vérifie chaque affirmation avec soin. " * 200
+
+    generated = _generate_twice(stub_client, instructions)
+
+    created = [r for r in StubGemini.requests if r[0] == "POST" and r[1].endswith("/cachedContents")]
+    assert len(created) == 1
+    assert [body["cachedContent"] for body in generated] == [CACHE_NAME, CACHE_NAME]
+    assert all("systemInstruction" not in body for body in generated)
+
+
+def test_small_instructions_skip_the_explicit_cache(stub_client):
+    assert not context_cache.cacheable(MODEL, analyzer.SYSTEM_INSTRUCTION)
+
+    generated = _generate_twice(stub_client, analyzer.SYSTEM_INSTRUCTION)
+
+    assert not any("cachedContents" in path for _, path, _ in StubGemini.requests)
+    # Same leading system instruction on every request: implicit prefix caching
+    prefixes = [body["systemInstruction"]["parts"][0]["text"] for body in generated]
+    assert prefixes == [analyzer.SYSTEM_INSTRUCTION] * 2
+    assert all("cachedContent" not in body for body in generated)
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from app.services import deadline
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeURL:
+    path = "/analyze"
+
+
+class FakeRequest:
+    """Request whose client leaves after `polls` connection checks"""
+
+    def __init__(self, polls):
+        self.polls = polls
+        self.url = FakeURL()
+
+    async def is_disconnected(self):
+        self.polls -= 1
+        return self.polls < 0
+
+
+def test_scope_sets_and_restores_the_deadline(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(deadline.time, "monotonic", clock)
+
+    assert deadline.remaining() is None
+    assert deadline.timeout_for(5.0) == 5.0
+    with deadline.scope(10.0):
+        clock.now += 4
+        assert deadline.remaining() == pytest.approx(6.0)
+        assert deadline.timeout_for(5.0) == pytest.approx(5.0)
+        assert deadline.timeout_for(None) == pytest.approx(6.0)
+        with deadline.scope(None):
+            assert deadline.remaining() is None
+        clock.now += 20
+        # Past the deadline: nothing left, never negative
+        assert deadline.remaining() == 0.0
+    assert deadline.remaining() is None
+
+
+def test_bounded_raises_with_the_stage_and_cancels():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def run():
+        with deadline.scope(0.05):
+            return await deadline.bounded(slow(), "gemini")
+
+    with pytest.raises(deadline.DeadlineExceededError) as error:
+        asyncio.run(run())
+
+    assert error.value.stage == "gemini"
+    assert cancelled == [True]
+
+
+def test_bounded_cap_applies_without_a_deadline():
+    async def run():
+        assert await deadline.bounded(asyncio.sleep(0, "done"), "db.read", 1.0) == "done"
+        await deadline.bounded(asyncio.sleep(10), "db.read", 0.05)
+
+    with pytest.raises(deadline.DeadlineExceededError):
+        asyncio.run(run())
+
+
+def test_cancel_on_disconnect_returns_the_result(monkeypatch):
+    monkeypatch.setattr(deadline, "DISCONNECT_POLL_SECONDS", 0.01)
+
+    async def work():
+        await asyncio.sleep(0.03)
+        return "analysis"
+
+    result = asyncio.run(deadline.cancel_on_disconnect(FakeRequest(polls=100), work()))
+
+    assert result == "analysis"
+
+
+def test_cancel_on_disconnect_cancels_the_work(monkeypatch):
+    monkeypatch.setattr(deadline, "DISCONNECT_POLL_SECONDS", 0.01)
+    cancelled = []
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    with pytest.raises(deadline.ClientDisconnectedError):
+        asyncio.run(deadline.cancel_on_disconnect(FakeRequest(polls=2), work()))
+
+    assert cancelled == [True]
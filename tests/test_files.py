@@ -0,0 +1,92 @@
+import asyncio
+import os
+
+import pytest
+from fastapi import HTTPException
+
+from app.services import files
+
+DIGEST = "ab" * 32
+
+
+def test_variant_urls_list_every_generated_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(files, "PROFILE_PHOTOS_DIR", str(tmp_path))
+    url = f"http://localhost:8000/uploads/profile_photos/{DIGEST}_256.webp"
+
+    variants = files.get_photo_variant_urls(url)
+
+    # No AVIF file on disk: only WebP is listed
+    assert list(variants) == ["webp"]
+    assert variants["webp"]["64"] == f"http://localhost:8000/uploads/profile_photos/{DIGEST}_64.webp"
+    assert sorted(variants["webp"], key=int) == [str(size) for size in files.PHOTO_SIZES]
+
+
+def test_variant_urls_include_avif_when_built(tmp_path, monkeypatch):
+    monkeypatch.setattr(files, "PROFILE_PHOTOS_DIR", str(tmp_path))
+    (tmp_path / f"{DIGEST}_{files.DEFAULT_PHOTO_SIZE}.avif").write_bytes(b"")
+
+    variants = files.get_photo_variant_urls(f"http://cdn/p/{DIGEST}_256.webp")
+
+    assert variants["avif"]["512"] == f"http://cdn/p/{DIGEST}_512.avif"
+
+
+def test_variant_urls_ignore_external_photos():
+    assert files.get_photo_variant_urls("https://example.com/me.jpg") == {}
+    assert files.get_photo_variant_urls(None) == {}
+
+
+PNG_HEAD = b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR"
+
+
+async def _chunks(*parts):
+    for part in parts:
+        yield part
+
+
+def _session(tmp_path, monkeypatch, length=1000):
+    monkeypatch.setattr(files, "INCOMING_DIR", str(tmp_path))
+    return asyncio.run(files.create_upload_session("alice", length))["upload_id"]
+
+
+def _append(upload_id, offset, *parts):
+    return asyncio.run(files.append_upload_chunk("alice", upload_id, offset, _chunks(*parts)))
+
+
+def test_first_chunk_shorter_than_signature_is_kept(tmp_path, monkeypatch):
+    upload_id = _session(tmp_path, monkeypatch)
+
+    assert _append(upload_id, 0, PNG_HEAD[:5])["offset"] == 5
+    assert _append(upload_id, 5, PNG_HEAD[5:])["offset"] == len(PNG_HEAD)
+
+
+def test_signature_completed_by_a_later_chunk_is_checked(tmp_path, monkeypatch):
+    upload_id = _session(tmp_path, monkeypatch)
+    _append(upload_id, 0, PNG_HEAD[:5])
+
+    with pytest.raises(HTTPException) as error:
+        _append(upload_id, 5, b"not an image at all")
+
+    assert error.value.status_code == 415
+    # A rejected upload cannot be resumed
+    assert os.listdir(tmp_path) == []
+
+
+def test_oversized_chunk_is_a_413(tmp_path, monkeypatch):
+    upload_id = _session(tmp_path, monkeypatch, length=8)
+
+    with pytest.raises(HTTPException) as error:
+        _append(upload_id, 0, b"\x89PNG" + b"x" * 10)
+
+    assert error.value.status_code == 413
+
+
+def test_concurrent_chunks_on_one_session_are_refused(tmp_path, monkeypatch):
+    upload_id = _session(tmp_path, monkeypatch)
+    meta_path, _ = files._session_paths(upload_id)
+
+    with files._session_lock(meta_path):
+        with pytest.raises(HTTPException) as error:
+            _append(upload_id, 0, PNG_HEAD)
+
+    assert error.value.status_code == 409
+    assert _append(upload_id, 0, PNG_HEAD)["offset"] == len(PNG_HEAD)
@@ -0,0 +1,91 @@
+import pytest
+
+from app.services import ratelimit as ratelimit_module
+from app.services.ratelimit import Budget, SharedBackend, gcra
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_budget_parse_accepts_plural_units():
+    assert Budget.parse("10/minute") == Budget(10, 60)
+    assert Budget.parse("5 / hours") == Budget(5, 3600)
+    assert Budget.parse("30/minute").interval == pytest.approx(2.0)
+    with pytest.raises(KeyError):
+        Budget.parse("10/fortnight")
+
+
+def test_gcra_allows_a_burst_then_one_request_per_interval():
+    budget = Budget(10, 60)
+    now, tat = 1000.0, 0.0
+
+    decision, tat = gcra(tat, now, budget)
+    assert decision.allowed
+    assert decision.remaining == 9
+    assert decision.reset_after == pytest.approx(6.0)
+
+    for _ in range(9):
+        decision, tat = gcra(tat, now, budget)
+    assert decision.allowed
+    assert decision.remaining == 0
+    assert tat == pytest.approx(1060.0)
+
+    decision, denied_tat = gcra(tat, now, budget)
+    assert not decision.allowed
+    assert decision.retry_after == pytest.approx(6.0)
+    assert decision.reset_after == pytest.approx(60.0)
+    # A rejected request doesn't consume the budget
+    assert denied_tat == tat
+
+    decision, tat = gcra(tat, now + 6.0, budget)
+    assert decision.allowed
+    assert decision.remaining == 0
+
+
+def test_gcra_forgets_a_tat_in_the_past():
+    budget = Budget(10, 60)
+
+    decision, tat = gcra(500.0, 1000.0, budget)
+
+    assert decision.remaining == 9
+    assert tat == pytest.approx(1006.0)
+
+
+def test_shared_backend_is_shared_by_every_opener(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit_module.time, "time", clock)
+    path = str(tmp_path / "ratelimit")
+    budget = Budget(2, 60)
+    first, second = SharedBackend(path, slots=16), SharedBackend(path, slots=16)
+
+    size = (16 + SharedBackend.PROBES) * SharedBackend.SLOT.size
+    assert (tmp_path / "ratelimit").stat().st_size == size
+    assert first.hit("vote:ip:1", budget).allowed
+    assert second.hit("vote:ip:1", budget).allowed
+    assert not first.hit("vote:ip:1", budget).allowed
+    assert second.hit("vote:ip:2", budget).allowed
+
+
+def test_shared_backend_probes_then_evicts_the_oldest_slot(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit_module.time, "time", clock)
+    # One slot: every key hashes to the same probe window
+    backend = SharedBackend(str(tmp_path / "ratelimit"), slots=1)
+    budget = Budget(1, 60)
+    keys = [f"k{i}" for i in range(SharedBackend.PROBES)]
+    for key in keys:
+        assert backend.hit(key, budget).allowed
+        clock.now += 1
+
+    # Each colliding key found its own slot in the window
+    assert not any(backend.hit(key, budget).allowed for key in keys)
+
+    # A new key takes the slot with the oldest TAT (k0)
+    assert backend.hit("new", budget).allowed
+    assert not backend.hit("k1", budget).allowed
+    assert backend.hit("k0", budget).allowed
@@ -0,0 +1,33 @@
+import pytest
+
+from app.services import scheduler as scheduler_module
+from app.services.scheduler import GeminiScheduler, INTERACTIVE
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_estimated_wait_counts_tokens_refilled_since_last_acquire(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(scheduler_module.time, "monotonic", clock)
+    scheduler = GeminiScheduler(requests_per_minute=60, burst=5, concurrency=10)
+    scheduler.bucket.tokens = 0.0
+    scheduler.bucket.updated_at = clock.now
+    scheduler._queued[INTERACTIVE] = 2
+
+    assert scheduler.estimated_wait() == pytest.approx(3.0)
+
+    clock.now += 2
+    assert scheduler.estimated_wait() == pytest.approx(1.0)
+    # Estimating doesn't refill (or otherwise touch) the bucket
+    assert scheduler.bucket.tokens == 0.0
+    assert scheduler.bucket.updated_at == 1000.0
+
+    clock.now += 60
+    assert scheduler.estimated_wait() == pytest.approx(
+        2 * scheduler.service_time / scheduler.concurrency)
@@ -0,0 +1,36 @@
+import numpy as np
+
+from app.services import similarity
+
+
+def _empty_index():
+    rng = np.random.default_rng(0)
+    return similarity.SimilarityIndex(
+        idf=np.ones(similarity.VOCAB_SIZE, dtype=np.float32),
+        components=rng.standard_normal((similarity.SKETCH_DIM, 16)).astype(np.float32),
+        centroids=np.zeros((0, 16), dtype=np.float32),
+        offsets=np.zeros(1, dtype=np.int64),
+        vectors=np.zeros((0, 16), dtype=np.float32),
+        ids=[])
+
+
+def test_buffered_articles_are_searchable():
+    index = _empty_index()
+    text = "Le ministre annonce une baisse du chômage à 4,2 % en mars"
+    index.add("a1", index.embed(text))
+    index.add("a2", index.embed("Une recette de gâteau au chocolat sans farine"))
+
+    best_id, score = index.search(index.embed(text), k=1)[0]
+
+    assert best_id == "a1"
+    assert score > 0.99
+
+
+def test_buffer_keeps_only_the_most_recent_articles(monkeypatch):
+    monkeypatch.setattr(similarity, "BUFFER_SIZE", 3)
+    index = _empty_index()
+    vector = index.embed("Le ministre annonce une baisse du chômage")
+    for i in range(5):
+        index.add(f"a{i}", vector)
+
+    assert sorted(article_id for article_id, _ in index.search(vector, k=10)) == ["a2", "a3", "a4"]
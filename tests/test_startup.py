@@ -0,0 +1,34 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", 3))
+RUNS = 3
+
+# Clients and their SDKs are created per worker in the lifespan, not on import
+DEFERRED_MODULES = ["firebase_admin", "google.cloud.firestore", "google.api_core", "google.genai", "grpc"]
+
+SCRIPT = f"""
+import json, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed,
+                  "loaded": [m for m in {DEFERRED_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def _import_app():
+    output = subprocess.run([sys.executable, "-c", SCRIPT], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_import_app_main_within_budget():
+    runs = [_import_app() for _ in range(RUNS)]
+
+    assert runs[0]["loaded"] == []
+    fastest = min(run["seconds"] for run in runs)
+    assert fastest < IMPORT_BUDGET_SECONDS, f"import app.main took {fastest:.2f}s"
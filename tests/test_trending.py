@@ -0,0 +1,51 @@
+import pytest
+
+from app.services import trending
+
+
+def _store(counters, now, vote, weight=1.0):
+    """Apply scaled_vote increments to a `trending` map, as Firestore would"""
+    epoch, increments = trending.scaled_vote(vote, weight, now)
+    counter = counters.setdefault(trending.epoch_key(epoch), {})
+    for field, amount in increments.items():
+        counter[field] = counter.get(field, 0.0) + amount
+    counters.pop(trending.epoch_key(epoch - 2), None)
+
+
+def test_stored_counters_decay_by_half_each_half_life():
+    now = 10 * trending._EPOCH_SECONDS + 100.0
+    counters = {}
+    _store(counters, now, 1)
+    _store(counters, now, -1, weight=0.5)
+
+    assert trending.decayed_counts(counters, now) == pytest.approx((1.0, 0.5))
+    later = now + trending.HALF_LIFE_SECONDS
+    assert trending.decayed_counts(counters, later) == pytest.approx((0.5, 0.25))
+
+
+def test_previous_epoch_still_counts_after_rollover():
+    start = 10 * trending._EPOCH_SECONDS
+    counters = {}
+    _store(counters, start - 1.0, 1)
+    _store(counters, start + 1.0, 1)
+
+    assert len(counters) == 2
+    assert trending.decayed_counts(counters, start + 1.0)[0] == pytest.approx(2.0, rel=1e-3)
+
+    # Two epochs later the first vote is no longer read
+    much_later = start + 2 * trending._EPOCH_SECONDS
+    assert trending.decayed_counts(counters, much_later)[0] < 1e-4
+
+
+def test_refresh_ranks_disputed_articles_first():
+    now = 10 * trending._EPOCH_SECONDS + 100.0
+    one_sided, disputed = {}, {}
+    for _ in range(4):
+        _store(one_sided, now, 1)
+    for vote in (1, -1, 1, -1):
+        _store(disputed, now, vote)
+
+    top = trending.refresh_top_articles({"one_sided": one_sided, "disputed": disputed}, now)
+
+    assert [article["article_id"] for article in top] == ["disputed", "one_sided"]
+    assert top[0]["velocity"] == pytest.approx(4.0)
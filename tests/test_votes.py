@@ -0,0 +1,166 @@
+import asyncio
+import datetime
+
+import pytest
+from firebase_admin import firestore
+from google.api_core import datetime_helpers
+
+from app.services import db
+
+
+class FakeSnapshot:
+    def __init__(self, data=None, reference=None):
+        self._data = data
+        self.exists = data is not None
+        self.reference = reference
+
+    @property
+    def id(self):
+        return self.reference
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeQuery:
+    def __init__(self, results):
+        self.results = results
+
+    def where(self, *args):
+        return self
+
+    async def get(self, transaction=None):
+        return self.results
+
+
+class FakeRef:
+    def __init__(self, name, data=None, legacy=()):
+        self.name = name
+        self.data = data
+        self.parent = FakeQuery(list(legacy))
+
+    async def get(self, transaction=None):
+        return FakeSnapshot(self.data, self)
+
+
+class FakeTransaction:
+    def __init__(self):
+        self.writes = []
+
+    def set(self, ref, data, merge=False):
+        self.writes.append((ref.name, data))
+
+    def delete(self, ref):
+        self.writes.append((ref.name, None))
+
+
+def _upsert(vote_ref, vote, weight=1.0):
+    transaction = FakeTransaction()
+    vote_data = {'article_id': 'a1', 'user_id': 'u1', 'vote': vote, 'weight': weight}
+    previous = asyncio.run(db._upsert_vote.__wrapped__(
+        transaction, vote_ref, FakeRef("counts"), vote_data))
+    return previous, dict(transaction.writes)
+
+
+def _increments(write):
+    return {field: value.value for field, value in write.items()
+            if isinstance(value, firestore.Increment)}
+
+
+def test_vote_deltas_move_a_changed_vote_with_its_weights():
+    assert db._vote_deltas(None, 1, weight=0.8) == pytest.approx(
+        {'positive': 1, 'negative': 0, 'weighted_positive': 0.8, 'weighted_negative': 0.0})
+    assert db._vote_deltas(1, -1, previous_weight=0.8, weight=0.6) == pytest.approx(
+        {'positive': -1, 'negative': 1, 'weighted_positive': -0.8, 'weighted_negative': 0.6})
+
+
+def test_first_vote_bumps_counts_and_version_in_one_write():
+    previous, writes = _upsert(FakeRef("vote"), 1, weight=0.75)
+
+    assert previous is None
+    assert writes["vote"]["vote"] == 1
+    increments = _increments(writes["counts"])
+    assert increments["positive"] == 1
+    assert increments["weighted_positive"] == pytest.approx(0.75)
+    assert increments["version"] == 1
+
+
+def test_unchanged_vote_writes_nothing():
+    previous, writes = _upsert(FakeRef("vote", {'vote': 1, 'weight': 1.0}), 1)
+
+    assert previous == 1
+    assert writes == {}
+
+
+def test_legacy_vote_is_the_previous_vote():
+    legacy = FakeSnapshot({'vote': -1, 'weight': 0.5}, FakeRef("legacy"))
+
+    previous, writes = _upsert(FakeRef("vote", legacy=[legacy]), 1)
+
+    assert previous == -1
+    assert writes["legacy"] is None
+    increments = _increments(writes["counts"])
+    assert increments["negative"] == -1
+    assert increments["weighted_negative"] == pytest.approx(-0.5)
+
+
+def test_article_version_adds_analysis_and_vote_versions():
+    assert db.article_version({'version': 3}, {'version': 5}) == 8
+    assert db.article_version({'version': 3}, None) == 3
+    assert db.article_version({}, {}) == 0
+
+
+class SlowUsers:
+    """Client whose get_all takes `delay` seconds per call"""
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def collection(self, name):
+        return self
+
+    def document(self, document_id):
+        return document_id
+
+    async def get_all(self, refs, field_paths=None):
+        await asyncio.sleep(self.delay)
+        for user_id in refs:
+            yield FakeSnapshot({'reputation': 1.0}, user_id)
+
+
+def test_voter_weight_chunks_are_timed_from_their_own_read(monkeypatch):
+    monkeypatch.setattr(db, "get_db", lambda: SlowUsers(0.05))
+    monkeypatch.setattr(db.weights, "store", db.weights.VoterWeightStore())
+    monkeypatch.setattr(db, "USER_READ_BATCH_SIZE", 1)
+    monkeypatch.setattr(db, "USER_READ_CONCURRENCY", 1)
+    # Each read fits, all of them back to back don't
+    monkeypatch.setattr(db.deadline, "DB_TIMEOUT_SECONDS", 0.15)
+
+    result = asyncio.run(db.get_voter_weights([f"u{i}" for i in range(6)]))
+
+    assert result.tolist() == pytest.approx([1.0] * 6)
+
+
+def test_vote_cursor_round_trips_the_timestamp_and_id():
+    timestamp = datetime_helpers.DatetimeWithNanoseconds(
+        2024, 5, 1, 12, 30, 15, nanosecond=123456789, tzinfo=datetime.timezone.utc)
+
+    cursor = db.encode_vote_cursor(timestamp, "user1_article9")
+
+    # URL-safe, without padding
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+    start_after = db.decode_vote_cursor(cursor)
+    assert start_after['__name__'] == "user1_article9"
+    assert start_after['timestamp'] == timestamp
+    assert start_after['timestamp'].nanosecond == 123456789
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    "bm90IGpzb24",  # "not json"
+    "eyJpZCI6ICJ4In0",  # {"id": "x"}: no timestamp
+    "eyJ0IjogIm5vdyIsICJpZCI6ICJ4In0",  # {"t": "now", "id": "x"}
+])
+def test_unreadable_vote_cursor_is_an_invalid_cursor(cursor):
+    with pytest.raises(db.InvalidCursorError):
+        db.decode_vote_cursor(cursor)
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from app.services import weights
+
+
+def test_weight_for_reputation_scale():
+    result = weights.weight_for_reputation([0.0, 0.5, 1.0, -1.0, 2.0])
+    assert result.tolist() == pytest.approx([0.5, 0.75, 1.0, 0.5, 1.0])
+
+
+def test_lookup_reports_unknown_users():
+    store = weights.VoterWeightStore()
+    store.update(["alice"], [1.0])
+
+    result, missing = store.lookup(["alice", "bob"])
+
+    assert result[0] == pytest.approx(1.0)
+    assert np.isnan(result[1])
+    assert missing == ["bob"]
+
+
+def test_update_overwrites_existing_rows():
+    store = weights.VoterWeightStore()
+    store.update(["alice", "bob"], [0.0, 0.2])
+    store.update(["alice"], [0.6])
+
+    result, missing = store.lookup(["alice", "bob"])
+
+    assert result.tolist() == pytest.approx([0.8, 0.6])
+    assert missing == []
+    assert len(store) == 2
+
+
+def test_store_grows_past_initial_capacity():
+    store = weights.VoterWeightStore(capacity=2)
+    user_ids = [f"user{i}" for i in range(10)]
+    store.update(user_ids, [i / 10 for i in range(10)])
+
+    result, missing = store.lookup(user_ids)
+
+    assert missing == []
+    assert result.tolist() == pytest.approx([0.5 + i / 20 for i in range(10)])
+
+
+def test_stale_weights_are_reloaded(monkeypatch):
+    store = weights.VoterWeightStore()
+    store.update(["alice"], [1.0])
+    monkeypatch.setattr(weights, "WEIGHT_TTL_SECONDS", 0)
+
+    result, missing = store.lookup(["alice"])
+
+    assert np.isnan(result[0])
+    assert missing == ["alice"]
+
+
+def test_aggregate_sums_weights_by_vote_sign():
+    votes = np.array([1, -1, 1, 0], dtype=np.int8)
+    voter_weights = np.array([0.5, 1.0, 0.75, 0.9])
+
+    assert weights.aggregate(votes, voter_weights) == pytest.approx(
+        {'weighted_positive': 1.25, 'weighted_negative': 1.0})